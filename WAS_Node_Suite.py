@@ -14,11 +14,13 @@
 # THE SOFTWARE.
 
 
+import time
+WAS_IMPORT_START = time.perf_counter()
+
 from PIL import Image, ImageFilter, ImageEnhance, ImageOps, ImageDraw, ImageChops, ImageFont
 from PIL.PngImagePlugin import PngInfo
 from io import BytesIO
 from typing import Optional, Union, List
-from urllib.request import urlopen
 import comfy.diffusers_convert
 import comfy.samplers
 import comfy.sd
@@ -28,25 +30,34 @@ import comfy.model_management
 import folder_paths as comfy_paths
 from comfy_extras.chainner_models import model_loading
 import ast
+import atexit
+import collections.abc
+import contextlib
 import glob
 import hashlib
+import importlib
 import json
 import nodes
 import math
+import mmap
 import numpy as np
-from numba import jit
 import os
 import random
 import re
 import requests
 import socket
+import struct
 import subprocess
 import sys
+import threading
+import weakref
 import datetime
-import time
+import functools
 import torch
 from tqdm import tqdm
 
+WAS_CORE_IMPORT_TIME = time.perf_counter() - WAS_IMPORT_START
+
 p310_plus = (sys.version_info >= (3, 10))
 
 MANIFEST = {
@@ -149,6 +160,7 @@ WAS_SUITE_ROOT = os.path.dirname(NODE_FILE)
 WAS_CONFIG_DIR = os.environ.get('WAS_CONFIG_DIR', WAS_SUITE_ROOT)
 WAS_DATABASE = os.path.join(WAS_CONFIG_DIR, 'was_suite_settings.json')
 WAS_HISTORY_DATABASE = os.path.join(WAS_CONFIG_DIR, 'was_history.json')
+WAS_BLIP_CAPTION_DATABASE = os.path.join(WAS_CONFIG_DIR, 'was_blip_captions.json')
 WAS_CONFIG_FILE = os.path.join(WAS_CONFIG_DIR, 'was_suite_config.json')
 STYLES_PATH = os.path.join(WAS_CONFIG_DIR, 'styles.json')
 DEFAULT_NSP_PANTRY_PATH = os.path.join(WAS_CONFIG_DIR, 'nsp_pantry.json')
@@ -156,6 +168,22 @@ ALLOWED_EXT = ('.jpeg', '.jpg', '.png',
                         '.tiff', '.gif', '.bmp', '.webp')
 
 
+#! STARTUP PROFILING
+
+# Seconds spent per startup subsystem, reported by `startup_report()` once loading finishes.
+# Whatever is not attributed to a named step is the cost of defining the nodes themselves.
+STARTUP_TIMES = {"core imports": WAS_CORE_IMPORT_TIME}
+STARTUP_COMPLETE = False
+
+@contextlib.contextmanager
+def startup_step(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMES[name] = STARTUP_TIMES.get(name, 0.0) + (time.perf_counter() - start)
+
+
 #! INSTALLATION CLEANUP
 
 # Delete legacy nodes
@@ -168,27 +196,32 @@ if os.path.basename(CUSTOM_NODES_DIR) == 'was-node-suite-comfyui':
 
 f_disp = False
 node_path_dir = os.getcwd()+os.sep+'ComfyUI'+os.sep+'custom_nodes'+os.sep
-for f in legacy_was_nodes:
-    file = f'{node_path_dir}{f}'
-    if os.path.exists(file):
-        if not f_disp:
-            cstr("Found legacy nodes. Archiving legacy nodes...").msg.print()
-            f_disp = True
-        legacy_was_nodes_found.append(file)
-if legacy_was_nodes_found:
-    import zipfile
-    from os.path import basename
-    archive = zipfile.ZipFile(
-        f'{node_path_dir}WAS_Legacy_Nodes_Backup_{round(time.time())}.zip', "w")
-    for f in legacy_was_nodes_found:
-        archive.write(f, basename(f))
-        try:
-            os.remove(f)
-        except OSError:
-            pass
-    archive.close()
-if f_disp:
-    cstr("Legacy cleanup complete.").msg.print()
+with startup_step("legacy cleanup"):
+    # A single directory listing instead of probing every legacy filename
+    try:
+        node_path_files = {name.lower() for name in os.listdir(node_path_dir)}
+    except OSError:
+        node_path_files = set()
+    for f in legacy_was_nodes:
+        if f.lower() in node_path_files:
+            if not f_disp:
+                cstr("Found legacy nodes. Archiving legacy nodes...").msg.print()
+                f_disp = True
+            legacy_was_nodes_found.append(f'{node_path_dir}{f}')
+    if legacy_was_nodes_found:
+        import zipfile
+        from os.path import basename
+        archive = zipfile.ZipFile(
+            f'{node_path_dir}WAS_Legacy_Nodes_Backup_{round(time.time())}.zip', "w")
+        for f in legacy_was_nodes_found:
+            archive.write(f, basename(f))
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+        archive.close()
+    if f_disp:
+        cstr("Legacy cleanup complete.").msg.print()
 
 #! WAS SUITE CONFIG
 
@@ -204,6 +237,7 @@ was_conf_template = {
                     "sam_model_vitl_url": "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_l_0b3195.pth",
                     "sam_model_vitb_url": "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth",
                     "history_display_limit": 36,
+                    "history_max_entries": 1000,
                     "use_legacy_ascii_text": False,
                     "ffmpeg_bin_path": "/path/to/ffmpeg",
                     "ffmpeg_extra_codecs": {
@@ -212,6 +246,14 @@ was_conf_template = {
                     },
                     "wildcards_path": os.path.join(WAS_SUITE_ROOT, "wildcards"),
                     "wildcard_api": True,
+                    "lazy_imports": True,
+                    "show_startup_report": False,
+                    "model_cache_ram_budget_mb": 8192,
+                    "model_cache_vram_budget_mb": None,
+                    "tensor_cache_budget_mb": None,
+                    "memoize_nodes": False,
+                    "memoize_cache_mb": 2048,
+                    "memoize_full_hash": False,
                 }
 
 # Create, Load, or Update Config
@@ -242,25 +284,26 @@ def updateSuiteConfig(conf):
         return False
     return True
 
-if not os.path.exists(WAS_CONFIG_FILE):
-    if updateSuiteConfig(was_conf_template):
-        cstr(f'Created default conf file at `{WAS_CONFIG_FILE}`.').msg.print()
-        was_config = getSuiteConfig()
-    else:
-        cstr(f"Unable to create default conf file at `{WAS_CONFIG_FILE}`. Using internal config template.").error.print()
-        was_config = was_conf_template
+# The config is read once here; the rest of startup reuses `was_config`
+with startup_step("config"):
+    if not os.path.exists(WAS_CONFIG_FILE):
+        if updateSuiteConfig(was_conf_template):
+            cstr(f'Created default conf file at `{WAS_CONFIG_FILE}`.').msg.print()
+        else:
+            cstr(f"Unable to create default conf file at `{WAS_CONFIG_FILE}`. Using internal config template.").error.print()
+        was_config = dict(was_conf_template)
 
-else:
-    was_config = getSuiteConfig()
+    else:
+        was_config = getSuiteConfig()
 
-    update_config = False
-    for sett_ in was_conf_template.keys():
-        if not was_config.__contains__(sett_):
-            was_config.update({sett_: was_conf_template[sett_]})
-            update_config = True
+        update_config = False
+        for sett_ in was_conf_template.keys():
+            if not was_config.__contains__(sett_):
+                was_config.update({sett_: was_conf_template[sett_]})
+                update_config = True
 
-    if update_config:
-        updateSuiteConfig(was_config)
+        if update_config:
+            updateSuiteConfig(was_config)
 
 # WAS Suite Locations Debug
 if was_config.__contains__('show_startup_junk'):
@@ -284,60 +327,87 @@ if was_config and was_config.__contains__('use_legacy_ascii_text'):
         cstr("use_legacy_ascii_text is `True` in `was_suite_config.json`. `ASCII` type is deprecated and the default will be `STRING` in the future.").warning.print()
 
 # Convert WebUI Styles - TODO: Convert to PromptStyles class
-if was_config.__contains__('webui_styles'):
+with startup_step("webui styles"):
+    if was_config.__contains__('webui_styles'):
 
-    if was_config['webui_styles'] not in [None, 'None', 'none', '']:
+        if was_config['webui_styles'] not in [None, 'None', 'none', '']:
 
-        webui_styles_file = was_config['webui_styles']
+            webui_styles_file = was_config['webui_styles']
 
-        if was_config.__contains__('webui_styles_persistent_update'):
-            styles_persist = was_config['webui_styles_persistent_update']
-        else:
-            styles_persist = True
+            if was_config.__contains__('webui_styles_persistent_update'):
+                styles_persist = was_config['webui_styles_persistent_update']
+            else:
+                styles_persist = True
 
-        if webui_styles_file not in [None, 'none', 'None', ''] and os.path.exists(webui_styles_file):
+            if webui_styles_file not in [None, 'none', 'None', ''] and os.path.exists(webui_styles_file):
 
-            cstr(f"Importing styles from `{webui_styles_file}`.").msg.print()
+                cstr(f"Importing styles from `{webui_styles_file}`.").msg.print()
 
-            import csv
+                import csv
 
-            styles = {}
-            with open(webui_styles_file, "r", encoding="utf-8-sig", newline='') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    prompt = row.get("prompt") or row.get("text", "") # Old files
-                    negative_prompt = row.get("negative_prompt", "")
-                    styles[row["name"]] = {
-                        "prompt": prompt,
-                        "negative_prompt": negative_prompt
-                    }
+                styles = {}
+                with open(webui_styles_file, "r", encoding="utf-8-sig", newline='') as file:
+                    reader = csv.DictReader(file)
+                    for row in reader:
+                        prompt = row.get("prompt") or row.get("text", "") # Old files
+                        negative_prompt = row.get("negative_prompt", "")
+                        styles[row["name"]] = {
+                            "prompt": prompt,
+                            "negative_prompt": negative_prompt
+                        }
 
-            if styles:
-                if not os.path.exists(STYLES_PATH) or styles_persist:
-                    with open(STYLES_PATH, "w", encoding='utf-8') as f:
-                        json.dump(styles, f, indent=4)
+                if styles:
+                    if not os.path.exists(STYLES_PATH) or styles_persist:
+                        with open(STYLES_PATH, "w", encoding='utf-8') as f:
+                            json.dump(styles, f, indent=4)
 
-            del styles
+                del styles
 
-            cstr(f"Styles import complete.").msg.print()
+                cstr(f"Styles import complete.").msg.print()
 
-        else:
-            cstr(f"Styles file `{webui_styles_file}` does not exist.").error.print()
+            else:
+                cstr(f"Styles file `{webui_styles_file}` does not exist.").error.print()
 
 
 #! SUITE SPECIFIC CLASSES & FUNCTIONS
 
-# Freeze PIP modules
+# Installed package registry
+#
+# Built once from importlib.metadata instead of forking `pip freeze` on every call, and
+# only rebuilt after `install_package` changes the environment.
+
+def normalize_package_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+class PackageList(list):
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self._normalized = {normalize_package_name(item.split('==')[0]) for item in self}
+
+    def __contains__(self, name):
+        return normalize_package_name(name.split('==')[0]) in self._normalized
+
+INSTALLED_PACKAGES = None
+
+def resolve_packages(refresh=False):
+    global INSTALLED_PACKAGES
+    if INSTALLED_PACKAGES is None or refresh:
+        from importlib import metadata
+        installed = {}
+        for dist in metadata.distributions():
+            name = dist.metadata['Name']
+            if name and name not in installed:
+                installed[name] = dist.version
+        INSTALLED_PACKAGES = dict(sorted(installed.items(), key=lambda item: item[0].lower()))
+    return INSTALLED_PACKAGES
+
 def packages(versions=False):
-    import sys
-    import subprocess
     try:
-        result = subprocess.check_output([sys.executable, '-m', 'pip', 'freeze'], stderr=subprocess.STDOUT)
-        lines = result.decode().splitlines()
-        return [line if versions else line.split('==')[0] for line in lines]
-    except subprocess.CalledProcessError as e:
-        print("An error occurred while fetching packages:", e.output.decode())
-        return []
+        installed = resolve_packages()
+    except Exception as e:
+        print("An error occurred while fetching packages:", e)
+        return PackageList()
+    return PackageList(f"{name}=={version}" if versions else name for name, version in installed.items())
 
 def install_package(package, uninstall_first: Union[List[str], str] = None):
     if os.getenv("WAS_BLOCK_AUTO_INSTALL", 'False').lower() in ('true', '1', 't'):
@@ -350,9 +420,155 @@ def install_package(package, uninstall_first: Union[List[str], str] = None):
             uninstall_first = [uninstall_first]
 
         cstr(f"Uninstalling {', '.join(uninstall_first)}..")
-        subprocess.check_call([sys.executable, '-s', '-m', 'pip', 'uninstall', *uninstall_first])
-        cstr("Installing package...").msg.print()
-        subprocess.check_call([sys.executable, '-s', '-m', 'pip', '-q', 'install', package])
+        try:
+            subprocess.check_call([sys.executable, '-s', '-m', 'pip', 'uninstall', *uninstall_first])
+            cstr("Installing package...").msg.print()
+            subprocess.check_call([sys.executable, '-s', '-m', 'pip', '-q', 'install', package])
+        finally:
+            import importlib
+            importlib.invalidate_caches()
+            resolve_packages(refresh=True)
+
+# Resolve installed packages once at startup, so node execution never spawns pip to check
+with startup_step("package registry"):
+    try:
+        resolve_packages()
+    except Exception as e:
+        cstr(f"Unable to resolve installed packages: {e}").warning.print()
+
+# Deferred Imports
+#
+# Heavy modules (OpenCV, numba) are bound to module-level proxies that import on first
+# attribute access, so registering nodes costs nothing until a node actually needs them.
+# Set `lazy_imports` to `false` in the config to load them during startup instead.
+
+LAZY_LOCK = threading.RLock()
+LAZY_MODULES = {}
+LAZY_IMPORT_TIMES = {}
+
+class LazyModule:
+    def __init__(self, name, loader=None):
+        self._name = name
+        self._loader = loader
+        self._module = None
+        LAZY_MODULES[name] = self
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with LAZY_LOCK:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = self._loader() if self._loader else importlib.import_module(self._name)
+                    elapsed = time.perf_counter() - start
+                    LAZY_IMPORT_TIMES[self._name] = elapsed
+                    if STARTUP_COMPLETE and was_config.get('show_startup_junk', False):
+                        cstr(f"Loaded `{self._name}` on first use in {elapsed:.2f}s").msg.print()
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "deferred"
+        return f"<LazyModule '{self._name}' ({state})>"
+
+# OpenCV import with the install fallback and FFMPEG build check that used to run at startup
+def import_opencv():
+    try:
+        import cv2
+    except ImportError:
+        cstr("OpenCV Python module cannot be found. Attempting install...").warning.print()
+        install_package(
+            package='opencv-python-headless[ffmpeg]',
+            uninstall_first=['opencv-python', 'opencv-python-headless[ffmpeg]']
+        )
+        try:
+            import cv2
+            cstr("OpenCV Python installed.").msg.print()
+        except ImportError:
+            cstr("OpenCV Python module still cannot be imported. There is a system conflict.").error.print()
+            raise
+    build_info = ' '.join(cv2.getBuildInformation().split())
+    if "FFMPEG: YES" in build_info:
+        if was_config.__contains__('show_startup_junk'):
+            if was_config['show_startup_junk']:
+                cstr("OpenCV Python FFMPEG support is enabled").msg.print()
+        if was_config.__contains__('ffmpeg_bin_path'):
+            if was_config['ffmpeg_bin_path'] == "/path/to/ffmpeg":
+                cstr(f"`ffmpeg_bin_path` is not set in `{WAS_CONFIG_FILE}` config file. Will attempt to use system ffmpeg binaries if available.").warning.print()
+            else:
+                if was_config.__contains__('show_startup_junk'):
+                    if was_config['show_startup_junk']:
+                        cstr(f"`ffmpeg_bin_path` is set to: {was_config['ffmpeg_bin_path']}").msg.print()
+    else:
+        cstr(f"OpenCV Python FFMPEG support is not enabled\033[0m. OpenCV Python FFMPEG support, and FFMPEG binaries is required for video writing.").warning.print()
+    return cv2
+
+cv2 = LazyModule('cv2', loader=import_opencv)
+numba = LazyModule('numba')
+
+# Deferred numba kernels
+#
+# `@lazy_jit(...)` records the Python function and only hands it to `numba.jit` on the first
+# call of any kernel. Kernels call each other (and `prange`) through module globals, which
+# numba resolves when it compiles, so all pending kernels are swapped for their dispatchers
+# at once before any of them runs. `prange` is plain `range` until then.
+
+LAZY_KERNELS = []
+prange = range
+
+class LazyKernel:
+    def __init__(self, py_func, options):
+        functools.update_wrapper(self, py_func)
+        self.py_func = py_func
+        self.options = options
+        self.dispatcher = None
+
+    def __call__(self, *args, **kwargs):
+        if self.dispatcher is None:
+            compile_lazy_kernels()
+        return self.dispatcher(*args, **kwargs)
+
+def lazy_jit(**options):
+    def decorator(py_func):
+        kernel = LazyKernel(py_func, options)
+        LAZY_KERNELS.append(kernel)
+        return kernel
+    return decorator
+
+def compile_lazy_kernels():
+    global prange
+    with LAZY_LOCK:
+        pending = [kernel for kernel in LAZY_KERNELS if kernel.dispatcher is None]
+        if not pending:
+            return
+        prange = numba.prange
+        dispatchers = {kernel: numba.jit(**kernel.options)(kernel.py_func) for kernel in pending}
+        for kernel, dispatcher in dispatchers.items():
+            globals()[kernel.__name__] = dispatcher
+        for kernel, dispatcher in dispatchers.items():
+            kernel.dispatcher = dispatcher
+
+def warm_lazy_imports():
+    for module in LAZY_MODULES.values():
+        module.load()
+    compile_lazy_kernels()
+
+def startup_report():
+    total = time.perf_counter() - WAS_IMPORT_START
+    steps = dict(STARTUP_TIMES)
+    steps["node definitions"] = max(0.0, total - sum(steps.values()))
+    cstr(f"Startup took {total:.2f}s:").msg.print()
+    for name, elapsed in sorted(steps.items(), key=lambda item: item[1], reverse=True):
+        print(f"    {name:<20} {elapsed:>8.3f}s {(elapsed / total * 100) if total else 0:>6.1f}%")
+    deferred = [name for name, module in LAZY_MODULES.items() if not module.loaded]
+    if deferred:
+        cstr(f"Deferred until first use: {', '.join(deferred)}").msg.print()
 
 # Tensor to PIL
 def tensor2pil(image):
@@ -438,7 +654,7 @@ def image2seed(image):
 def get_sha256(file_path):
     sha256_hash = hashlib.sha256()
     with open(file_path, 'rb') as file:
-        for chunk in iter(lambda: file.read(4096), b''):
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
             sha256_hash.update(chunk)
     return sha256_hash.hexdigest()
 
@@ -449,27 +665,193 @@ def seed_batch(seed, batches, seeds):
     return btch
 
 # Download File
-def download_file(url, filename=None, path=None):
+#
+# Streams to `<file>.part` in large chunks and resumes an interrupted partial file with an
+# HTTP Range request. The result must match the full SHA-256 digest given as `sha256`, or
+# the one listed below for known files, before it is atomically renamed into place. A
+# `<file>.lock` keeps concurrent ComfyUI processes from fetching the same file at once.
+
+KNOWN_DOWNLOAD_HASHES = {
+    "sam_vit_h_4b8939.pth": "a7bf3b02f3ebf1267aba913ff637d9a2d5c33d3173bb679e46d9f338c26f262e",
+    "sam_vit_l_0b3195.pth": "3adcc4315b642a4d2101128f611684e8734c41232a17c648ed1693702a49a622",
+    "sam_vit_b_01ec64.pth": "ec2df62732614e57411cdcf32a23ffdf28910380d03139ee0f4fcbe91eb8c912",
+}
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+class FileLock:
+    # Locks held by this process. One background thread keeps them fresh, so a live holder
+    # is never taken for a dead one however long it works between writes
+    held = set()
+    held_lock = threading.Lock()
+    refresher = None
+
+    def __init__(self, path, stale_after=120, poll_interval=0.5):
+        self.path = path
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.token = None
+
+    def acquire(self, timeout=None):
+        start = time.time()
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.break_stale():
+                    continue
+            else:
+                self.token = f"{os.getpid()}:{os.urandom(8).hex()}".encode()
+                os.write(self.fd, self.token)
+                self.hold()
+                return True
+            if timeout is not None and time.time() - start > timeout:
+                return False
+            time.sleep(self.poll_interval)
+
+    def holder(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def break_stale(self):
+        try:
+            if time.time() - os.path.getmtime(self.path) <= self.stale_after:
+                return False
+            stale_holder = self.holder(self.path)
+        except FileNotFoundError:
+            # Released in the meantime
+            return True
+        except OSError:
+            return False
+        # Move the lock aside before removing it: only one process can rename it, and a lock
+        # retaken by a live holder in between is recognized by its token and handed back
+        aside = f"{self.path}.{os.getpid()}.{os.urandom(4).hex()}.stale"
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+        try:
+            if self.holder(aside) != stale_holder or time.time() - os.path.getmtime(aside) <= self.stale_after:
+                try:
+                    os.link(aside, self.path)
+                except OSError:
+                    pass
+                return False
+            cstr(f"Removed stale lock `{self.path}`").warning.print()
+            return True
+        finally:
+            try:
+                os.remove(aside)
+            except OSError:
+                pass
+
+    def hold(self):
+        cls = FileLock
+        with cls.held_lock:
+            cls.held.add(self)
+            if cls.refresher is None:
+                cls.refresher = threading.Thread(target=cls.refresh_held, name="was_file_lock", daemon=True)
+                cls.refresher.start()
+
+    @classmethod
+    def refresh_held(cls):
+        while True:
+            with cls.held_lock:
+                locks = list(cls.held)
+            for lock in locks:
+                lock.touch()
+            time.sleep(min([lock.stale_after / 4 for lock in locks] + [1.0]))
+
+    def touch(self):
+        try:
+            os.utime(self.path, None)
+        except OSError:
+            pass
+
+    def release(self):
+        if self.fd is not None:
+            with FileLock.held_lock:
+                FileLock.held.discard(self)
+            os.close(self.fd)
+            self.fd = None
+            # Only remove the lock while it is still ours
+            try:
+                if self.holder(self.path) == self.token:
+                    os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+def download_file(url, filename=None, path=None, sha256=None, chunk_size=DOWNLOAD_CHUNK_SIZE, timeout=60):
     if not filename:
         filename = url.split('/')[-1]
     if not path:
         path = '.'
+    os.makedirs(path, exist_ok=True)
     save_path = os.path.join(path, filename)
-    response = requests.get(url, stream=True)
-    if response.status_code == requests.codes.ok:
-        file_size = int(response.headers.get('Content-Length', 0))
-        with open(save_path, 'wb') as file:
-            with tqdm(total=file_size, unit='B', unit_scale=True, unit_divisor=1024) as progress:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-                    progress.update(len(chunk))
-        print(f"Downloaded file saved at: {save_path}")
-        return True
-    elif response.status_code == requests.codes.not_found:
-        cstr("Error: File not found.").error.print()
-    else:
-        cstr(f"Error: Failed to download file. Status code: {response.status_code}").error.print()
-    return False
+    partial_path = save_path + '.part'
+    if sha256 is None:
+        sha256 = KNOWN_DOWNLOAD_HASHES.get(filename)
+    if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", sha256):
+        raise ValueError(f"Expected a full SHA-256 digest for `{filename}`, got `{sha256}`")
+
+    with FileLock(save_path + '.lock'):
+        # Another process may have finished the download while we waited for the lock
+        if os.path.exists(save_path):
+            return True
+
+        resume_from = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+        try:
+            with requests.get(url, stream=True, headers=headers, timeout=timeout) as response:
+                if response.status_code == requests.codes.not_found:
+                    cstr("Error: File not found.").error.print()
+                    return False
+                # 416 means the partial file already holds the whole resource
+                if response.status_code != requests.codes.requested_range_not_satisfiable:
+                    if response.status_code == requests.codes.partial_content:
+                        mode = 'ab'
+                    elif response.status_code == requests.codes.ok:
+                        resume_from = 0
+                        mode = 'wb'
+                    else:
+                        cstr(f"Error: Failed to download file. Status code: {response.status_code}").error.print()
+                        return False
+                    file_size = resume_from + int(response.headers.get('Content-Length', 0))
+                    if resume_from:
+                        cstr(f"Resuming download of `{filename}` at {resume_from} bytes").msg.print()
+                    with open(partial_path, mode) as file:
+                        with tqdm(total=file_size, initial=resume_from, unit='B', unit_scale=True, unit_divisor=1024) as progress:
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                if chunk:
+                                    file.write(chunk)
+                                    progress.update(len(chunk))
+        except requests.RequestException as e:
+            cstr(f"Error: Download of `{filename}` interrupted, it will resume on the next attempt: {e}").error.print()
+            return False
+
+        digest = get_sha256(partial_path)
+        if sha256:
+            if digest != sha256.lower():
+                cstr(f"Error: Checksum mismatch for `{filename}` (expected {sha256}, got {digest}). Discarding download.").error.print()
+                os.remove(partial_path)
+                return False
+        else:
+            cstr(f"No known checksum for `{filename}`, SHA-256 of the download: {digest}").warning.print()
+
+        os.replace(partial_path, save_path)
+
+    print(f"Downloaded file saved at: {save_path}")
+    return True
 
 # NSP Function
 
@@ -479,13 +861,10 @@ def nsp_parse(text, seed=0, noodle_key='__', nspterminology=None, pantry_path=No
         if pantry_path is None:
             pantry_path = DEFAULT_NSP_PANTRY_PATH
         if not os.path.exists(pantry_path):
-            response = urlopen('https://raw.githubusercontent.com/WASasquatch/noodle-soup-prompts/main/nsp_pantry.json')
-            tmp_pantry = json.loads(response.read())
-            # Dump JSON locally
-            pantry_serialized = json.dumps(tmp_pantry, indent=4)
-            with open(pantry_path, "w") as f:
-                f.write(pantry_serialized)
-            del response, tmp_pantry
+            pantry_url = 'https://raw.githubusercontent.com/WASasquatch/noodle-soup-prompts/main/nsp_pantry.json'
+            if not download_file(pantry_url, os.path.basename(pantry_path), os.path.dirname(pantry_path)):
+                cstr(f"Unable to fetch the NSP pantry from `{pantry_url}`.").error.print()
+                return text
 
         # Load local pantry
         with open(pantry_path, 'r') as f:
@@ -604,71 +983,332 @@ def parse_dynamic_prompt(prompt, seed):
 
     return parse_prompt
 
-# Ambient Occlusion Factor
-
-@jit(nopython=True)
-def calculate_ambient_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
-    occlusion_array = np.zeros((height, width), dtype=np.uint8)
+# Occlusion Kernels
+#
+# Both occlusion filters average clamped (or absolute) differences between a pixel and its
+# (2r+1)^2 neighbourhood. The inputs are 8-bit levels, so each sum is recovered from a
+# sliding histogram of the window: counts and level sums below the centre value give
+# sum(max(0, v - n)), and the window totals give the rest. A row keeps one two-level
+# histogram (16 coarse bins over 256 fine bins) per channel and slides it one column at a
+# time, so a pixel costs O(r) updates and a 32 bin query instead of O(r^2) differences.
+
+@lazy_jit(nopython=True, cache=True)
+def _occlusion_window_update(fine, coarse, coarse_sum, levels, b, y0, y1, x, channels, step):
+    for yy in range(y0, y1):
+        for c in range(channels):
+            v = levels[b, yy, x, c]
+            fine[c, v] += step
+            coarse[c, v >> 4] += step
+            coarse_sum[c, v >> 4] += step * v
+
+@lazy_jit(nopython=True, cache=True)
+def _occlusion_below(fine, coarse, coarse_sum, c, v):
+    count = 0
+    total = 0
+    cb = v >> 4
+    for k in range(cb):
+        count += coarse[c, k]
+        total += coarse_sum[c, k]
+    for k in range(cb << 4, v):
+        count += fine[c, k]
+        total += fine[c, k] * k
+    return count, total
+
+@lazy_jit(nopython=True, parallel=True, cache=True)
+def occlusion_factor_batch(rgb_levels, depth_levels, radius, direct):
+    batch, height, width = rgb_levels.shape[:3]
+    depth_channels = depth_levels.shape[3]
+    channels = 3 + depth_channels
+    factors = np.zeros((batch, height, width))
+    if radius <= 0:
+        return factors
+
+    for row in prange(batch * height):
+        b = row // height
+        y = row % height
+        y0 = max(y - radius, 0)
+        y1 = min(y + radius + 1, height)
+
+        # Channels 0-2 hold rgb, the rest hold depth
+        fine = np.zeros((channels, 256), dtype=np.int64)
+        coarse = np.zeros((channels, 16), dtype=np.int64)
+        coarse_sum = np.zeros((channels, 16), dtype=np.int64)
+        rgb_fine, rgb_coarse, rgb_coarse_sum = fine[:3], coarse[:3], coarse_sum[:3]
+        depth_fine, depth_coarse, depth_coarse_sum = fine[3:], coarse[3:], coarse_sum[3:]
+
+        for x in range(min(radius + 1, width)):
+            _occlusion_window_update(rgb_fine, rgb_coarse, rgb_coarse_sum, rgb_levels, b, y0, y1, x, 3, 1)
+            _occlusion_window_update(depth_fine, depth_coarse, depth_coarse_sum, depth_levels, b, y0, y1, x, depth_channels, 1)
 
-    for y in range(height):
         for x in range(width):
-            if radius == 0:
-                occlusion_factor = 0
-            else:
-                y_min = max(y - radius, 0)
-                y_max = min(y + radius + 1, height)
-                x_min = max(x - radius, 0)
-                x_max = min(x + radius + 1, width)
-
-                neighborhood_depth = depth_normalized[y_min:y_max, x_min:x_max]
-                neighborhood_rgb = rgb_normalized[y_min:y_max, x_min:x_max, :]
+            area = (y1 - y0) * (min(x + radius + 1, width) - max(x - radius, 0))
+
+            # Mean of sum over channels of |v - n|
+            rgb_term = 0
+            for c in range(3):
+                v = rgb_levels[b, y, x, c]
+                count, total = _occlusion_below(rgb_fine, rgb_coarse, rgb_coarse_sum, c, v)
+                window_total = 0
+                for k in range(16):
+                    window_total += rgb_coarse_sum[c, k]
+                rgb_term += (window_total - area * v) + 2 * (count * v - total)
+
+            # Mean of max(0, v - n) for ambient, max(0, n - v) for direct
+            depth_term = 0
+            for c in range(depth_channels):
+                v = depth_levels[b, y, x, c]
+                count, total = _occlusion_below(depth_fine, depth_coarse, depth_coarse_sum, c, v)
+                below = count * v - total
+                if direct:
+                    window_total = 0
+                    for k in range(16):
+                        window_total += depth_coarse_sum[c, k]
+                    depth_term += (window_total - area * v) + below
+                else:
+                    depth_term += below
+
+            factors[b, y, x] = (depth_term / (area * depth_channels) + rgb_term / area) / 255.0
+
+            if x - radius >= 0:
+                _occlusion_window_update(rgb_fine, rgb_coarse, rgb_coarse_sum, rgb_levels, b, y0, y1, x - radius, 3, -1)
+                _occlusion_window_update(depth_fine, depth_coarse, depth_coarse_sum, depth_levels, b, y0, y1, x - radius, depth_channels, -1)
+            if x + radius + 1 < width:
+                _occlusion_window_update(rgb_fine, rgb_coarse, rgb_coarse_sum, rgb_levels, b, y0, y1, x + radius + 1, 3, 1)
+                _occlusion_window_update(depth_fine, depth_coarse, depth_coarse_sum, depth_levels, b, y0, y1, x + radius + 1, depth_channels, 1)
+
+    return factors
+
+def occlusion_levels(images):
+    images = np.asarray(images)
+    if images.dtype != np.uint8:
+        images = np.clip(np.round(images * 255.0), 0, 255).astype(np.uint8)
+    if images.ndim == 3:
+        images = images[..., None]
+    return np.ascontiguousarray(images)
+
+def occlusion_inputs(images, depth_images):
+    rgb_images = [tensor2pil(image).convert("RGB") for image in images]
+    depth_levels = []
+    for i, rgb_image in enumerate(rgb_images):
+        depth_image = tensor2pil(depth_images[min(i, len(depth_images) - 1)])
+        if depth_image.size != rgb_image.size:
+            depth_image = depth_image.resize(rgb_image.size)
+        depth_levels.append(np.array(depth_image))
+    return rgb_images, np.stack(depth_levels)
 
-                depth_diff = depth_normalized[y, x] - neighborhood_depth
-                rgb_diff = np.abs(rgb_normalized[y, x] - neighborhood_rgb)
-                occlusion_factor = np.maximum(0, depth_diff).mean() + np.maximum(0, np.sum(rgb_diff, axis=2)).mean()
+# Ambient Occlusion Factor
 
-            occlusion_value = int(255 - occlusion_factor * 255)
-            occlusion_array[y, x] = occlusion_value
+def ambient_occlusion_batch(rgb_levels, depth_levels, radius):
+    factors = occlusion_factor_batch(occlusion_levels(rgb_levels), occlusion_levels(depth_levels), int(radius), False)
+    return np.clip(np.trunc(255 - factors * 255), 0, 255).astype(np.uint8)
 
-    return occlusion_array
+def calculate_ambient_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
+    return ambient_occlusion_batch(rgb_normalized[None], depth_normalized[None], radius)[0]
 
 # Direct Occlusion Factor
 
-@jit(nopython=True)
-def calculate_direct_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
-    occlusion_array = np.empty((int(height), int(width)), dtype=np.uint8)
-    depth_normalized = depth_normalized[:, :, 0]
-
-    for y in range(int(height)):
-        for x in range(int(width)):
-            if radius == 0:
-                occlusion_factor = 0
-            else:
-                y_min = max(int(y - radius), 0)
-                y_max = min(int(y + radius + 1), int(height))
-                x_min = max(int(x - radius), 0)
-                x_max = min(int(x + radius + 1), int(width))
+def direct_occlusion_batch(rgb_levels, depth_levels, radius):
+    depth_levels = occlusion_levels(depth_levels)[..., :1]
+    factors = occlusion_factor_batch(occlusion_levels(rgb_levels), depth_levels, int(radius), True)
+    occlusion = np.clip(np.trunc(factors * 255), 0, 255)
+    occlusion_min = occlusion.min(axis=(1, 2), keepdims=True)
+    occlusion_range = np.maximum(occlusion.max(axis=(1, 2), keepdims=True) - occlusion_min, 1)
+    return ((occlusion - occlusion_min) / occlusion_range * 255).astype(np.uint8)
 
-                neighborhood_depth = np.zeros((y_max - y_min, x_max - x_min), dtype=np.float64)
-                neighborhood_rgb = np.empty((y_max - y_min, x_max - x_min, 3))
-
-                for i in range(y_min, y_max):
-                    for j in range(x_min, x_max):
-                        neighborhood_depth[i - y_min, j - x_min] = depth_normalized[i, j]
-                        neighborhood_rgb[i - y_min, j - x_min, :] = rgb_normalized[i, j, :]
+def calculate_direct_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
+    return direct_occlusion_batch(rgb_normalized[None], depth_normalized[None], radius)[0]
 
-                depth_diff = neighborhood_depth - depth_normalized[y, x]
-                rgb_diff = np.abs(neighborhood_rgb - rgb_normalized[y, x])
-                occlusion_factor = np.maximum(0, depth_diff).mean() + np.maximum(0, np.sum(np.abs(rgb_diff), axis=2)).mean()
+# Perlin Noise Kernels
+#
+# Compiled once per process on first use (and cached to disk) so the Perlin nodes no
+# longer re-JIT their helpers on every call. The octave stack is evaluated per pixel in a
+# single parallel kernel, summing octaves in the same order as the original loops
+# so output stays seed-for-seed identical.
+
+@lazy_jit(nopython=True, cache=True)
+def _perlin_fade(t):
+    return 6 * t**5 - 15 * t**4 + 10 * t**3
+
+@lazy_jit(nopython=True, cache=True)
+def _perlin_lerp(t, a, b):
+    return a + t * (b - a)
+
+@lazy_jit(nopython=True, cache=True)
+def _perlin_grad(hash, x, y, z):
+    h = hash & 15
+    u = x if h < 8 else y
+    v = y if h < 4 else (x if h == 12 or h == 14 else z)
+    return (u if (h & 1) == 0 else -u) + (v if (h & 2) == 0 else -v)
+
+@lazy_jit(nopython=True, cache=True)
+def _perlin_noise(x, y, z, p):
+    X = np.int32(np.floor(x)) & 255
+    Y = np.int32(np.floor(y)) & 255
+    Z = np.int32(np.floor(z)) & 255
+
+    x -= np.floor(x)
+    y -= np.floor(y)
+    z -= np.floor(z)
+
+    u = _perlin_fade(x)
+    v = _perlin_fade(y)
+    w = _perlin_fade(z)
+
+    A = p[X] + Y
+    AA = p[A] + Z
+    AB = p[A + 1] + Z
+    B = p[X + 1] + Y
+    BA = p[B] + Z
+    BB = p[B + 1] + Z
+
+    return _perlin_lerp(w, _perlin_lerp(v, _perlin_lerp(u, _perlin_grad(p[AA], x, y, z), _perlin_grad(p[BA], x - 1, y, z)),
+                                           _perlin_lerp(u, _perlin_grad(p[AB], x, y - 1, z), _perlin_grad(p[BB], x - 1, y - 1, z))),
+                        _perlin_lerp(v, _perlin_lerp(u, _perlin_grad(p[AA + 1], x, y, z - 1), _perlin_grad(p[BA + 1], x - 1, y, z - 1)),
+                                        _perlin_lerp(u, _perlin_grad(p[AB + 1], x, y - 1, z - 1), _perlin_grad(p[BB + 1], x - 1, y - 1, z - 1))))
+
+@lazy_jit(nopython=True, parallel=True, cache=True)
+def perlin_octave_stack(width, height, scale, frequencies, amplitudes, p):
+    noise_map = np.zeros((height, width))
+    for y in prange(height):
+        for x in range(width):
+            value = 0.0
+            for octave in range(frequencies.shape[0]):
+                nx = x / scale * frequencies[octave]
+                ny = y / scale * frequencies[octave]
+                value += _perlin_noise(nx, ny, 0.0, p) * amplitudes[octave]
+            noise_map[y, x] = value
+    return noise_map
+
+# Perlin Permutation Table
+def perlin_permutation(seed=None):
+    if seed:
+        random.seed(seed)
+    p = np.arange(256, dtype=np.int32)
+    random.shuffle(p)
+    return np.concatenate((p, p))
+
+# Perlin Octave Stack to 8-bit Noise Map
+def perlin_noise_map(width, height, scale, frequencies, amplitudes, seed=None):
+    p = perlin_permutation(seed)
+    noise_map = perlin_octave_stack(int(width), int(height), float(scale),
+                                    np.asarray(frequencies, dtype=np.float64),
+                                    np.asarray(amplitudes, dtype=np.float64), p)
+    min_value = np.min(noise_map)
+    max_value = np.max(noise_map)
+    return np.interp(noise_map, (min_value, max_value), (0, 255)).astype(np.uint8)
+
+# Dithering Kernels
+#
+# Error diffusion is inherently serial within a frame, so each frame runs in a compiled
+# loop and frames of a batch are spread across threads. Diffusion matrices are given
+# as (row offset, column offset, weight) triplets.
+
+DITHER_DIFFUSION_MATRICES = {
+    "FloydSteinberg": [(0, 1, 7/16), (1, -1, 3/16), (1, 0, 5/16), (1, 1, 1/16)],
+    "Atkinson": [(0, 1, 1/8), (0, 2, 1/8), (1, -1, 1/8), (1, 0, 1/8), (1, 1, 1/8), (2, 0, 1/8)],
+    "JarvisJudiceNinke": [(0, 1, 7/48), (0, 2, 5/48),
+                          (1, -2, 3/48), (1, -1, 5/48), (1, 0, 7/48), (1, 1, 5/48), (1, 2, 3/48),
+                          (2, -2, 1/48), (2, -1, 3/48), (2, 0, 5/48), (2, 1, 3/48), (2, 2, 1/48)],
+}
 
-            occlusion_value = int(occlusion_factor * 255)
-            occlusion_array[y, x] = occlusion_value
+BAYER_MATRIX_4X4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5]
+], dtype=np.float64)
+
+@lazy_jit(nopython=True, parallel=True, cache=True)
+def error_diffusion_dither_batch(batch, levels, offsets_y, offsets_x, weights):
+    count, height, width, channels = batch.shape
+    for b in prange(count):
+        arr = batch[b]
+        for y in range(height):
+            for x in range(width):
+                for c in range(channels):
+                    old_val = arr[y, x, c]
+                    new_val = np.round(old_val * (levels - 1)) / (levels - 1)
+                    arr[y, x, c] = new_val
+                    err = old_val - new_val
+                    for k in range(weights.shape[0]):
+                        ny = y + offsets_y[k]
+                        nx = x + offsets_x[k]
+                        if ny < height and nx >= 0 and nx < width:
+                            arr[ny, nx, c] += err * weights[k]
+    return batch
+
+# Dither Image Batch (uint8 NHWC in, uint8 NHWC out)
+def dither_batch(images, mode='FloydSteinberg', levels=16):
+    levels = max(int(levels), 2)
+    arr = images.astype(np.float64) / 255
+
+    if mode == 'Ordered':
+        height, width = arr.shape[1:3]
+        threshold = (BAYER_MATRIX_4X4 + 0.5) / 16 - 0.5
+        threshold = np.tile(threshold, (height // 4 + 1, width // 4 + 1))[:height, :width, np.newaxis]
+        arr = np.round(arr * (levels - 1) + threshold) / (levels - 1)
+    elif mode in DITHER_DIFFUSION_MATRICES:
+        matrix = np.array(DITHER_DIFFUSION_MATRICES[mode])
+        arr = error_diffusion_dither_batch(np.ascontiguousarray(arr), levels,
+                                           matrix[:, 0].astype(np.int64), matrix[:, 1].astype(np.int64), matrix[:, 2])
+    else:
+        cstr(f"Inavlid dithering mode `{mode}` selected.").error.print()
+        return images
 
-    occlusion_min = np.min(occlusion_array)
-    occlusion_max = np.max(occlusion_array)
-    occlusion_scaled = ((occlusion_array - occlusion_min) / (occlusion_max - occlusion_min) * 255).astype(np.uint8)
+    return np.clip(arr * 255, 0, 255).astype(np.uint8)
 
-    return occlusion_scaled
+# Palette Mapping
+#
+# Nearest palette colors are resolved through a 32x32x32 RGB lookup table built from the
+# bin centers, so mapping a frame is a single gather. Tables are cached per palette and
+# mode, so a batch sharing one palette only pays for it once.
+
+PALETTE_LUT_BITS = 5
+
+def palette_mode_order(palette, mode='Linear'):
+    palette = np.asarray(palette, dtype=np.int64).reshape(-1, 3)
+    if mode == 'Linear':
+        return list(range(len(palette)))
+    elif mode == 'Brightness':
+        return sorted(range(len(palette)), key=lambda i: palette[i].sum() / 3)
+    elif mode == 'Tonal':
+        return sorted(range(len(palette)), key=lambda i: np.abs(palette[i] - 128).sum())
+    elif mode == 'BrightnessAndTonal':
+        return sorted(range(len(palette)), key=lambda i: (palette[i].sum() / 3, np.abs(palette[i] - 128).sum()))
+    else:
+        raise ValueError(f"Unsupported mapping mode: {mode}")
+
+def palette_distances(pixels, palette, mode='Linear'):
+    pixels = pixels.astype(np.float64)[:, np.newaxis, :]
+    palette = palette.astype(np.float64)[np.newaxis, :, :]
+    luma = np.array([0.299, 0.587, 0.114])
+    if mode == 'Tonal':
+        return np.abs(pixels @ luma - palette @ luma)
+    distance = np.abs(pixels - palette).sum(axis=2)
+    if mode == 'BrightnessAndTonal':
+        distance += np.abs(pixels @ luma - palette @ luma)
+    return distance
+
+@functools.lru_cache(maxsize=32)
+def palette_lut(palette, mode='Linear'):
+    palette = np.array(palette, dtype=np.int64).reshape(-1, 3)
+    order = np.array(palette_mode_order(palette, mode), dtype=np.int64)
+    bins = np.arange(0, 256, 1 << (8 - PALETTE_LUT_BITS)) + (1 << (7 - PALETTE_LUT_BITS))
+    centers = np.stack(np.meshgrid(bins, bins, bins, indexing='ij'), axis=-1).reshape(-1, 3)
+    nearest = np.argmin(palette_distances(centers, palette[order], mode), axis=1)
+    return order[nearest]
+
+# Map uint8 HWC image to palette colors (palette as a tuple of RGB tuples)
+def map_to_palette(image, palette, mode='Linear'):
+    palette_array = np.array(palette, dtype=np.uint8).reshape(-1, 3)
+    image = image[..., :3]
+    if mode == 'Linear':
+        return palette_array[image[..., 0].astype(np.int64) % len(palette_array)]
+    lut = palette_lut(tuple(palette), mode)
+    shift = 8 - PALETTE_LUT_BITS
+    q = image.astype(np.int64) >> shift
+    index = (q[..., 0] << (2 * PALETTE_LUT_BITS)) | (q[..., 1] << PALETTE_LUT_BITS) | q[..., 2]
+    return palette_array[lut[index]]
 
 
 class PromptStyles:
@@ -737,11 +1377,18 @@ class WASDatabase:
     data in a flatfile using the JSON format. Each key-value pair is associated with
     a category.
 
+    Changes are appended to a `<file>.log` journal instead of rewriting the JSON file.
+    Writes within `flush_delay` seconds are coalesced into one append, and the journal
+    is folded back into the JSON file once it outgrows it and at exit. Appends and
+    compaction hold a cross-process lock file. Every process replays the journal lines
+    written by the others before it reads or writes.
+
     Attributes:
         filepath (str): The path to the JSON file where the data is stored.
         data (dict): The dictionary that holds the data read from the JSON file.
 
     Methods:
+        shared(filepath): Returns the process-wide instance for a database file.
         insert(category, key, value): Inserts a key-value pair into the database
             under the specified category.
         get(category, key): Retrieves the value associated with the specified
@@ -750,81 +1397,273 @@ class WASDatabase:
             key and category from the database.
         delete(category, key): Deletes the key-value pair associated with the
             specified key and category from the database.
-        _save(): Saves the current state of the database to the JSON file.
+        flush(): Appends pending changes to the journal.
+        compact(): Writes the current state to the JSON file and empties the journal.
+        _save(): Schedules a flush of the pending changes.
     """
-    def __init__(self, filepath):
+    COMPACT_MIN_BYTES = 1024 * 1024
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, filepath, flush_delay=0.5):
         self.filepath = filepath
-        try:
-            with open(filepath, 'r') as f:
-                self.data = json.load(f)
-        except FileNotFoundError:
-            self.data = {}
+        self.log_path = f"{filepath}.log"
+        self.file_lock = FileLock(f"{filepath}.lock", stale_after=30, poll_interval=0.01)
+        self.lock = threading.RLock()
+        self.flush_delay = flush_delay
+        self.pending = {}
+        self.timer = None
+        self.log_state = (None, 0)
+        self.data = {}
+        with self.lock:
+            self._reload()
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls, filepath):
+        filepath = os.path.abspath(filepath)
+        with cls.instances_lock:
+            if filepath not in cls.instances:
+                cls.instances[filepath] = cls(filepath)
+            return cls.instances[filepath]
 
     def catExists(self, category):
-        return category in self.data
+        with self.lock:
+            self._sync()
+            return category in self.data
 
     def keyExists(self, category, key):
-        return category in self.data and key in self.data[category]
+        with self.lock:
+            self._sync()
+            return category in self.data and key in self.data[category]
 
     def insert(self, category, key, value):
         if not isinstance(category, str) or not isinstance(key, str):
             cstr("Category and key must be strings").error.print()
             return
 
-        if category not in self.data:
-            self.data[category] = {}
-        self.data[category][key] = value
-        self._save()
-
-    def update(self, category, key, value):
-        if category in self.data and key in self.data[category]:
+        with self.lock:
+            if category not in self.data:
+                self.data[category] = {}
+                self.pending[(category, None)] = "cat"
             self.data[category][key] = value
+            self.pending[(category, key)] = "set"
             self._save()
 
+    def update(self, category, key, value):
+        with self.lock:
+            if category in self.data and key in self.data[category]:
+                self.data[category][key] = value
+                self.pending[(category, key)] = "set"
+                self._save()
+
     def updateCat(self, category, dictionary):
-        self.data[category].update(dictionary)
-        self._save()
+        with self.lock:
+            self.data[category].update(dictionary)
+            for key in dictionary.keys():
+                self.pending[(category, key)] = "set"
+            self._save()
 
     def get(self, category, key):
-        return self.data.get(category, {}).get(key, None)
+        with self.lock:
+            self._sync()
+            return self.data.get(category, {}).get(key, None)
 
     def getDB(self):
-        return self.data
+        with self.lock:
+            self._sync()
+            return self.data
 
     def insertCat(self, category):
         if not isinstance(category, str):
             cstr("Category must be a string").error.print()
             return
 
-        if category in self.data:
-            cstr(f"The database category '{category}' already exists!").error.print()
-            return
-        self.data[category] = {}
-        self._save()
+        with self.lock:
+            if category in self.data:
+                cstr(f"The database category '{category}' already exists!").error.print()
+                return
+            self.data[category] = {}
+            self.pending[(category, None)] = "cat"
+            self._save()
 
     def getDict(self, category):
-        if category not in self.data:
-            cstr(f"The database category '{category}' does not exist!").error.print()
-            return {}
-        return self.data[category]
+        with self.lock:
+            self._sync()
+            if category not in self.data:
+                cstr(f"The database category '{category}' does not exist!").error.print()
+                return {}
+            return self.data[category]
 
     def delete(self, category, key):
-        if category in self.data and key in self.data[category]:
-            del self.data[category][key]
-            self._save()
+        with self.lock:
+            if category in self.data and key in self.data[category]:
+                del self.data[category][key]
+                self.pending[(category, key)] = "del"
+                self._save()
+
+    # Journal
+
+    def _apply(self, data, entry, skip_pending=False):
+        category, key = entry.get("category"), entry.get("key")
+        # Local changes not flushed yet are newer than anything already in the journal
+        if skip_pending and (category, key) in self.pending:
+            return
+        if entry["op"] == "cat":
+            data.setdefault(category, {})
+        elif entry["op"] == "set":
+            data.setdefault(category, {})[key] = entry["value"]
+        elif entry["op"] == "del":
+            data.get(category, {}).pop(key, None)
+
+    def _replay(self, data, offset, skip_pending=False):
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return offset
+        # A line without its newline is still being written by another process
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                self._apply(data, json.loads(line), skip_pending)
+            except (ValueError, KeyError):
+                continue
+        return offset + end
 
-    def _save(self):
+    def _log_inode(self):
         try:
-            with open(self.filepath, 'w') as f:
-                json.dump(self.data, f, indent=4)
+            return os.stat(self.log_path).st_ino
         except FileNotFoundError:
-            cstr(f"Cannot save database to file '{self.filepath}'. "
-                 "Storing the data in the object instead. Does the folder and node file have write permissions?").warning.print()
-        except Exception as e:
-            cstr(f"Error while saving JSON data: {e}").error.print()
+            return None
+
+    def _reload(self, locked=False):
+        if not locked:
+            try:
+                if not self.file_lock.acquire(timeout=30):
+                    cstr(f"Unable to lock `{self.filepath}`, reading it unlocked").warning.print()
+                    locked = None
+            except OSError:
+                # The folder does not exist yet, there is nothing to read
+                locked = None
+        try:
+            try:
+                with open(self.filepath, 'r') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            inode = self._log_inode()
+            offset = self._replay(data, 0)
+        finally:
+            if locked is False:
+                self.file_lock.release()
+
+        for (category, key), op in self.pending.items():
+            if op == "set" and key in self.data.get(category, {}):
+                data.setdefault(category, {})[key] = self.data[category][key]
+            elif op == "cat":
+                data.setdefault(category, {})
+            elif op == "del":
+                data.get(category, {}).pop(key, None)
+
+        # Update categories in place, callers such as TextTokens hold on to them
+        for category in list(self.data.keys()):
+            if category not in data:
+                del self.data[category]
+        for category, values in data.items():
+            if isinstance(self.data.get(category), dict) and isinstance(values, dict):
+                self.data[category].clear()
+                self.data[category].update(values)
+            else:
+                self.data[category] = values
+        self.log_state = (inode, offset)
+
+    def _sync(self, locked=False):
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        inode, offset = self.log_state
+        if stat.st_ino != inode or stat.st_size < offset:
+            # Another process compacted the journal into the JSON file
+            self._reload(locked)
+        elif stat.st_size > offset:
+            self.log_state = (inode, self._replay(self.data, offset, skip_pending=True))
+
+    def _save(self):
+        if self.flush_delay <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = threading.Timer(self.flush_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            if not self.pending:
+                return
+            try:
+                with self.file_lock:
+                    self._sync(locked=True)
+                    lines = []
+                    for (category, key), op in self.pending.items():
+                        if op == "set":
+                            if key not in self.data.get(category, {}):
+                                continue
+                            entry = {"op": op, "category": category, "key": key, "value": self.data[category][key]}
+                        else:
+                            entry = {"op": op, "category": category, "key": key}
+                        lines.append(json.dumps(entry, separators=(',', ':')) + "\n")
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write("".join(lines))
+                    self.pending.clear()
+                    size = os.path.getsize(self.log_path)
+                    self.log_state = (self._log_inode(), size)
+                    try:
+                        snapshot_size = os.path.getsize(self.filepath)
+                    except FileNotFoundError:
+                        snapshot_size = 0
+                    if size > max(self.COMPACT_MIN_BYTES, snapshot_size):
+                        self._compact()
+            except FileNotFoundError:
+                self.pending.clear()
+                cstr(f"Cannot save database to file '{self.filepath}'. "
+                     "Storing the data in the object instead. Does the folder and node file have write permissions?").warning.print()
+            except Exception as e:
+                self.pending.clear()
+                cstr(f"Error while saving JSON data: {e}").error.print()
+
+    def _compact(self):
+        with open(f"{self.filepath}.tmp", 'w') as f:
+            json.dump(self.data, f, indent=4)
+        os.replace(f"{self.filepath}.tmp", self.filepath)
+        open(f"{self.log_path}.tmp", 'w').close()
+        os.replace(f"{self.log_path}.tmp", self.log_path)
+        self.log_state = (self._log_inode(), 0)
+
+    def compact(self):
+        with self.lock:
+            self.flush()
+            try:
+                with self.file_lock:
+                    self._sync(locked=True)
+                    self._compact()
+            except Exception as e:
+                cstr(f"Error while saving JSON data: {e}").error.print()
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.flush()
+            if self.log_state[1] > 0:
+                self.compact()
 
 # Initialize the settings database
-WDB = WASDatabase(WAS_DATABASE)
+WDB = WASDatabase.shared(WAS_DATABASE)
 
 # WAS Token Class
 
@@ -889,87 +1728,151 @@ class TextTokens:
         self.WDB.updateCat('custom_tokens', self.custom_tokens)
 
 
+# History
+#
+# Image, output image and text file history share one index per category: a dict of
+# path -> time added, ordered oldest to newest, so re-adding a path is a move instead of a
+# list scan and the oldest entries are popped off the front past `history_max_entries`. A per-folder index
+# backs the prefix and subfolder filtering of the save node's history previews. Existence
+# is only checked for entries a query is about to return. Missing files are dropped then,
+# unless they were added moments ago and an async save may still be writing them.
+
+class WASHistory:
+    PENDING_GRACE = 60
+
+    def __init__(self, database_path, limit=1000):
+        self.database_path = database_path
+        self.limit = limit
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.folders = {}
+        self.sources = {}
+
+    @staticmethod
+    def folder_key(path):
+        return os.path.normcase(os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def display_name(path):
+        return os.path.join('...'+os.sep+os.path.basename(os.path.dirname(path)), os.path.basename(path))
+
+    def newest(self, paths):
+        # The last occurrence of each path, oldest to newest, at most `limit` of them
+        newest = []
+        seen = set()
+        for path in reversed(paths):
+            if len(newest) >= self.limit:
+                break
+            if path not in seen:
+                seen.add(path)
+                newest.append(path)
+        newest.reverse()
+        return newest
+
+    def category(self, category):
+        HDB = WASDatabase.shared(self.database_path)
+        saved = HDB.get("History", category) or []
+        # Rebuild when first used or when another process rewrote the saved list
+        if self.sources.get(category) is not saved:
+            entries = collections.OrderedDict((path, 0) for path in self.newest(saved))
+            folders = {}
+            for path in entries:
+                folders.setdefault(self.folder_key(path), collections.OrderedDict())[path] = None
+            self.entries[category] = entries
+            self.folders[category] = folders
+            self.sources[category] = saved
+        return self.entries[category]
+
+    def save(self, category):
+        HDB = WASDatabase.shared(self.database_path)
+        saved = list(self.entries[category].keys())
+        HDB.insert("History", category, saved)
+        self.sources[category] = saved
+
+    def remove(self, category, path):
+        self.entries[category].pop(path, None)
+        folder = self.folders[category].get(self.folder_key(path))
+        if folder is not None:
+            folder.pop(path, None)
+
+    def add(self, category, paths):
+        if isinstance(paths, str):
+            paths = [paths]
+        with self.lock:
+            entries = self.category(category)
+            folders = self.folders[category]
+            now = time.time()
+            for path in self.newest(paths):
+                self.remove(category, path)
+                entries[path] = now
+                folders.setdefault(self.folder_key(path), collections.OrderedDict())[path] = None
+            while len(entries) > self.limit:
+                path, _ = entries.popitem(last=False)
+                folder = folders.get(self.folder_key(path))
+                if folder is not None:
+                    folder.pop(path, None)
+            self.save(category)
+
+    def paths(self, category, limit=None, folder=None, prefix=None):
+        """Newest first, optionally only files in `folder` whose names start with `prefix`."""
+        with self.lock:
+            entries = self.category(category)
+            if folder is not None:
+                candidates = list(self.folders[category].get(os.path.normcase(os.path.abspath(folder)), {}).keys())
+            else:
+                candidates = list(entries.keys())
+
+            found = []
+            missing = []
+            now = time.time()
+            for path in reversed(candidates):
+                if limit is not None and len(found) >= limit:
+                    break
+                if prefix is not None and not os.path.basename(path).startswith(prefix):
+                    continue
+                if not os.path.exists(path):
+                    if now - entries.get(path, 0) > self.PENDING_GRACE:
+                        missing.append(path)
+                    continue
+                found.append(path)
+
+            if missing:
+                for path in missing:
+                    self.remove(category, path)
+                self.save(category)
+            return found
+
+    def resolve(self, category, name):
+        """Maps a name shown by the history nodes back to its path."""
+        with self.lock:
+            for path in reversed(list(self.category(category).keys())):
+                if self.display_name(path) == name or path == name:
+                    return path
+        return None
+
+WAS_HISTORY = WASHistory(WAS_HISTORY_DATABASE, limit=was_config.get('history_max_entries', 1000))
+
+def history_choices(category):
+    limit = was_config.get('history_display_limit', None)
+    paths = WAS_HISTORY.paths(category, limit=limit)
+    # Oldest to newest like the saved history
+    return [WAS_HISTORY.display_name(path) for path in reversed(paths)] or ['No History']
+
 # Update image history
 
 def update_history_images(new_paths):
-    HDB = WASDatabase(WAS_HISTORY_DATABASE)
-    if HDB.catExists("History") and HDB.keyExists("History", "Images"):
-        saved_paths = HDB.get("History", "Images")
-        for path_ in saved_paths:
-            if not os.path.exists(path_):
-                saved_paths.remove(path_)
-        if isinstance(new_paths, str):
-            if new_paths in saved_paths:
-                saved_paths.remove(new_paths)
-            saved_paths.append(new_paths)
-        elif isinstance(new_paths, list):
-            for path_ in new_paths:
-                if path_ in saved_paths:
-                    saved_paths.remove(path_)
-                saved_paths.append(path_)
-        HDB.update("History", "Images", saved_paths)
-    else:
-        if not HDB.catExists("History"):
-            HDB.insertCat("History")
-        if isinstance(new_paths, str):
-            HDB.insert("History", "Images", [new_paths])
-        elif isinstance(new_paths, list):
-            HDB.insert("History", "Images", new_paths)
+    WAS_HISTORY.add("Images", new_paths)
 
 # Update output image history
 
 def update_history_output_images(new_paths):
-    HDB = WASDatabase(WAS_HISTORY_DATABASE)
-    category = "Output_Images"
-    if HDB.catExists("History") and HDB.keyExists("History", category):
-        saved_paths = HDB.get("History", category)
-        for path_ in saved_paths:
-            if not os.path.exists(path_):
-                saved_paths.remove(path_)
-        if isinstance(new_paths, str):
-            if new_paths in saved_paths:
-                saved_paths.remove(new_paths)
-            saved_paths.append(new_paths)
-        elif isinstance(new_paths, list):
-            for path_ in new_paths:
-                if path_ in saved_paths:
-                    saved_paths.remove(path_)
-                saved_paths.append(path_)
-        HDB.update("History", category, saved_paths)
-    else:
-        if not HDB.catExists("History"):
-            HDB.insertCat("History")
-        if isinstance(new_paths, str):
-            HDB.insert("History", category, [new_paths])
-        elif isinstance(new_paths, list):
-            HDB.insert("History", category, new_paths)
+    WAS_HISTORY.add("Output_Images", new_paths)
 
 # Update text file history
 
 def update_history_text_files(new_paths):
-    HDB = WASDatabase(WAS_HISTORY_DATABASE)
-    if HDB.catExists("History") and HDB.keyExists("History", "TextFiles"):
-        saved_paths = HDB.get("History", "TextFiles")
-        for path_ in saved_paths:
-            if not os.path.exists(path_):
-                saved_paths.remove(path_)
-        if isinstance(new_paths, str):
-            if new_paths in saved_paths:
-                saved_paths.remove(new_paths)
-            saved_paths.append(new_paths)
-        elif isinstance(new_paths, list):
-            for path_ in new_paths:
-                if path_ in saved_paths:
-                    saved_paths.remove(path_)
-                saved_paths.append(path_)
-        HDB.update("History", "TextFiles", saved_paths)
-    else:
-        if not HDB.catExists("History"):
-            HDB.insertCat("History")
-        if isinstance(new_paths, str):
-            HDB.insert("History", "TextFiles", [new_paths])
-        elif isinstance(new_paths, list):
-            HDB.insert("History", "TextFiles", new_paths)
+    WAS_HISTORY.add("TextFiles", new_paths)
+
 # WAS Filter Class
 
 class WAS_Tools_Class():
@@ -1142,59 +2045,123 @@ class WAS_Tools_Class():
             self.still_image_delay_ms = still_image_delay_ms
             self.loop = loop
 
+        # Frames are appended straight into the existing file: the trailer is cut off, the
+        # new transition and still frames are encoded on their own and their blocks are written
+        # in its place. Every frame is quantized to the global palette stored in the GIF header,
+        # and the last frame is kept in a sidecar PNG, so prior frames are never decoded.
+
         def write(self, image, gif_path):
 
-            import cv2
+            sidecar_path = gif_path + ".last.png"
 
             if not os.path.isfile(gif_path):
-                with Image.new("RGBA", image.size) as new_gif:
-                    new_gif.paste(image.convert("RGBA"))
-                    new_gif.info["duration"] = self.still_image_delay_ms
-                    new_gif.save(gif_path, format="GIF", save_all=True, append_images=[], duration=self.still_image_delay_ms, loop=0)
+                still_frame = image.convert("RGB").quantize(palette=self.global_palette(image))
+                still_frame.save(gif_path, format="GIF", duration=self.still_image_delay_ms, loop=self.loop, optimize=False)
+                image.convert("RGB").save(sidecar_path, format="PNG")
                 cstr(f"Created new GIF animation at: {gif_path}").msg.print()
-            else:
-                with Image.open(gif_path) as gif:
-                    n_frames = gif.n_frames
-                    if n_frames > 0:
-                        gif.seek(n_frames - 1)
-                        last_frame = gif.copy()
-                    else:
-                        last_frame = None
-
-                    end_image = image
-                    steps = self.transition_frames - 1 if last_frame is not None else self.transition_frames
-
-                    if last_frame is not None:
-                        image = self.pad_to_size(image, last_frame.size)
-
-                    frames = self.generate_transition_frames(last_frame, image, steps)
-
-                    still_frame = end_image.copy()
-
-                    gif_frames = []
-                    for i in range(n_frames):
-                        gif.seek(i)
-                        gif_frame = gif.copy()
-                        gif_frames.append(gif_frame)
+                return
 
-                    for frame in frames:
-                        frame.info["duration"] = self.duration_ms
-                        gif_frames.append(frame)
+            size, palette = self.read_gif_header(gif_path)
 
-                    still_frame.info['duration'] = self.still_image_delay_ms
-                    gif_frames.append(still_frame)
+            if os.path.isfile(sidecar_path):
+                with Image.open(sidecar_path) as sidecar:
+                    last_frame = sidecar.convert("RGB")
+            else:
+                # GIFs written before sidecars existed: decode the last frame once
+                with Image.open(gif_path) as gif:
+                    gif.seek(gif.n_frames - 1)
+                    last_frame = gif.convert("RGB")
 
-                    gif_frames[0].save(
-                        gif_path,
-                        format="GIF",
-                        save_all=True,
-                        append_images=gif_frames[1:],
-                        optimize=True,
-                        loop=self.loop,
-                    )
+            image = self.pad_to_size(image, size).convert("RGB") if image.size != size else image.convert("RGB")
+            frames = self.generate_transition_frames(last_frame, image, self.transition_frames - 1)
+            frames = [frame.convert("RGB") for frame in frames] + [image]
+            durations = [self.duration_ms] * (len(frames) - 1) + [self.still_image_delay_ms]
 
-                    cstr(f"Edited existing GIF animation at: {gif_path}").msg.print()
+            if palette:
+                palette_image = Image.new("P", (1, 1))
+                palette_image.putpalette(palette)
+            else:
+                palette_image = self.global_palette(image)
+            frames = [frame.quantize(palette=palette_image) for frame in frames]
+
+            buffer = BytesIO()
+            frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=durations, optimize=False, loop=self.loop)
+            blocks = self.gif_frame_blocks(buffer.getvalue(), palette)
+
+            with open(gif_path, "r+b") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b"\x3b":
+                    f.seek(-1, os.SEEK_END)
+                f.write(blocks)
+                f.write(b"\x3b")
+                f.truncate()
+
+            image.save(sidecar_path, format="PNG")
+
+            cstr(f"Edited existing GIF animation at: {gif_path}").msg.print()
+
+        def global_palette(self, image):
+            # Half adaptive to the first image, half a uniform 4x8x4 RGB cube, so later frames
+            # with new colors still dither to something close.
+            adaptive = image.convert("RGB").quantize(colors=128).getpalette()[:128 * 3]
+            adaptive += [0] * (128 * 3 - len(adaptive))
+            uniform = [c for r in range(4) for g in range(8) for b in range(4) for c in (r * 85, g * 255 // 7, b * 85)]
+            palette_image = Image.new("P", (1, 1))
+            palette_image.putpalette(adaptive + uniform)
+            return palette_image
+
+        def read_gif_header(self, gif_path):
+            import struct
+            with open(gif_path, "rb") as f:
+                header = f.read(13)
+                width, height = struct.unpack("<HH", header[6:10])
+                flags = header[10]
+                palette = f.read(3 * 2 ** ((flags & 7) + 1)) if flags & 0x80 else None
+            return (width, height), palette
+
+        def gif_frame_blocks(self, data, palette):
+            # Returns the extension and image blocks of an encoded GIF, minus its loop extension.
+            # Frames that relied on a global color table other than `palette` get it as a local one.
+
+            def skip_sub_blocks(pos):
+                while data[pos]:
+                    pos += data[pos] + 1
+                return pos + 1
+
+            flags = data[10]
+            pos = 13
+            global_table = None
+            global_size = flags & 7
+            if flags & 0x80:
+                global_table = data[pos:pos + 3 * 2 ** (global_size + 1)]
+                pos += len(global_table)
+
+            blocks = bytearray()
+            while pos < len(data) and data[pos] != 0x3B:
+                start = pos
+                if data[pos] == 0x21:
+                    pos = skip_sub_blocks(pos + 2)
+                    if data[start + 1] == 0xFF and data[start + 3:start + 14] == b"NETSCAPE2.0":
+                        continue
+                    blocks += data[start:pos]
+                elif data[pos] == 0x2C:
+                    descriptor = bytearray(data[pos:pos + 10])
+                    packed = descriptor[9]
+                    pos += 10
+                    local_table = b""
+                    if packed & 0x80:
+                        local_table = data[pos:pos + 3 * 2 ** ((packed & 7) + 1)]
+                        pos += len(local_table)
+                    elif global_table is not None and global_table != palette:
+                        descriptor[9] = (packed & 0x40) | 0x80 | global_size
+                        local_table = global_table
+                    image_data_start = pos
+                    pos = skip_sub_blocks(pos + 1)
+                    blocks += descriptor + local_table + data[image_data_start:pos]
+                else:
+                    raise ValueError(f"Unexpected GIF block 0x{data[pos]:02x} at byte {pos}")
 
+            return bytes(blocks)
 
         def pad_to_size(self, image, size):
             new_image = Image.new("RGBA", size, color=(0, 0, 0, 0))
@@ -1232,75 +2199,209 @@ class WAS_Tools_Class():
                 self.add_codecs(conf['ffmpeg_extra_codecs'])
             self.codec = codec.lower() if codec.lower() in self.valid_codecs else "mp4v"
 
-        def write(self, image, video_path):
+        # Append sessions, keyed by the final video path. Each write encodes only its own
+        # transition and still frames into a new segment file, so appending is O(1) no matter
+        # how long the video already is. Segments are tracked in a manifest next to the video
+        # and joined into the final file by `finalize` (stream copy through ffmpeg when found).
+        # Until then `write` returns the segment folder rather than a video that is not there.
+        sessions = {}
+
+        def write(self, image, video_path, finalize=False):
             video_path += self.extensions[self.codec]
             end_image = self.rescale(self.pil2cv(image), self.max_size)
 
-            if os.path.isfile(video_path):
-                cap = cv2.VideoCapture(video_path)
+            session = self.open_session(video_path)
+            if session["size"] is None:
+                height, width, _ = end_image.shape
+                if width <= 0 or height <= 0:
+                    raise ValueError("Invalid image dimensions")
+                session["size"] = (width, height)
+                session["fps"] = self.fps
+            width, height = session["size"]
+
+            if end_image.shape[:2] != (height, width):
+                end_image = cv2.resize(end_image, (width, height))
+
+            frames = []
+            if self.transition_frames > 0 and session["last_frame"] is not None:
+                for i, transition_frame in enumerate(self.generate_transition_frames(session["last_frame"], end_image, self.transition_frames)):
+                    try:
+                        frames.append(cv2.resize(transition_frame, (width, height)))
+                    except cv2.error as e:
+                        print(f"Error resizing frame {i}: {e}")
+                        continue
 
+            self.write_segment(session, frames, end_image, self.still_image_delay_frames)
+            session["last_frame"] = end_image
+
+            if finalize:
+                return self.finalize(video_path)
+
+            cstr(f"Appended segment {len(session['segments'])} to video session at: {video_path}").msg.print()
+            cstr(f"The video is pending finalize, its segments are kept in: {session['dir']}").warning.print()
+
+            return session["dir"]
+
+        def open_session(self, video_path):
+            session = self.sessions.get(video_path)
+            if session is not None:
+                return session
+
+            segment_dir = video_path + ".segments"
+            session = {
+                "path": video_path,
+                "dir": segment_dir,
+                "manifest": os.path.join(segment_dir, "manifest.json"),
+                "segments": [],
+                "next_segment": 0,
+                "size": None,
+                "fps": self.fps,
+                "codec": self.codec,
+                "last_frame": None,
+            }
+
+            if os.path.isfile(session["manifest"]):
+                # Recover an unfinished session: keep only segments that were completed and
+                # clear out any partial segment left behind by an interrupted write.
+                with open(session["manifest"], "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                session["segments"] = [segment for segment in manifest.get("segments", []) if os.path.isfile(segment)]
+                # Never reuse the number of a segment that was listed, even if it went missing
+                session["next_segment"] = manifest.get("next_segment", len(manifest.get("segments", [])))
+                session["size"] = tuple(manifest["size"]) if manifest.get("size") else None
+                session["fps"] = manifest.get("fps", self.fps)
+                for name in os.listdir(segment_dir):
+                    if ".partial" in name:
+                        os.remove(os.path.join(segment_dir, name))
+                if session["segments"]:
+                    session["last_frame"] = self.read_last_frame(session["segments"][-1])
+                    cstr(f"Recovered {len(session['segments'])} video segments for: {video_path}").msg.print()
+            elif os.path.isfile(video_path):
+                # A finalized video becomes the first segment, it is only rewritten on finalize
+                cap = cv2.VideoCapture(video_path)
                 width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                 height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
                 fps = int(cap.get(cv2.CAP_PROP_FPS))
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.release()
 
                 if width <= 0 or height <= 0:
                     raise ValueError("Invalid video dimensions")
 
-                temp_file_path = video_path.replace(self.extensions[self.codec], '_temp' + self.extensions[self.codec])
-                fourcc = cv2.VideoWriter_fourcc(*self.codec)
-                out = cv2.VideoWriter(temp_file_path, fourcc, fps, (width, height), isColor=True)
+                session["segments"] = [video_path]
+                session["size"] = (width, height)
+                session["fps"] = fps if fps > 0 else self.fps
+                session["last_frame"] = self.read_last_frame(video_path)
 
-                for i in tqdm(range(total_frames), desc="Copying original frames"):
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    out.write(frame)
-
-                if self.transition_frames > 0:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames - 1)
-                    ret, last_frame = cap.read()
-                    if ret:
-                        transition_frames = self.generate_transition_frames(last_frame, end_image, self.transition_frames)
-                        for i, transition_frame in tqdm(enumerate(transition_frames), desc="Generating transition frames", total=self.transition_frames):
-                            try:
-                                transition_frame_resized = cv2.resize(transition_frame, (width, height))
-                                out.write(transition_frame_resized)
-                            except cv2.error as e:
-                                print(f"Error resizing frame {i}: {e}")
-                                continue
-
-                for i in tqdm(range(self.still_image_delay_frames), desc="Adding new frames"):
-                    out.write(end_image)
+            self.sessions[video_path] = session
+            return session
 
-                cap.release()
-                out.release()
-
-                os.remove(video_path)
-                os.rename(temp_file_path, video_path)
+        def save_manifest(self, session):
+            os.makedirs(session["dir"], exist_ok=True)
+            temp_path = session["manifest"] + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"segments": session["segments"], "next_segment": session["next_segment"], "size": session["size"], "fps": session["fps"]}, f)
+            os.replace(temp_path, session["manifest"])
 
-                cstr(f"Edited video at: {video_path}").msg.print()
+        def write_segment(self, session, frames, still_frame, still_count):
+            os.makedirs(session["dir"], exist_ok=True)
+            extension = self.extensions[self.codec]
+            while True:
+                number = session["next_segment"]
+                session["next_segment"] += 1
+                segment_path = os.path.join(session["dir"], f"segment_{number:06d}{extension}")
+                if not os.path.exists(segment_path):
+                    break
+            partial_path = os.path.join(session["dir"], f"segment_{number:06d}.partial{extension}")
 
-                return video_path
+            fourcc = cv2.VideoWriter_fourcc(*self.codec)
+            out = cv2.VideoWriter(partial_path, fourcc, session["fps"], session["size"], isColor=True)
+            for frame in frames:
+                out.write(frame)
+            for i in range(still_count):
+                out.write(still_frame)
+            out.release()
 
-            else:
-                fourcc = cv2.VideoWriter_fourcc(*self.codec)
-                height, width, _ = end_image.shape
-                if width <= 0 or height <= 0:
-                    raise ValueError("Invalid image dimensions")
+            os.replace(partial_path, segment_path)
+            session["segments"].append(segment_path)
+            self.save_manifest(session)
+
+        def read_last_frame(self, video_path):
+            cap = cv2.VideoCapture(video_path)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            last_frame = None
+            if total_frames > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames - 1)
+                ret, frame = cap.read()
+                if ret:
+                    last_frame = frame
+            cap.release()
+            return last_frame
+
+        def ffmpeg_binary(self):
+            import shutil
+            conf = getSuiteConfig()
+            ffmpeg_path = conf.get('ffmpeg_bin_path', "/path/to/ffmpeg")
+            if ffmpeg_path and ffmpeg_path != "/path/to/ffmpeg":
+                if os.path.isfile(ffmpeg_path):
+                    return ffmpeg_path
+                for name in ("ffmpeg", "ffmpeg.exe"):
+                    if os.path.isfile(os.path.join(ffmpeg_path, name)):
+                        return os.path.join(ffmpeg_path, name)
+            return shutil.which("ffmpeg")
+
+        def concat_segments(self, session, output_path):
+            ffmpeg = self.ffmpeg_binary()
+            if ffmpeg:
+                list_path = os.path.join(session["dir"], "concat.txt")
+                with open(list_path, "w", encoding="utf-8") as f:
+                    for segment in session["segments"]:
+                        escaped = segment.replace("'", "'\\''")
+                        f.write(f"file '{escaped}'\n")
+                result = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+                if result.returncode == 0 and os.path.isfile(output_path):
+                    return True
+                cstr("Unable to join video segments with ffmpeg, falling back to OpenCV.").warning.print()
 
-                out = cv2.VideoWriter(video_path, fourcc, self.fps, (width, height), isColor=True)
+            fourcc = cv2.VideoWriter_fourcc(*self.codec)
+            out = cv2.VideoWriter(output_path, fourcc, session["fps"], session["size"], isColor=True)
+            for segment in tqdm(session["segments"], desc="Joining video segments"):
+                cap = cv2.VideoCapture(segment)
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if frame.shape[:2] != session["size"][::-1]:
+                        frame = cv2.resize(frame, session["size"])
+                    out.write(frame)
+                cap.release()
+            out.release()
+            return os.path.isfile(output_path)
 
-                for i in tqdm(range(self.still_image_delay_frames), desc="Adding new frames"):
-                    out.write(end_image)
+        def finalize(self, video_path):
+            import shutil
+            session = self.open_session(video_path)
 
-                out.release()
+            if session["segments"] and session["segments"] != [video_path]:
+                extension = self.extensions[self.codec]
+                temp_file_path = video_path[:-len(extension)] + '_temp' + extension
+                if not self.concat_segments(session, temp_file_path):
+                    cstr(f"Unable to finalize video at: {video_path}. Segments are kept in: {session['dir']}").error.print()
+                    return ""
+                os.replace(temp_file_path, video_path)
+                cstr(f"Finalized video at: {video_path}").msg.print()
 
-                cstr(f"Created new video at: {video_path}").msg.print()
+            shutil.rmtree(session["dir"], ignore_errors=True)
+            self.sessions.pop(video_path, None)
 
-                return video_path
+            return video_path
 
-            return ""
+        @classmethod
+        def finalize_all(cls):
+            for video_path, session in list(cls.sessions.items()):
+                try:
+                    cls(codec=session["codec"]).finalize(video_path)
+                except Exception as e:
+                    cstr(f"Unable to finalize video at: {video_path}: {e}").error.print()
 
         def create_video(self, image_folder, video_path):
             import cv2
@@ -1971,78 +3072,15 @@ class WAS_Tools_Class():
 
     def perlin_noise(self, width, height, octaves, persistence, scale, seed=None):
 
-        @jit(nopython=True)
-        def fade(t):
-            return 6 * t**5 - 15 * t**4 + 10 * t**3
-
-
-        @jit(nopython=True)
-        def lerp(t, a, b):
-            return a + t * (b - a)
-
-
-        @jit(nopython=True)
-        def grad(hash, x, y, z):
-            h = hash & 15
-            u = x if h < 8 else y
-            v = y if h < 4 else (x if h == 12 or h == 14 else z)
-            return (u if (h & 1) == 0 else -u) + (v if (h & 2) == 0 else -v)
-
-
-        @jit(nopython=True)
-        def noise(x, y, z, p):
-            X = np.int32(np.floor(x)) & 255
-            Y = np.int32(np.floor(y)) & 255
-            Z = np.int32(np.floor(z)) & 255
-
-            x -= np.floor(x)
-            y -= np.floor(y)
-            z -= np.floor(z)
-
-            u = fade(x)
-            v = fade(y)
-            w = fade(z)
-
-            A = p[X] + Y
-            AA = p[A] + Z
-            AB = p[A + 1] + Z
-            B = p[X + 1] + Y
-            BA = p[B] + Z
-            BB = p[B + 1] + Z
-
-            return lerp(w, lerp(v, lerp(u, grad(p[AA], x, y, z), grad(p[BA], x - 1, y, z)),
-                                    lerp(u, grad(p[AB], x, y - 1, z), grad(p[BB], x - 1, y - 1, z))),
-                        lerp(v, lerp(u, grad(p[AA + 1], x, y, z - 1), grad(p[BA + 1], x - 1, y, z - 1)),
-                                    lerp(u, grad(p[AB + 1], x, y - 1, z - 1), grad(p[BB + 1], x - 1, y - 1, z - 1))))
-
-        if seed:
-            random.seed(seed)
-
-        p = np.arange(256, dtype=np.int32)
-        random.shuffle(p)
-        p = np.concatenate((p, p))
-
-        noise_map = np.zeros((height, width))
+        frequencies = []
+        amplitudes = []
         amplitude = 1.0
-        total_amplitude = 0.0
-
         for octave in range(octaves):
-            frequency = 2 ** octave
-            total_amplitude += amplitude
-
-            for y in range(height):
-                for x in range(width):
-                    nx = x / scale * frequency
-                    ny = y / scale * frequency
-                    noise_value = noise(nx, ny, 0, p) * amplitude
-                    current_value = noise_map[y, x]
-                    noise_map[y, x] = current_value + noise_value
-
+            frequencies.append(2 ** octave)
+            amplitudes.append(amplitude)
             amplitude *= persistence
 
-        min_value = np.min(noise_map)
-        max_value = np.max(noise_map)
-        noise_map = np.interp(noise_map, (min_value, max_value), (0, 255)).astype(np.uint8)
+        noise_map = perlin_noise_map(width, height, scale, frequencies, amplitudes, seed)
         image = Image.fromarray(noise_map, mode='L').convert("RGB")
 
         return image
@@ -2052,74 +3090,15 @@ class WAS_Tools_Class():
 
     def perlin_power_fractal(self, width, height, octaves, persistence, lacunarity, exponent, scale, seed=None):
 
-        @jit(nopython=True)
-        def fade(t):
-            return 6 * t**5 - 15 * t**4 + 10 * t**3
-
-        @jit(nopython=True)
-        def lerp(t, a, b):
-            return a + t * (b - a)
-
-        @jit(nopython=True)
-        def grad(hash, x, y, z):
-            h = hash & 15
-            u = x if h < 8 else y
-            v = y if h < 4 else (x if h == 12 or h == 14 else z)
-            return (u if (h & 1) == 0 else -u) + (v if (h & 2) == 0 else -v)
-
-        @jit(nopython=True)
-        def noise(x, y, z, p):
-            X = np.int32(np.floor(x)) & 255
-            Y = np.int32(np.floor(y)) & 255
-            Z = np.int32(np.floor(z)) & 255
-
-            x -= np.floor(x)
-            y -= np.floor(y)
-            z -= np.floor(z)
-
-            u = fade(x)
-            v = fade(y)
-            w = fade(z)
-
-            A = p[X] + Y
-            AA = p[A] + Z
-            AB = p[A + 1] + Z
-            B = p[X + 1] + Y
-            BA = p[B] + Z
-            BB = p[B + 1] + Z
-
-            return lerp(w, lerp(v, lerp(u, grad(p[AA], x, y, z), grad(p[BA], x - 1, y, z)),
-                                    lerp(u, grad(p[AB], x, y - 1, z), grad(p[BB], x - 1, y - 1, z))),
-                        lerp(v, lerp(u, grad(p[AA + 1], x, y, z - 1), grad(p[BA + 1], x - 1, y, z - 1)),
-                                    lerp(u, grad(p[AB + 1], x, y - 1, z - 1), grad(p[BB + 1], x - 1, y - 1, z - 1))))
-
-        if seed:
-            random.seed(seed)
-
-        p = np.arange(256, dtype=np.int32)
-        random.shuffle(p)
-        p = np.concatenate((p, p))
-
-        noise_map = np.zeros((height, width))
+        frequencies = []
+        amplitudes = []
         amplitude = 1.0
-        total_amplitude = 0.0
-
         for octave in range(octaves):
-            frequency = lacunarity ** octave
+            frequencies.append(lacunarity ** octave)
             amplitude *= persistence
-            total_amplitude += amplitude
+            amplitudes.append(amplitude ** exponent)
 
-            for y in range(height):
-                for x in range(width):
-                    nx = x / scale * frequency
-                    ny = y / scale * frequency
-                    noise_value = noise(nx, ny, 0, p) * amplitude ** exponent
-                    current_value = noise_map[y, x]
-                    noise_map[y, x] = current_value + noise_value
-
-        min_value = np.min(noise_map)
-        max_value = np.max(noise_map)
-        noise_map = np.interp(noise_map, (min_value, max_value), (0, 255)).astype(np.uint8)
+        noise_map = perlin_noise_map(width, height, scale, frequencies, amplitudes, seed)
         image = Image.fromarray(noise_map, mode='L').convert("RGB")
 
         return image
@@ -2127,13 +3106,14 @@ class WAS_Tools_Class():
     # Worley Noise Generator
     class worley_noise:
 
-        def __init__(self, height=512, width=512, density=50, option=0, use_broadcast_ops=True, flat=False, seed=None):
+        def __init__(self, height=512, width=512, density=50, option=0, use_broadcast_ops=True, flat=False, seed=None, tile_rows=64):
 
             self.height = height
             self.width = width
             self.density = density
             self.use_broadcast_ops = use_broadcast_ops
             self.seed = seed
+            self.tile_rows = max(1, int(tile_rows))
             self.generate_points_and_colors()
             self.calculate_noise(option)
             self.image = self.generateImage(option, flat_mode=flat)
@@ -2144,28 +3124,31 @@ class WAS_Tools_Class():
             self.colors = rng.integers(0, 256, (self.density, 3))
 
         def calculate_noise(self, option):
-            self.data = np.zeros((self.height, self.width))
-            for h in range(self.height):
-                for w in range(self.width):
-                    distances = np.sqrt(np.sum((self.points - np.array([w, h])) ** 2, axis=1))
-                    self.data[h, w] = np.sort(distances)[option]
+            # Query a KD-tree of the feature points a few rows at a time, so peak memory is
+            # bounded by tile_rows * width * k rather than density * width * height.
+            from scipy.spatial import cKDTree
 
-        def broadcast_calculate_noise(self, option):
+            tree = cKDTree(self.points)
+            k = [1] if option == 0 else [1, option + 1]
             xs = np.arange(self.width)
-            ys = np.arange(self.height)
-            x_dist = np.power(self.points[:, 0, np.newaxis] - xs, 2)
-            y_dist = np.power(self.points[:, 1, np.newaxis] - ys, 2)
-            d = np.sqrt(x_dist[:, :, np.newaxis] + y_dist[:, np.newaxis, :])
-            distances = np.sort(d, axis=0)
-            self.data = distances[option]
+
+            self.data = np.empty((self.height, self.width), dtype=np.float64)
+            self.nearest = np.empty((self.height, self.width), dtype=np.intp)
+
+            for top in range(0, self.height, self.tile_rows):
+                bottom = min(top + self.tile_rows, self.height)
+                ys = np.arange(top, bottom)
+                coords = np.column_stack((np.tile(xs, len(ys)), np.repeat(ys, self.width)))
+                distances, indices = tree.query(coords, k=k)
+                self.data[top:bottom] = distances[:, -1].reshape(len(ys), self.width)
+                self.nearest[top:bottom] = indices[:, 0].reshape(len(ys), self.width)
+
+        def broadcast_calculate_noise(self, option):
+            self.calculate_noise(option)
 
         def generateImage(self, option, flat_mode=False):
             if flat_mode:
-                flat_color_data = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-                for h in range(self.height):
-                    for w in range(self.width):
-                        closest_point_idx = np.argmin(np.sum((self.points - np.array([w, h])) ** 2, axis=1))
-                        flat_color_data[h, w, :] = self.colors[closest_point_idx]
+                flat_color_data = self.colors[self.nearest].astype(np.uint8)
                 return Image.fromarray(flat_color_data, 'RGB')
             else:
                 min_val, max_val = np.min(self.data), np.max(self.data)
@@ -2191,48 +3174,86 @@ class WAS_Tools_Class():
 
     # Image Displacement Warp
 
-    def displace_image(self, image, displacement_map, amplitude):
+    def displace_image(self, images, displacement_maps, amplitude, sampling='nearest', channels='luminance'):
+        # Warps a whole IMAGE batch in one gather. Displacement maps are matched to images by
+        # batch index (the last map is reused), `luminance` displaces X and Y by the same amount
+        # while `red_x_green_y` reads X from the red channel and Y from the green channel.
 
-        image = image.convert('RGB')
-        displacement_map = displacement_map.convert('L')
-        width, height = image.size
-        result = Image.new('RGB', (width, height))
+        import torch.nn.functional as F
 
-        for y in range(height):
-            for x in range(width):
+        batch, height, width, _ = images.shape
+        device = images.device
+
+        map_index = torch.clamp(torch.arange(batch), max=displacement_maps.shape[0] - 1)
+        maps = displacement_maps[map_index].to(device)
+        if maps.shape[-1] < 3:
+            maps = maps[..., :1].repeat(1, 1, 1, 3)
+        if maps.shape[1] != height or maps.shape[2] != width:
+            maps = self.resize_and_crop_tensor(maps, width, height)
+
+        # Same 8-bit levels and luma weights as `tensor2pil(...).convert('L')`
+        levels = torch.clamp(maps[..., :3] * 255., 0, 255).to(torch.uint8).to(torch.int64)
+        if channels == 'red_x_green_y':
+            disp_x = levels[..., 0].to(images.dtype)
+            disp_y = levels[..., 1].to(images.dtype)
+        else:
+            luma = (levels[..., 0] * 19595 + levels[..., 1] * 38470 + levels[..., 2] * 7471 + 0x8000) >> 16
+            disp_x = disp_y = luma.to(images.dtype)
+        disp_x = amplitude * (disp_x / 255)
+        disp_y = amplitude * (disp_y / 255)
 
-                # Calculate the displacements n' stuff
-                displacement = displacement_map.getpixel((x, y))
-                displacement_amount = amplitude * (displacement / 255)
-                new_x = x + int(displacement_amount)
-                new_y = y + int(displacement_amount)
-
-                # Apply mirror reflection at edges and corners
-                if new_x < 0:
-                    new_x = abs(new_x)
-                elif new_x >= width:
-                    new_x = 2 * width - new_x - 1
-
-                if new_y < 0:
-                    new_y = abs(new_y)
-                elif new_y >= height:
-                    new_y = 2 * height - new_y - 1
-
-                if new_x < 0:
-                    new_x = abs(new_x)
-                if new_y < 0:
-                    new_y = abs(new_y)
-
-                if new_x >= width:
-                    new_x = 2 * width - new_x - 1
-                if new_y >= height:
-                    new_y = 2 * height - new_y - 1
-
-                # Consider original image color at new location for RGB results, oops
-                pixel = image.getpixel((new_x, new_y))
-                result.putpixel((x, y), pixel)
+        ys, xs = torch.meshgrid(torch.arange(height, device=device), torch.arange(width, device=device), indexing='ij')
 
-        return result
+        if sampling == 'nearest':
+
+            def mirror(coord, size):
+                coord = torch.where(coord < 0, -coord, torch.where(coord >= size, 2 * size - coord - 1, coord))
+                coord = torch.where(coord < 0, -coord, coord)
+                coord = torch.where(coord >= size, 2 * size - coord - 1, coord)
+                return torch.clamp(coord, 0, size - 1)
+
+            new_x = mirror(xs + torch.trunc(disp_x).to(torch.int64), width)
+            new_y = mirror(ys + torch.trunc(disp_y).to(torch.int64), height)
+            batch_index = torch.arange(batch, device=device).view(batch, 1, 1)
+
+            return images[batch_index, new_y, new_x]
+
+        def mirror(coord, size):
+            edge = size - 1
+            for _ in range(2):
+                coord = torch.where(coord < 0, -coord, coord)
+                coord = torch.where(coord > edge, 2 * edge - coord, coord)
+            return torch.clamp(coord, 0, edge)
+
+        new_x = mirror(xs + disp_x, width)
+        new_y = mirror(ys + disp_y, height)
+        grid = torch.stack((2 * new_x / max(width - 1, 1) - 1, 2 * new_y / max(height - 1, 1) - 1), dim=-1)
+
+        warped = F.grid_sample(images.permute(0, 3, 1, 2), grid.to(images.dtype), mode=sampling, padding_mode='border', align_corners=True)
+
+        return torch.clamp(warped.permute(0, 2, 3, 1), 0, 1)
+
+    def resize_and_crop_tensor(self, images, target_width, target_height):
+
+        import torch.nn.functional as F
+
+        height, width = images.shape[1:3]
+        aspect_ratio = width / height
+        target_aspect_ratio = target_width / target_height
+
+        if aspect_ratio > target_aspect_ratio:
+            new_height = target_height
+            new_width = int(new_height * aspect_ratio)
+        else:
+            new_width = target_width
+            new_height = int(new_width / aspect_ratio)
+
+        images = F.interpolate(images.permute(0, 3, 1, 2), size=(new_height, new_width), mode='bicubic', align_corners=False)
+        left = (new_width - target_width) // 2
+        top = (new_height - target_height) // 2
+        images = images[:, :, top:top + target_height, left:left + target_width]
+
+        return torch.clamp(images.permute(0, 2, 3, 1), 0, 1)
 
     # Analyze Filters
 
@@ -2409,27 +3430,258 @@ class WAS_Tools_Class():
         return palette, '\n'.join(hex_palette)
 
 
-from transformers import BlipProcessor, BlipForConditionalGeneration, BlipForQuestionAnswering
+# Auxiliary Model Residency
+#
+# BLIP, CLIPSeg, MiDaS and SAM stay loaded between prompts in one shared cache keyed by
+# (model id, device, dtype). A model requested on another device is moved rather than
+# reloaded. When a byte budget is exceeded, the least recently used unpinned entries are
+# evicted: VRAM entries are offloaded to the CPU and RAM entries are dropped. Entries
+# loaded with `keep_warm` are pinned and never evicted. New models are loaded on the CPU
+# and VRAM for them is claimed through `comfy.model_management` before they are moved,
+# so ComfyUI unloads its own models first if needed. Models placed without being loaded
+# through the cache are only referenced weakly, so the cache never keeps them alive.
+
+def model_memory_size(obj):
+    if isinstance(obj, torch.nn.Module):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    if isinstance(obj, (tuple, list)):
+        return sum(model_memory_size(item) for item in obj)
+    if hasattr(obj, '__dict__') and not isinstance(obj, type):
+        return sum(model_memory_size(value) for value in vars(obj).values() if isinstance(value, torch.nn.Module))
+    return 0
+
+def move_model(obj, device):
+    if isinstance(obj, (tuple, list)):
+        for item in obj:
+            move_model(item, device)
+    elif isinstance(obj, torch.nn.Module) or hasattr(obj, 'to_device'):
+        getattr(obj, 'to_device', obj.to)(device)
+    return obj
+
+class WASModelCache:
+    def __init__(self, ram_budget=None, vram_budget=None):
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.ram_budget = ram_budget
+        self.vram_budget = vram_budget
+        self.hits = 0
+        self.misses = 0
+        self.next_token = 0
+
+    @staticmethod
+    def model_of(entry):
+        return entry["model"] if "model" in entry else entry["ref"]()
+
+    def prune(self):
+        for key in [key for key, entry in self.entries.items() if self.model_of(entry) is None]:
+            del self.entries[key]
+
+    @staticmethod
+    def normalize_device(device):
+        device = torch.device(device)
+        if device.type == 'cuda' and device.index is None:
+            device = torch.device('cuda', torch.cuda.current_device())
+        return device
+
+    @classmethod
+    def key(cls, model_id, device, dtype=None):
+        return (model_id, str(cls.normalize_device(device)), str(dtype) if dtype is not None else None)
+
+    @staticmethod
+    def default_device():
+        return comfy.model_management.get_torch_device()
+
+    def budget(self, device):
+        device = torch.device(device)
+        if device.type == 'cpu':
+            return self.ram_budget
+        if self.vram_budget is not None:
+            return self.vram_budget
+        try:
+            return comfy.model_management.get_total_memory(device) // 2
+        except Exception:
+            return None
+
+    def used(self, device_type):
+        return sum(entry["size"] for key, entry in self.entries.items() if torch.device(key[1]).type == device_type)
+
+    # `resident` accepts the model wherever it already lives, so loader nodes handing out a
+    # passive CPU copy do not pull it back off the device a consumer moved it to
+    def load(self, model_id, loader, device=None, dtype=None, keep_warm=False, resident=False):
+        device = self.normalize_device(device if device is not None else self.default_device())
+        key = self.key(model_id, device, dtype)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None and resident:
+                for other in self.entries.keys():
+                    if other[0] == key[0] and other[2] == key[2]:
+                        key = other
+                        entry = self.entries.pop(other)
+                        break
+            if entry is None:
+                entry = self.relocate(model_id, dtype, device)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                # Load on the CPU so the device only has to hold the model once room is made
+                model = loader(torch.device('cpu'))
+                entry = {"model": model, "size": model_memory_size(model), "pinned": False}
+                self.make_room(device, entry["size"])
+                move_model(model, device)
+            # Reinserting keeps the dict in least to most recently used order
+            entry["pinned"] = entry["pinned"] or keep_warm
+            self.entries[key] = entry
+            return self.model_of(entry)
+
+    def relocate(self, model_id, dtype, device):
+        for key in list(self.entries.keys()):
+            if key[0] == model_id and key[2] == (str(dtype) if dtype is not None else None):
+                entry = self.entries.pop(key)
+                self.make_room(device, entry["size"])
+                move_model(self.model_of(entry), device)
+                return entry
+        return None
+
+    def place(self, model, device=None):
+        device = self.normalize_device(device if device is not None else self.default_device())
+        with self.lock:
+            self.prune()
+            for key, entry in list(self.entries.items()):
+                held = self.model_of(entry)
+                if held is model or (isinstance(held, (tuple, list)) and any(item is model for item in held)):
+                    if torch.device(key[1]) != device:
+                        del self.entries[key]
+                        self.make_room(device, entry["size"])
+                        move_model(held, device)
+                        key = self.key(key[0], device, key[2])
+                    else:
+                        del self.entries[key]
+                    self.entries[key] = entry
+                    return model
+            # Not loaded through the cache: track it by a token stored on the model itself
+            token = getattr(model, '_was_cache_token', None)
+            if token is None:
+                self.next_token += 1
+                token = self.next_token
+                model._was_cache_token = token
+            entry = {"ref": weakref.ref(model), "size": model_memory_size(model), "pinned": False}
+            self.make_room(device, entry["size"])
+            move_model(model, device)
+            self.entries[self.key(("unmanaged", token), device)] = entry
+            return model
+
+    def make_room(self, device, size):
+        device = torch.device(device)
+        budget = self.budget(device)
+        self.prune()
+        if budget is not None:
+            for key in list(self.entries.keys()):
+                if self.used(device.type) + size <= budget:
+                    break
+                if torch.device(key[1]).type == device.type and not self.entries[key]["pinned"]:
+                    self.evict(key)
+        if device.type != 'cpu':
+            try:
+                comfy.model_management.free_memory(size, device)
+            except Exception as e:
+                cstr(f"Unable to free memory on `{device}`: {e}").warning.print()
+
+    def evict(self, key):
+        entry = self.entries.pop(key)
+        if torch.device(key[1]).type != 'cpu':
+            # Always offload: node outputs may still hold the model after the cache drops it
+            model = self.model_of(entry)
+            if model is not None:
+                move_model(model, 'cpu')
+                cpu_budget = self.budget('cpu')
+                if cpu_budget is None or self.used('cpu') + entry["size"] <= cpu_budget:
+                    self.entries[self.key(key[0], 'cpu', key[2])] = entry
+            comfy.model_management.soft_empty_cache()
+
+    def pin(self, model_id, pinned=True):
+        with self.lock:
+            for key, entry in self.entries.items():
+                if key[0] == model_id:
+                    entry["pinned"] = pinned
+
+    def clear(self, include_pinned=False):
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if include_pinned or not self.entries[key]["pinned"]:
+                    del self.entries[key]
+            comfy.model_management.soft_empty_cache()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "pinned": sum(1 for entry in self.entries.values() if entry["pinned"]),
+                "ram_bytes": self.used('cpu'),
+                "vram_bytes": sum(entry["size"] for key, entry in self.entries.items() if torch.device(key[1]).type != 'cpu'),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+def megabytes_to_bytes(value):
+    return int(float(value) * 1024 * 1024) if value not in (None, "", "None", "none") else None
+
+WAS_MODEL_CACHE = WASModelCache(
+    ram_budget=megabytes_to_bytes(was_config.get('model_cache_ram_budget_mb', 8192)),
+    vram_budget=megabytes_to_bytes(was_config.get('model_cache_vram_budget_mb', None)),
+)
+
 
 class BlipWrapper:
-    def __init__(self, caption_model_id="Salesforce/blip-image-captioning-base", vqa_model_id="Salesforce/blip-vqa-base", device="cuda", cache_dir=None):
+    def __init__(self, caption_model_id="Salesforce/blip-image-captioning-base", vqa_model_id="Salesforce/blip-vqa-base", device="cuda", cache_dir=None, dtype=None):
+        from transformers import BlipProcessor, BlipForConditionalGeneration, BlipForQuestionAnswering
         self.device = torch.device(device='cuda' if device == "cuda" and torch.cuda.is_available() else 'cpu')
+        self.dtype = dtype if dtype is not None else torch.float32
+        self.model_ids = (caption_model_id, vqa_model_id)
         self.caption_processor = BlipProcessor.from_pretrained(caption_model_id, cache_dir=cache_dir)
-        self.caption_model = BlipForConditionalGeneration.from_pretrained(caption_model_id, cache_dir=cache_dir).to(self.device)
+        self.caption_model = BlipForConditionalGeneration.from_pretrained(caption_model_id, cache_dir=cache_dir).to(self.device, self.dtype)
         self.vqa_processor = BlipProcessor.from_pretrained(vqa_model_id, cache_dir=cache_dir)
-        self.vqa_model = BlipForQuestionAnswering.from_pretrained(vqa_model_id, cache_dir=cache_dir).to(self.device)
+        self.vqa_model = BlipForQuestionAnswering.from_pretrained(vqa_model_id, cache_dir=cache_dir).to(self.device, self.dtype)
+
+    def to_device(self, device):
+        self.device = torch.device(device)
+        self.caption_model.to(self.device)
+        self.vqa_model.to(self.device)
+        return self
+
+    # Resize and normalize an IMAGE batch (B, H, W, C) on the model device, skipping PIL
+    def preprocess(self, images, processor):
+        image_processor = processor.image_processor
+        size = (image_processor.size["height"], image_processor.size["width"])
+        pixels = images[..., :3].permute(0, 3, 1, 2).to(self.device, torch.float32)
+        if pixels.shape[1] == 1:
+            pixels = pixels.repeat(1, 3, 1, 1)
+        pixels = torch.nn.functional.interpolate(pixels, size=size, mode="bicubic", align_corners=False, antialias=True).clamp(0, 1)
+        mean = torch.tensor(image_processor.image_mean, device=self.device).view(1, -1, 1, 1)
+        std = torch.tensor(image_processor.image_std, device=self.device).view(1, -1, 1, 1)
+        return ((pixels - mean) / std).to(self.dtype)
+
+    def generate_captions(self, images, min_length=50, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=False):
+        self.caption_model.eval()
+        pixel_values = self.preprocess(images, self.caption_processor)
+        with torch.no_grad():
+            outputs = self.caption_model.generate(pixel_values=pixel_values, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
+        return self.caption_processor.batch_decode(outputs, skip_special_tokens=True)
+
+    def answer_questions(self, images, question: str, min_length=50, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=False):
+        self.vqa_model.eval()
+        pixel_values = self.preprocess(images, self.vqa_processor)
+        text = self.vqa_processor.tokenizer([question] * pixel_values.shape[0], padding=True, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            answer_ids = self.vqa_model.generate(pixel_values=pixel_values, input_ids=text.input_ids, attention_mask=text.attention_mask, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
+        return self.vqa_processor.batch_decode(answer_ids, skip_special_tokens=True)
 
     def generate_caption(self, image: Image.Image, min_length=50, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=False):
-        self.caption_model.eval()
-        inputs = self.caption_processor(images=image, return_tensors="pt").to(self.device)
-        outputs = self.caption_model.generate(**inputs, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
-        return self.caption_processor.decode(outputs[0], skip_special_tokens=True)
+        return self.generate_captions(pil2tensor(image.convert("RGB")), min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)[0]
 
     def answer_question(self, image: Image.Image, question: str, min_length=50, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=False):
-        self.vqa_model.eval()
-        inputs = self.vqa_processor(images=image, text=question, return_tensors="pt").to(self.device)
-        answer_ids = self.vqa_model.generate(**inputs, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
-        return self.vqa_processor.decode(answer_ids[0], skip_special_tokens=True)
+        return self.answer_questions(pil2tensor(image.convert("RGB")), question, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)[0]
 
 
 #! IMAGE FILTER NODES
@@ -2487,23 +3739,26 @@ class WAS_Image_Pixelate:
                 "init_mode": (["k-means++", "random", "none"],),
                 "max_iterations": ("FLOAT", {"default": 100, "min": 1, "max": 256, "step": 1}),
                 "dither": (["False", "True"],),
-                "dither_mode": (["FloydSteinberg", "Ordered"],),
+                "dither_mode": (["FloydSteinberg", "Ordered", "Atkinson", "JarvisJudiceNinke"],),
             },
             "optional": {
                 "color_palettes": ("LIST", {"forceInput": True}),
                 "color_palette_mode": (["Brightness", "BrightnessAndTonal", "Linear", "Tonal"],),
                 "reverse_palette":(["False","True"],),
+                "quantize_mode": (["per_frame", "shared_palette", "warm_start"],),
+                "quantize_backend": (["KMeans", "MiniBatchKMeans", "MedianCut"],),
             }
         }
 
-    RETURN_TYPES = ("IMAGE",)
-    RETURN_NAMES = ("images",)
+    RETURN_TYPES = ("IMAGE", TEXT_TYPE)
+    RETURN_NAMES = ("images", "palette")
     FUNCTION = "image_pixelate"
 
     CATEGORY = "WAS Suite/Image/Process"
 
     def image_pixelate(self, images, pixelation_size=164, num_colors=16, init_mode='random', max_iterations=100,
-                        color_palettes=None, color_palette_mode="Linear", reverse_palette='False', dither='False', dither_mode='FloydSteinberg'):
+                        color_palettes=None, color_palette_mode="Linear", reverse_palette='False', dither='False', dither_mode='FloydSteinberg',
+                        quantize_mode='per_frame', quantize_backend='KMeans'):
 
         if 'scikit-learn' not in packages():
             install_package('scikit-learn')
@@ -2521,192 +3776,86 @@ class WAS_Image_Pixelate:
 
         reverse_palette = (True if reverse_palette == 'True' else False)
 
-        return ( self.pixel_art_batch(images, pixelation_size, num_colors, init_mode, max_iterations, 42,
-                (color_palettes_list if color_palettes_list else None), color_palette_mode, reverse_palette, dither, dither_mode), )
+        return self.pixel_art_batch(images, pixelation_size, num_colors, init_mode, max_iterations, 42,
+                (color_palettes_list if color_palettes_list else None), color_palette_mode, reverse_palette, dither, dither_mode,
+                quantize_mode, quantize_backend)
 
     def pixel_art_batch(self, batch, min_size, num_colors=16, init_mode='random', max_iter=100, random_state=42,
-                            palette=None, palette_mode="Linear", reverse_palette=False, dither=False, dither_mode='FloydSteinberg'):
+                            palette=None, palette_mode="Linear", reverse_palette=False, dither=False, dither_mode='FloydSteinberg',
+                            quantize_mode='per_frame', quantize_backend='KMeans', max_samples=65536):
 
-        from sklearn.cluster import KMeans
+        from sklearn.cluster import KMeans, MiniBatchKMeans
 
         hex_palette_to_rgb = lambda hex: tuple(int(hex[i:i+2], 16) for i in (0, 2, 4))
 
-        def flatten_colors(image, num_colors, init_mode='random', max_iter=100, random_state=42):
-            np_image = np.array(image)
-            pixels = np_image.reshape(-1, 3)
-            kmeans = KMeans(n_clusters=num_colors, init=init_mode, max_iter=max_iter, tol=1e-3, random_state=random_state, n_init='auto')
-            labels = kmeans.fit_predict(pixels)
-            colors = kmeans.cluster_centers_.astype(np.uint8)
-            flattened_pixels = colors[labels]
-            flattened_image = flattened_pixels.reshape(np_image.shape)
-            return Image.fromarray(flattened_image)
-
-        def dither_image(image, mode, nc):
-
-            def clamp(value, min_value=0, max_value=255):
-                return max(min(value, max_value), min_value)
-
-            def get_new_val(old_val, nc):
-                return np.round(old_val * (nc - 1)) / (nc - 1)
-
-            def fs_dither(img, nc):
-                arr = np.array(img, dtype=float) / 255
-                new_width, new_height = img.size
-
-                for ir in range(new_height):
-                    for ic in range(new_width):
-                        old_val = arr[ir, ic].copy()
-                        new_val = get_new_val(old_val, nc)
-                        arr[ir, ic] = new_val
-                        err = old_val - new_val
-
-                        if ic < new_width - 1:
-                            arr[ir, ic + 1] += err * 7/16
-                        if ir < new_height - 1:
-                            if ic > 0:
-                                arr[ir + 1, ic - 1] += err * 3/16
-                            arr[ir + 1, ic] += err * 5/16
-                            if ic < new_width - 1:
-                                arr[ir + 1, ic + 1] += err / 16
-
-                carr = np.array(arr * 255, dtype=np.uint8)
-                return Image.fromarray(carr)
-
-            def ordered_dither(img, nc):
-                width, height = img.size
-                dither_matrix = [
-                    [0, 8, 2, 10],
-                    [12, 4, 14, 6],
-                    [3, 11, 1, 9],
-                    [15, 7, 13, 5]
-                ]
-                dithered_image = Image.new('RGB', (width, height))
-                num_colors = min(2 ** int(np.log2(nc)), 16)
-
-                for y in range(height):
-                    for x in range(width):
-                        old_pixel = img.getpixel((x, y))
-                        threshold = dither_matrix[x % 4][y % 4] * num_colors
-                        new_pixel = tuple(int(c * num_colors / 256) * (256 // num_colors) for c in old_pixel)
-                        error = tuple(old - new for old, new in zip(old_pixel, new_pixel))
-                        dithered_image.putpixel((x, y), new_pixel)
-
-                        if x < width - 1:
-                            neighboring_pixel = img.getpixel((x + 1, y))
-                            neighboring_pixel = tuple(int(c * num_colors / 256) * (256 // num_colors) for c in neighboring_pixel)
-                            neighboring_error = tuple(neighboring - new for neighboring, new in zip(neighboring_pixel, new_pixel))
-                            neighboring_pixel = tuple(int(clamp(pixel + error * 7 / 16)) for pixel, error in zip(neighboring_pixel, neighboring_error))
-                            img.putpixel((x + 1, y), neighboring_pixel)
-
-                        if x < width - 1 and y < height - 1:
-                            neighboring_pixel = img.getpixel((x + 1, y + 1))
-                            neighboring_pixel = tuple(int(c * num_colors / 256) * (256 // num_colors) for c in neighboring_pixel)
-                            neighboring_error = tuple(neighboring - new for neighboring, new in zip(neighboring_pixel, new_pixel))
-                            neighboring_pixel = tuple(int(clamp(pixel + error * 1 / 16)) for pixel, error in zip(neighboring_pixel, neighboring_error))
-                            img.putpixel((x + 1, y + 1), neighboring_pixel)
-
-                        if y < height - 1:
-                            neighboring_pixel = img.getpixel((x, y + 1))
-                            neighboring_pixel = tuple(int(c * num_colors / 256) * (256 // num_colors) for c in neighboring_pixel)
-                            neighboring_error = tuple(neighboring - new for neighboring, new in zip(neighboring_pixel, new_pixel))
-                            neighboring_pixel = tuple(int(clamp(pixel + error * 5 / 16)) for pixel, error in zip(neighboring_pixel, neighboring_error))
-                            img.putpixel((x, y + 1), neighboring_pixel)
-
-                        if x > 0 and y < height - 1:
-                            neighboring_pixel = img.getpixel((x - 1, y + 1))
-                            neighboring_pixel = tuple(int(c * num_colors / 256) * (256 // num_colors) for c in neighboring_pixel)
-                            neighboring_error = tuple(neighboring - new for neighboring, new in zip(neighboring_pixel, new_pixel))
-                            neighboring_pixel = tuple(int(clamp(pixel + error * 3 / 16)) for pixel, error in zip(neighboring_pixel, neighboring_error))
-                            img.putpixel((x - 1, y + 1), neighboring_pixel)
-
-                return dithered_image
-
-            if mode == 'FloydSteinberg':
-                return fs_dither(image, nc)
-            elif mode == 'Ordered':
-                return ordered_dither(image, nc)
+        def sample_pixels(images, max_samples, random_state=42):
+            # Subsample evenly across frames so the fit cost does not grow with batch length
+            rng = np.random.default_rng(random_state)
+            per_frame = max(1, max_samples // len(images))
+            samples = []
+            for image in images:
+                pixels = np.array(image.convert('RGB')).reshape(-1, 3)
+                if len(pixels) > per_frame:
+                    pixels = pixels[rng.choice(len(pixels), per_frame, replace=False)]
+                samples.append(pixels)
+            return np.concatenate(samples)
+
+        def fit_palette(pixels, num_colors, init='random', max_iter=100, random_state=42, backend='KMeans'):
+            if backend == 'MedianCut':
+                sample = Image.fromarray(pixels.reshape(1, -1, 3).astype(np.uint8))
+                quantized = sample.quantize(colors=num_colors, method=getattr(Image, 'Quantize', Image).MEDIANCUT)
+                used = len(quantized.getcolors())
+                return np.array(quantized.getpalette()[:used * 3], dtype=np.float64).reshape(-1, 3)
+            n_init = 1 if isinstance(init, np.ndarray) else 'auto'
+            if backend == 'MiniBatchKMeans':
+                model = MiniBatchKMeans(n_clusters=num_colors, init=init, max_iter=max_iter, tol=1e-3, random_state=random_state, n_init=n_init, batch_size=4096)
             else:
-                cstr(f"Inavlid dithering mode `{mode}` selected.").error.print()
-                return image
-
-            return image
-
-        def color_palette_from_hex_lines(image, colors, palette_mode='Linear', reverse_palette=False):
-
-            def color_distance(color1, color2):
-                r1, g1, b1 = color1
-                r2, g2, b2 = color2
-                return np.sqrt((r1 - r2)**2 + (g1 - g2)**2 + (b1 - b2)**2)
-
-            def find_nearest_color_index(color, palette):
-                distances = [color_distance(color, palette_color) for palette_color in palette]
-                return distances.index(min(distances))
-
-            def find_nearest_color_index_tonal(color, palette):
-                distances = [color_distance_tonal(color, palette_color) for palette_color in palette]
-                return distances.index(min(distances))
-
-            def find_nearest_color_index_both(color, palette):
-                distances = [color_distance_both(color, palette_color) for palette_color in palette]
-                return distances.index(min(distances))
-
-            def color_distance_tonal(color1, color2):
-                r1, g1, b1 = color1
-                r2, g2, b2 = color2
-                l1 = 0.299 * r1 + 0.587 * g1 + 0.114 * b1
-                l2 = 0.299 * r2 + 0.587 * g2 + 0.114 * b2
-                return abs(l1 - l2)
+                model = KMeans(n_clusters=num_colors, init=init, max_iter=max_iter, tol=1e-3, random_state=random_state, n_init=n_init)
+            model.fit(pixels)
+            return model.cluster_centers_
+
+        def apply_palette(image, centers, chunk_size=16384):
+            np_image = np.array(image.convert('RGB'))
+            pixels = np_image.reshape(-1, 3).astype(np.float32)
+            centers = centers.astype(np.float32)
+            labels = np.empty(len(pixels), dtype=np.int64)
+            for start in range(0, len(pixels), chunk_size):
+                chunk = pixels[start:start + chunk_size]
+                distances = (chunk * chunk).sum(axis=1)[:, np.newaxis] - 2 * chunk @ centers.T + (centers * centers).sum(axis=1)[np.newaxis, :]
+                labels[start:start + chunk_size] = np.argmin(distances, axis=1)
+            colors = centers.astype(np.uint8)
+            return Image.fromarray(colors[labels].reshape(np_image.shape))
+
+        def flatten_colors(images, num_colors, init_mode='random', max_iter=100, random_state=42, mode='per_frame', backend='KMeans'):
+            if mode == 'shared_palette':
+                centers = fit_palette(sample_pixels(images, max_samples, random_state), num_colors, init_mode, max_iter, random_state, backend)
+                return [apply_palette(image, centers) for image in images], [centers]
+            flattened = []
+            palettes = []
+            centers = None
+            for image in images:
+                pixels = np.array(image.convert('RGB')).reshape(-1, 3)
+                if mode == 'per_frame' or len(pixels) <= max_samples:
+                    fit_pixels = pixels
+                else:
+                    fit_pixels = sample_pixels([image], max_samples, random_state)
+                init = centers if (mode == 'warm_start' and centers is not None and backend != 'MedianCut') else init_mode
+                centers = fit_palette(fit_pixels, num_colors, init, max_iter, random_state, backend)
+                flattened.append(apply_palette(image, centers))
+                palettes.append(centers)
+            return flattened, palettes
 
-            def color_distance_both(color1, color2):
-                r1, g1, b1 = color1
-                r2, g2, b2 = color2
-                l1 = 0.299 * r1 + 0.587 * g1 + 0.114 * b1
-                l2 = 0.299 * r2 + 0.587 * g2 + 0.114 * b2
-                return abs(l1 - l2) + sum(abs(c1 - c2) for c1, c2 in zip(color1, color2))
+        def palette_to_hex(centers):
+            return "\n".join(f"#{r:02x}{g:02x}{b:02x}" for r, g, b in centers.astype(np.uint8).tolist())
 
-            def color_distance(color1, color2):
-                return sum(abs(c1 - c2) for c1, c2 in zip(color1, color2))
+        def color_palette_from_hex_lines(image, colors, palette_mode='Linear', reverse_palette=False):
 
             color_palette = [hex_palette_to_rgb(color.lstrip('#')) for color in colors]
 
             if reverse_palette:
                 color_palette = color_palette[::-1]
 
-            np_image = np.array(image)
-            labels = np_image.reshape(image.size[1], image.size[0], -1)
-            width, height = image.size
-            new_image = Image.new("RGB", image.size)
-
-            if palette_mode == 'Linear':
-                color_palette_indices = list(range(len(color_palette)))
-            elif palette_mode == 'Brightness':
-                color_palette_indices = sorted(range(len(color_palette)), key=lambda i: sum(color_palette[i]) / 3)
-            elif palette_mode == 'Tonal':
-                color_palette_indices = sorted(range(len(color_palette)), key=lambda i: color_distance(color_palette[i], (128, 128, 128)))
-            elif palette_mode == 'BrightnessAndTonal':
-                color_palette_indices = sorted(range(len(color_palette)), key=lambda i: (sum(color_palette[i]) / 3, color_distance(color_palette[i], (128, 128, 128))))
-            else:
-                raise ValueError(f"Unsupported mapping mode: {palette_mode}")
-
-            for x in range(width):
-                for y in range(height):
-                    pixel_color = labels[y, x, :]
-
-                    if palette_mode == 'Linear':
-                        color_index = pixel_color[0] % len(color_palette)
-                    elif palette_mode == 'Brightness':
-                        color_index = find_nearest_color_index(pixel_color, [color_palette[i] for i in color_palette_indices])
-                    elif palette_mode == 'Tonal':
-                        color_index = find_nearest_color_index_tonal(pixel_color, [color_palette[i] for i in color_palette_indices])
-                    elif palette_mode == 'BrightnessAndTonal':
-                        color_index = find_nearest_color_index_both(pixel_color, [color_palette[i] for i in color_palette_indices])
-                    else:
-                        raise ValueError(f"Unsupported mapping mode: {palette_mode}")
-
-                    color = color_palette[color_palette_indices[color_index]]
-                    new_image.putpixel((x, y), color)
-
-            return new_image
+            return Image.fromarray(map_to_palette(np.array(image.convert('RGB')), tuple(color_palette), palette_mode))
 
         pil_images = [tensor2pil(image) for image in batch]
         pixel_art_images = []
@@ -2725,12 +3874,15 @@ class WAS_Image_Pixelate:
                 pixel_art_images.append(image.resize((new_width, int(new_height)), Image.NEAREST))
             else:
                 pixel_art_images.append(image)
+        palette_text = ""
         if init_mode != 'none':
-            pixel_art_images = [flatten_colors(image, num_colors, init_mode) for image in pixel_art_images]
+            pixel_art_images, palettes = flatten_colors(pixel_art_images, num_colors, init_mode, max_iter, random_state, quantize_mode, quantize_backend)
+            palette_text = "\n\n".join(palette_to_hex(centers) for centers in palettes)
         if dither:
-            pixel_art_images = [dither_image(image, dither_mode, num_colors) for image in pixel_art_images]
+            dithered = dither_batch(np.stack([np.array(image.convert('RGB')) for image in pixel_art_images]), dither_mode, num_colors)
+            pixel_art_images = [Image.fromarray(image) for image in dithered]
         if palette:
-            pixel_art_images = [color_palette_from_hex_lines(pixel_art_image, palette[i], palette_mode, reverse_palette) for i, pixel_art_image in enumerate(pixel_art_images)]
+            pixel_art_images = [color_palette_from_hex_lines(pixel_art_image, palette[min(i, len(palette) - 1)], palette_mode, reverse_palette) for i, pixel_art_image in enumerate(pixel_art_images)]
         else:
             pixel_art_images = pixel_art_images
         pixel_art_images = [image.resize(size, Image.NEAREST) for image, size in zip(pixel_art_images, original_sizes)]
@@ -2738,7 +3890,7 @@ class WAS_Image_Pixelate:
         tensor_images = [pil2tensor(image) for image in pixel_art_images]
 
         batch_tensor = torch.cat(tensor_images, dim=0)
-        return batch_tensor
+        return (batch_tensor, palette_text)
 
 # SIMPLE IMAGE ADJUST
 
@@ -4275,6 +5427,9 @@ class WAS_Image_Perlin_Noise:
                 "persistence": ("FLOAT", {"default": 0.5, "max": 100.0, "min": 0.01, "step": 0.01}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
             },
+            "optional": {
+                "batch_size": ("INT", {"default": 1, "max": 64, "min": 1, "step": 1}),
+            }
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -4283,13 +5438,16 @@ class WAS_Image_Perlin_Noise:
 
     CATEGORY = "WAS Suite/Image/Generate/Noise"
 
-    def perlin_noise(self, width, height, scale, octaves, persistence, seed):
+    def perlin_noise(self, width, height, scale, octaves, persistence, seed, batch_size=1):
 
         WTools = WAS_Tools_Class()
 
-        image = WTools.perlin_noise(width, height, octaves, persistence, scale, seed)
+        images = []
+        for i in range(batch_size):
+            image = WTools.perlin_noise(width, height, octaves, persistence, scale, seed + i)
+            images.append(pil2tensor(image))
 
-        return (pil2tensor(image), )
+        return (torch.cat(images, dim=0), )
 
 
 # IMAGE PERLIN POWER FRACTAL
@@ -4311,6 +5469,9 @@ class WAS_Image_Perlin_Power_Fractal:
                 "exponent": ("FLOAT", {"default": 2.0, "max": 100.0, "min": 0.01, "step": 0.01}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
             },
+            "optional": {
+                "batch_size": ("INT", {"default": 1, "max": 64, "min": 1, "step": 1}),
+            }
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -4319,13 +5480,16 @@ class WAS_Image_Perlin_Power_Fractal:
 
     CATEGORY = "WAS Suite/Image/Generate/Noise"
 
-    def perlin_power_fractal(self, width, height, scale, octaves, persistence, lacunarity, exponent, seed):
+    def perlin_power_fractal(self, width, height, scale, octaves, persistence, lacunarity, exponent, seed, batch_size=1):
 
         WTools = WAS_Tools_Class()
 
-        image = WTools.perlin_power_fractal(width, height, octaves, persistence, lacunarity, exponent, scale, seed)
+        images = []
+        for i in range(batch_size):
+            image = WTools.perlin_power_fractal(width, height, octaves, persistence, lacunarity, exponent, scale, seed + i)
+            images.append(pil2tensor(image))
 
-        return (pil2tensor(image), )
+        return (torch.cat(images, dim=0), )
 
 
 # IMAGE VORONOI NOISE FILTER
@@ -4340,13 +5504,14 @@ class WAS_Image_Voronoi_Noise_Filter:
             "required": {
                 "width": ("INT", {"default": 512, "max": 4096, "min": 64, "step": 1}),
                 "height": ("INT", {"default": 512, "max": 4096, "min": 64, "step": 1}),
-                "density": ("INT", {"default": 50, "max": 256, "min": 10, "step": 2}),
+                "density": ("INT", {"default": 50, "max": 4096, "min": 10, "step": 2}),
                 "modulator": ("INT", {"default": 0, "max": 8, "min": 0, "step": 1}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
             },
             "optional": {
                 "flat": (["False", "True"],),
                 "RGB_output": (["True", "False"],),
+                "batch_size": ("INT", {"default": 1, "max": 64, "min": 1, "step": 1}),
             }
         }
 
@@ -4356,18 +5521,22 @@ class WAS_Image_Voronoi_Noise_Filter:
 
     CATEGORY = "WAS Suite/Image/Generate/Noise"
 
-    def voronoi_noise_filter(self, width, height, density, modulator, seed, flat="False", RGB_output="True"):
+    def voronoi_noise_filter(self, width, height, density, modulator, seed, flat="False", RGB_output="True", batch_size=1):
 
         WTools = WAS_Tools_Class()
 
-        image = WTools.worley_noise(height=height, width=width, density=density, option=modulator, use_broadcast_ops=True, seed=seed, flat=(flat == "True")).image
+        images = []
+        for i in range(batch_size):
+            image = WTools.worley_noise(height=height, width=width, density=density, option=modulator, use_broadcast_ops=True, seed=seed + i, flat=(flat == "True")).image
 
-        if RGB_output == "True":
-            image = image.convert("RGB")
-        else:
-            image = image.convert("L")
+            if RGB_output == "True":
+                image = image.convert("RGB")
+            else:
+                image = image.convert("L")
 
-        return (pil2tensor(image), )
+            images.append(pil2tensor(image))
+
+        return (torch.cat(images, dim=0), )
 
 # IMAGE POWER NOISE
 
@@ -4653,6 +5822,10 @@ class WAS_Image_Displacement_Warp:
                 "displacement_maps": ("IMAGE",),
                 "amplitude": ("FLOAT", {"default": 25.0, "min": -4096, "max": 4096, "step": 0.1}),
             },
+            "optional": {
+                "sampling": (["nearest", "bilinear", "bicubic"],),
+                "displacement_channels": (["luminance", "red_x_green_y"],),
+            }
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -4661,47 +5834,14 @@ class WAS_Image_Displacement_Warp:
 
     CATEGORY = "WAS Suite/Image/Transform"
 
-    def displace_image(self, images, displacement_maps, amplitude):
+    def displace_image(self, images, displacement_maps, amplitude, sampling="nearest", displacement_channels="luminance"):
 
         WTools = WAS_Tools_Class()
 
-        displaced_images = []
-        for i in range(len(images)):
-            img = tensor2pil(images[i])
-            if i < len(displacement_maps):
-                disp = tensor2pil(displacement_maps[i])
-            else:
-                disp = tensor2pil(displacement_maps[-1])
-            disp = self.resize_and_crop(disp, img.size)
-            displaced_images.append(pil2tensor(WTools.displace_image(img, disp, amplitude)))
-
-        displaced_images = torch.cat(displaced_images, dim=0)
+        displaced_images = WTools.displace_image(images, displacement_maps, amplitude, sampling=sampling, channels=displacement_channels)
 
         return (displaced_images, )
 
-
-    def resize_and_crop(self, image, target_size):
-        width, height = image.size
-        target_width, target_height = target_size
-        aspect_ratio = width / height
-        target_aspect_ratio = target_width / target_height
-
-        if aspect_ratio > target_aspect_ratio:
-            new_height = target_height
-            new_width = int(new_height * aspect_ratio)
-        else:
-            new_width = target_width
-            new_height = int(new_width / aspect_ratio)
-
-        image = image.resize((new_width, new_height))
-        left = (new_width - target_width) // 2
-        top = (new_height - target_height) // 2
-        right = left + target_width
-        bottom = top + target_height
-        image = image.crop((left, top, right, bottom))
-
-        return image
-
 # IMAGE TO BATCH
 
 class WAS_Image_Batch:
@@ -5263,13 +6403,13 @@ class WAS_Image_Rescale:
 
 class WAS_Load_Image_Batch:
     def __init__(self):
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
+        self.HDB = WASDatabase.shared(WAS_HISTORY_DATABASE)
 
     @classmethod
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "mode": (["single_image", "incremental_image", "random"],),
+                "mode": (["single_image", "incremental_image", "random", "incremental_batch"],),
                 "index": ("INT", {"default": 0, "min": 0, "max": 150000, "step": 1}),
                 "label": ("STRING", {"default": 'Batch 001', "multiline": False}),
                 "path": ("STRING", {"default": '', "multiline": False}),
@@ -5278,6 +6418,10 @@ class WAS_Load_Image_Batch:
             },
             "optional": {
                 "filename_text_extension": (["true", "false"],),
+                "batch_size": ("INT", {"default": 8, "min": 1, "max": 1024, "step": 1}),
+                "resize_width": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
+                "resize_height": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 1}),
+                "resize_method": (["crop", "stretch", "pad"],),
             }
         }
 
@@ -5287,15 +6431,24 @@ class WAS_Load_Image_Batch:
 
     CATEGORY = "WAS Suite/IO"
 
-    def load_batch_images(self, path, pattern='*', index=0, mode="single_image", label='Batch 001', allow_RGBA_output='false', filename_text_extension='true'):
+    def load_batch_images(self, path, pattern='*', index=0, mode="single_image", label='Batch 001', allow_RGBA_output='false', filename_text_extension='true',
+                            batch_size=8, resize_width=0, resize_height=0, resize_method="crop"):
 
         allow_RGBA_output = (allow_RGBA_output == 'true')
 
         if not os.path.exists(path):
             return (None, )
         fl = self.BatchImageLoader(path, label, pattern)
-        new_paths = fl.image_paths
-        if mode == 'single_image':
+        if mode == 'incremental_batch':
+            images, filenames = fl.get_next_batch(batch_size, allow_RGBA_output, (resize_width, resize_height), resize_method)
+            if not filenames:
+                cstr(f"No valid images were found in `{path}` for the pattern `{pattern}`").error.print()
+                return (None, None)
+            update_history_images(fl.loaded_paths)
+            if filename_text_extension == "false":
+                filenames = [os.path.splitext(filename)[0] for filename in filenames]
+            return (images, "\n".join(filenames))
+        elif mode == 'single_image':
             image, filename = fl.get_image_by_id(index)
             if image == None:
                 cstr(f"No valid image was found for the inded `{index}`").error.print()
@@ -5313,8 +6466,8 @@ class WAS_Load_Image_Batch:
                 return (None, None)
 
 
-        # Update history
-        update_history_images(new_paths)
+        # Update history with the image that was loaded, not the whole directory
+        update_history_images(fl.loaded_paths)
 
         if not allow_RGBA_output:
            image = image.convert("RGB")
@@ -5325,11 +6478,18 @@ class WAS_Load_Image_Batch:
         return (pil2tensor(image), filename)
 
     class BatchImageLoader:
+        # Sorted file listings per (directory, pattern), reused while the directory is unchanged
+        index_cache = {}
+        # Decodes of upcoming batches per loader (directory, pattern, label), keyed by
+        # (path, mode, size, method)
+        prefetched = {}
+        executor = None
+
         def __init__(self, directory_path, label, pattern):
             self.WDB = WDB
-            self.image_paths = []
-            self.load_images(directory_path, pattern)
-            self.image_paths.sort()
+            self.image_paths = self.load_images(directory_path, pattern)
+            self.loaded_paths = []
+            self.owner = (os.path.abspath(directory_path), pattern, label)
             stored_directory_path = self.WDB.get('Batch Paths', label)
             stored_pattern = self.WDB.get('Batch Patterns', label)
             if stored_directory_path != directory_path or stored_pattern != pattern:
@@ -5341,18 +6501,63 @@ class WAS_Load_Image_Batch:
                 self.index = self.WDB.get('Batch Counters', label)
             self.label = label
 
-        def load_images(self, directory_path, pattern):
+        @classmethod
+        def directory_signature(cls, directory_path, recursive):
+            # Adding or removing a file only touches the mtime of its own directory, so recursive
+            # patterns also track the mtime of every subdirectory.
+            signature = [(directory_path, os.stat(directory_path).st_mtime_ns)]
+            if recursive:
+                stack = [directory_path]
+                while stack:
+                    with os.scandir(stack.pop()) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                signature.append((entry.path, entry.stat().st_mtime_ns))
+                                stack.append(entry.path)
+            return tuple(signature)
+
+        @classmethod
+        def load_images(cls, directory_path, pattern):
+            import bisect
+            import fnmatch
+
+            key = (os.path.abspath(directory_path), pattern)
+            recursive = '**' in pattern or '/' in pattern or os.sep in pattern
+            signature = cls.directory_signature(key[0], recursive)
+            cached = cls.index_cache.get(key)
+
+            if cached and cached["signature"] == signature:
+                return cached["paths"]
+
+            if cached and not recursive:
+                # Only this directory changed: diff its listing against the index
+                with os.scandir(key[0]) as entries:
+                    current = {os.path.abspath(entry.path) for entry in entries
+                               if fnmatch.fnmatch(entry.name, pattern) and entry.name.lower().endswith(ALLOWED_EXT)}
+                known = cached["set"]
+                removed = known - current
+                # Build a new list, earlier loaders still index into the cached one
+                paths = [path for path in cached["paths"] if path not in removed]
+                for path in current - known:
+                    bisect.insort(paths, path)
+                cls.index_cache[key] = {"signature": signature, "paths": paths, "set": current}
+                return paths
+
+            paths = []
             for file_name in glob.glob(os.path.join(glob.escape(directory_path), pattern), recursive=True):
                 if file_name.lower().endswith(ALLOWED_EXT):
-                    abs_file_path = os.path.abspath(file_name)
-                    self.image_paths.append(abs_file_path)
+                    paths.append(os.path.abspath(file_name))
+            paths.sort()
+            cls.index_cache[key] = {"signature": signature, "paths": paths, "set": set(paths)}
+            return paths
 
         def get_image_by_id(self, image_id):
             if image_id < 0 or image_id >= len(self.image_paths):
                 cstr(f"Invalid image index `{image_id}`").error.print()
-                return
+                return (None, None)
             i = Image.open(self.image_paths[image_id])
             i = ImageOps.exif_transpose(i)
+            self.loaded_paths = [self.image_paths[image_id]]
             return (i, os.path.basename(self.image_paths[image_id]))
 
         def get_next_image(self):
@@ -5366,8 +6571,74 @@ class WAS_Load_Image_Batch:
             self.WDB.insert('Batch Counters', self.label, self.index)
             i = Image.open(image_path)
             i = ImageOps.exif_transpose(i)
+            self.loaded_paths = [image_path]
             return (i, os.path.basename(image_path))
 
+        def get_next_batch(self, batch_size, allow_RGBA=False, size=(0, 0), method="crop"):
+            if not self.image_paths:
+                return (None, [])
+            if self.index >= len(self.image_paths):
+                self.index = 0
+
+            count = min(batch_size, len(self.image_paths))
+            batch_paths = [self.image_paths[(self.index + i) % len(self.image_paths)] for i in range(count)]
+            self.index = (self.index + count) % len(self.image_paths)
+            cstr(f'{cstr.color.YELLOW}{self.label}{cstr.color.END} Index: {self.index}').msg.print()
+            self.WDB.insert('Batch Counters', self.label, self.index)
+
+            mode = "RGBA" if allow_RGBA else "RGB"
+            if size[0] <= 0 or size[1] <= 0:
+                # Stack at the size of the first image of the batch
+                with Image.open(batch_paths[0]) as first:
+                    size = ImageOps.exif_transpose(first).size
+
+            images = [future.result() for future in self.decode(batch_paths, mode, size, method)]
+            self.loaded_paths = batch_paths
+
+            # Read ahead: start decoding the next batch while this one is being processed
+            next_paths = [self.image_paths[(self.index + i) % len(self.image_paths)] for i in range(count)]
+            self.decode(next_paths, mode, size, method, prefetch=True)
+
+            return (torch.from_numpy(np.stack(images)), [os.path.basename(path) for path in batch_paths])
+
+        def decode(self, paths, mode, size, method, prefetch=False):
+            from concurrent.futures import ThreadPoolExecutor
+
+            cls = WAS_Load_Image_Batch.BatchImageLoader
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 4), thread_name_prefix="was_batch_loader")
+
+            prefetched = cls.prefetched.setdefault(self.owner, {})
+            futures = []
+            for path in paths:
+                key = (path, mode, tuple(size), method)
+                future = prefetched.pop(key, None)
+                if future is None:
+                    future = cls.executor.submit(cls.decode_image, path, mode, tuple(size), method)
+                if prefetch:
+                    prefetched[key] = future
+                futures.append(future)
+
+            if not prefetch:
+                # Drop this loader's read-ahead that was not used, e.g. after the inputs changed
+                for future in prefetched.values():
+                    future.cancel()
+                prefetched.clear()
+            return futures
+
+        @staticmethod
+        def decode_image(path, mode, size, method):
+            with Image.open(path) as i:
+                i = ImageOps.exif_transpose(i).convert(mode)
+            if i.size != size:
+                if method == "stretch":
+                    i = i.resize(size, Image.LANCZOS)
+                elif method == "pad":
+                    i = ImageOps.pad(i, size, Image.LANCZOS)
+                else:
+                    i = ImageOps.fit(i, size, Image.LANCZOS)
+            return np.array(i).astype(np.float32) / 255.0
+
         def get_current_image(self):
             if self.index >= len(self.image_paths):
                 self.index = 0
@@ -5379,36 +6650,28 @@ class WAS_Load_Image_Batch:
         if kwargs['mode'] != 'single_image':
             return float("NaN")
         else:
-            fl = WAS_Load_Image_Batch.BatchImageLoader(kwargs['path'], kwargs['label'], kwargs['pattern'])
-            filename = fl.get_current_image()
-            image = os.path.join(kwargs['path'], filename)
-            sha = get_sha256(image)
-            return sha
+            if not os.path.exists(kwargs['path']):
+                return float("NaN")
+            image_paths = WAS_Load_Image_Batch.BatchImageLoader.load_images(kwargs['path'], kwargs['pattern'])
+            index = kwargs['index']
+            if index < 0 or index >= len(image_paths):
+                return float("NaN")
+            # File identity and stat metadata instead of hashing the image on every queue
+            stat = os.stat(image_paths[index])
+            return f"{image_paths[index]}:{stat.st_size}:{stat.st_mtime_ns}"
 
 
 # IMAGE HISTORY NODE
 
 class WAS_Image_History:
     def __init__(self):
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
-        self.conf = getSuiteConfig()
+        pass
 
     @classmethod
     def INPUT_TYPES(cls):
-        HDB = WASDatabase(WAS_HISTORY_DATABASE)
-        conf = getSuiteConfig()
-        paths = ['No History']
-        if HDB.catExists("History") and HDB.keyExists("History", "Images"):
-            history_paths = HDB.get("History", "Images")
-            if conf.__contains__('history_display_limit'):
-                history_paths = history_paths[-conf['history_display_limit']:]
-                paths = []
-            for path_ in history_paths:
-                paths.append(os.path.join('...'+os.sep+os.path.basename(os.path.dirname(path_)), os.path.basename(path_)))
-
         return {
             "required": {
-                "image": (paths,),
+                "image": (history_choices("Images"),),
             },
         }
 
@@ -5419,14 +6682,9 @@ class WAS_Image_History:
     CATEGORY = "WAS Suite/History"
 
     def image_history(self, image):
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
-        paths = {}
-        if self.HDB.catExists("History") and self.HDB.keyExists("History", "Images"):
-            history_paths = self.HDB.get("History", "Images")
-            for path_ in history_paths:
-                paths.update({os.path.join('...'+os.sep+os.path.basename(os.path.dirname(path_)), os.path.basename(path_)): path_})
-        if os.path.exists(paths[image]) and paths.__contains__(image):
-            return (pil2tensor(Image.open(paths[image]).convert('RGB')), os.path.basename(paths[image]))
+        path = WAS_HISTORY.resolve("Images", image)
+        if path is not None and os.path.exists(path):
+            return (pil2tensor(Image.open(path).convert('RGB')), os.path.basename(path))
         else:
             cstr(f"The image `{image}` does not exist!").error.print()
             return (pil2tensor(Image.new('RGB', (512,512), (0, 0, 0, 0))), 'null')
@@ -6966,21 +8224,25 @@ class WAS_Image_Ambient_Occlusion:
 
     def ambient_occlusion(self, images, depth_images, strength, radius, ao_blur, specular_threshold, enable_specular_masking, tile_size):
 
+        # tile_size is kept for saved workflows, the batch kernel covers the whole frame without seams
         enable_specular_masking = (enable_specular_masking == 'True')
+        rgb_images, depth_levels = occlusion_inputs(images, depth_images)
+
+        cstr(f"Processing SSAO for {len(rgb_images)} image(s) ...").msg.print()
+        rgb_levels = np.stack([np.array(rgb_image) for rgb_image in rgb_images])
+        occlusion_arrays = ambient_occlusion_batch(rgb_levels, depth_levels, radius)
+
         composited = []
         occlusions = []
         speculars = []
-        for i, image in enumerate(images):
-            cstr(f"Processing SSAO image {i+1}/{len(images)} ...").msg.print()
-            composited_image, occlusion_image, specular_mask = self.create_ambient_occlusion(
-                tensor2pil(image),
-                tensor2pil(depth_images[(i if len(depth_images) >= i else -1)]),
+        for rgb_image, occlusion_array in zip(rgb_images, occlusion_arrays):
+            composited_image, occlusion_image, specular_mask = self.composite_ambient_occlusion(
+                rgb_image,
+                occlusion_array,
                 strength=strength,
-                radius=radius,
                 ao_blur=ao_blur,
                 spec_threshold=specular_threshold,
-                enable_specular_masking=enable_specular_masking,
-                tile_size=tile_size
+                enable_specular_masking=enable_specular_masking
             )
             composited.append(pil2tensor(composited_image))
             occlusions.append(pil2tensor(occlusion_image))
@@ -6992,59 +8254,16 @@ class WAS_Image_Ambient_Occlusion:
 
         return ( composited, occlusions, speculars )
 
-    def process_tile(self, tile_rgb, tile_depth, tile_x, tile_y, radius):
-        tile_occlusion = calculate_ambient_occlusion_factor(tile_rgb, tile_depth, tile_rgb.shape[0], tile_rgb.shape[1], radius)
-        return tile_x, tile_y, tile_occlusion
-
-
     def create_ambient_occlusion(self, rgb_image, depth_image, strength=1.0, radius=30, ao_blur=5, spec_threshold=200, enable_specular_masking=False, tile_size=1):
 
-        import concurrent.futures
-
+        rgb_image = rgb_image.convert("RGB")
         if depth_image.size != rgb_image.size:
             depth_image = depth_image.resize(rgb_image.size)
-        rgb_normalized = np.array(rgb_image, dtype=np.float32) / 255.0
-        depth_normalized = np.array(depth_image, dtype=np.float32) / 255.0
-
-        height, width, _ = rgb_normalized.shape
-
-        if tile_size <= 1:
-            print("Processing single-threaded AO (highest quality) ...")
-            occlusion_array = calculate_ambient_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius)
-        else:
-            tile_size = ((tile_size if tile_size <= 8 else 8) if tile_size > 1 else 1)
-            num_tiles_x = (width - 1) // tile_size + 1
-            num_tiles_y = (height - 1) // tile_size + 1
-
-            occlusion_array = np.zeros((height, width), dtype=np.uint8)
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = []
-
-                with tqdm(total=num_tiles_y * num_tiles_x) as pbar:
-                    for tile_y in range(num_tiles_y):
-                        for tile_x in range(num_tiles_x):
-                            tile_left = tile_x * tile_size
-                            tile_upper = tile_y * tile_size
-                            tile_right = min(tile_left + tile_size, width)
-                            tile_lower = min(tile_upper + tile_size, height)
-
-                            tile_rgb = rgb_normalized[tile_upper:tile_lower, tile_left:tile_right]
-                            tile_depth = depth_normalized[tile_upper:tile_lower, tile_left:tile_right]
+        occlusion_array = ambient_occlusion_batch(np.array(rgb_image)[None], np.array(depth_image)[None], radius)[0]
 
-                            future = executor.submit(self.process_tile, tile_rgb, tile_depth, tile_x, tile_y, radius)
-                            futures.append(future)
+        return self.composite_ambient_occlusion(rgb_image, occlusion_array, strength, ao_blur, spec_threshold, enable_specular_masking)
 
-                    for future in concurrent.futures.as_completed(futures):
-                        tile_x, tile_y, tile_occlusion = future.result()
-                        tile_left = tile_x * tile_size
-                        tile_upper = tile_y * tile_size
-                        tile_right = min(tile_left + tile_size, width)
-                        tile_lower = min(tile_upper + tile_size, height)
-
-                        occlusion_array[tile_upper:tile_lower, tile_left:tile_right] = tile_occlusion
-
-                        pbar.update(1)
+    def composite_ambient_occlusion(self, rgb_image, occlusion_array, strength=1.0, ao_blur=5, spec_threshold=200, enable_specular_masking=False):
 
         occlusion_array = (occlusion_array * strength).clip(0, 255).astype(np.uint8)
 
@@ -7091,17 +8310,21 @@ class WAS_Image_Direct_Occlusion:
 
     def direct_occlusion(self, images, depth_images, strength, radius, specular_threshold, colored_occlusion):
 
+        rgb_images, depth_levels = occlusion_inputs(images, depth_images)
+
+        cstr(f"Processing SSDO for {len(rgb_images)} image(s) ...").msg.print()
+        rgb_levels = np.stack([np.array(rgb_image) for rgb_image in rgb_images])
+        occlusion_arrays = direct_occlusion_batch(rgb_levels, depth_levels, radius)
+
         composited = []
         occlusions = []
         occlusion_masks = []
         light_sources = []
-        for i, image in enumerate(images):
-            cstr(f"Processing SSDO image {i+1}/{len(images)} ...").msg.print()
-            composited_image, occlusion_image, occlusion_mask, light_source = self.create_direct_occlusion(
-                tensor2pil(image),
-                tensor2pil(depth_images[(i if len(depth_images) >= i else -1)]),
+        for rgb_image, occlusion_array in zip(rgb_images, occlusion_arrays):
+            composited_image, occlusion_image, occlusion_mask, light_source = self.composite_direct_occlusion(
+                rgb_image,
+                occlusion_array,
                 strength=strength,
-                radius=radius,
                 threshold=specular_threshold,
                 colored=True
             )
@@ -7154,13 +8377,15 @@ class WAS_Image_Direct_Occlusion:
         return result.convert("RGB")
 
     def create_direct_occlusion(self, rgb_image, depth_image, strength=1.0, radius=10, threshold=200, colored=False):
+        rgb_image = rgb_image.convert("RGB")
+        if depth_image.size != rgb_image.size:
+            depth_image = depth_image.resize(rgb_image.size)
+        occlusion_array = direct_occlusion_batch(np.array(rgb_image)[None], np.array(depth_image)[None], radius)[0]
+        return self.composite_direct_occlusion(rgb_image, occlusion_array, strength, threshold, colored)
+
+    def composite_direct_occlusion(self, rgb_image, occlusion_scaled, strength=1.0, threshold=200, colored=False):
         rgb_normalized = np.array(rgb_image, dtype=np.float32) / 255.0
-        depth_normalized = np.array(depth_image, dtype=np.float32) / 255.0
-        height, width, _ = rgb_normalized.shape
         light_mask, light_x, light_y = self.find_light_source(rgb_normalized, threshold)
-        occlusion_array = calculate_direct_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius)
-        #occlusion_scaled = (occlusion_array / np.max(occlusion_array) * 255).astype(np.uint8)
-        occlusion_scaled = ((occlusion_array - np.min(occlusion_array)) / (np.max(occlusion_array) - np.min(occlusion_array)) * 255).astype(np.uint8)
         occlusion_image = Image.fromarray(occlusion_scaled, mode="L")
         occlusion_image = occlusion_image.filter(ImageFilter.GaussianBlur(radius=0.5))
         occlusion_image = occlusion_image.filter(ImageFilter.SMOOTH_MORE)
@@ -7298,6 +8523,9 @@ class WAS_Image_Save:
                 "embed_workflow": (["true", "false"],),
                 "show_previews": (["true", "false"],),
             },
+            "optional": {
+                "async_save": (["false", "true"],),
+            },
             "hidden": {
                 "prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"
             },
@@ -7316,7 +8544,7 @@ class WAS_Image_Save:
                         extension='png', dpi=96, quality=100, optimize_image="true", lossless_webp="false", prompt=None, extra_pnginfo=None,
                         overwrite_mode='false', filename_number_padding=4, filename_number_start='false',
                         show_history='false', show_history_by_prefix="true", embed_workflow="true",
-                        show_previews="true"):
+                        show_previews="true", async_save="false"):
 
         delimiter = filename_delimiter
         number_padding = filename_number_padding
@@ -7349,148 +8577,108 @@ class WAS_Image_Save:
                 cstr(f'The path `{output_path.strip()}` specified doesn\'t exist! Creating directory.').warning.print()
                 os.makedirs(output_path, exist_ok=True)
 
-        # Find existing counter values
-        if filename_number_start == 'true':
-            pattern = f"(\\d+){re.escape(delimiter)}{re.escape(filename_prefix)}"
-        else:
-            pattern = f"{re.escape(filename_prefix)}{re.escape(delimiter)}(\\d+)"
-        existing_counters = [
-            int(re.search(pattern, filename).group(1))
-            for filename in os.listdir(output_path)
-            if re.match(pattern, os.path.basename(filename))
-        ]
-        existing_counters.sort(reverse=True)
-
-        # Set initial counter value
-        if existing_counters:
-            counter = existing_counters[0] + 1
-        else:
-            counter = 1
-
-        # Set initial counter value
-        if existing_counters:
-            counter = existing_counters[0] + 1
-        else:
-            counter = 1
-
         # Set Extension
         file_extension = '.' + extension
         if file_extension not in ALLOWED_EXT:
             cstr(f"The extension `{extension}` is not valid. The valid formats are: {', '.join(sorted(ALLOWED_EXT))}").error.print()
             file_extension = "png"
 
+        # Serialize the metadata once for the whole batch
+        exif_data = None
+        if extension == 'webp':
+            img_exif = Image.Exif()
+            if embed_workflow == 'true':
+                workflow_metadata = ''
+                if prompt is not None:
+                    img_exif[0x010f] = "Prompt:" + json.dumps(prompt)
+                if extra_pnginfo is not None:
+                    for x in extra_pnginfo:
+                        workflow_metadata += json.dumps(extra_pnginfo[x])
+                img_exif[0x010e] = "Workflow:" + workflow_metadata
+            exif_data = img_exif.tobytes()
+        else:
+            exif_data = PngInfo()
+            if embed_workflow == 'true':
+                if prompt is not None:
+                    exif_data.add_text("prompt", json.dumps(prompt))
+                if extra_pnginfo is not None:
+                    for x in extra_pnginfo:
+                        exif_data.add_text(x, json.dumps(extra_pnginfo[x]))
+
+        save_options = {
+            "extension": extension,
+            "quality": quality,
+            "optimize": optimize_image,
+            "dpi": dpi,
+            "lossless": lossless_webp,
+            "exif_data": exif_data,
+        }
+
         results = list()
         output_files = list()
+        futures = list()
         for image in images:
             i = 255. * image.cpu().numpy()
             img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
 
-            # Delegate metadata/pnginfo
-            if extension == 'webp':
-                img_exif = img.getexif()
-                if embed_workflow == 'true':
-                    workflow_metadata = ''
-                    prompt_str = ''
-                    if prompt is not None:
-                        prompt_str = json.dumps(prompt)
-                        img_exif[0x010f] = "Prompt:" + prompt_str
-                    if extra_pnginfo is not None:
-                        for x in extra_pnginfo:
-                            workflow_metadata += json.dumps(extra_pnginfo[x])
-                    img_exif[0x010e] = "Workflow:" + workflow_metadata
-                exif_data = img_exif.tobytes()
-            else:
-                metadata = PngInfo()
-                if embed_workflow == 'true':
-                    if prompt is not None:
-                        metadata.add_text("prompt", json.dumps(prompt))
-                    if extra_pnginfo is not None:
-                        for x in extra_pnginfo:
-                            metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-                exif_data = metadata
-
             # Delegate the filename stuffs
             if overwrite_mode == 'prefix_as_filename':
                 file = f"{filename_prefix}{file_extension}"
             else:
-                if filename_number_start == 'true':
-                    file = f"{counter:0{number_padding}}{delimiter}{filename_prefix}{file_extension}"
-                else:
-                    file = f"{filename_prefix}{delimiter}{counter:0{number_padding}}{file_extension}"
-                if os.path.exists(os.path.join(output_path, file)):
-                    counter += 1
-
-            # Save the images
-            try:
-                output_file = os.path.abspath(os.path.join(output_path, file))
-                if extension in ["jpg", "jpeg"]:
-                    img.save(output_file,
-                             quality=quality, optimize=optimize_image, dpi=(dpi, dpi))
-                elif extension == 'webp':
-                    img.save(output_file,
-                             quality=quality, lossless=lossless_webp, exif=exif_data)
-                elif extension == 'png':
-                    img.save(output_file,
-                             pnginfo=exif_data, optimize=optimize_image)
-                elif extension == 'bmp':
-                    img.save(output_file)
-                elif extension == 'tiff':
-                    img.save(output_file,
-                             quality=quality, optimize=optimize_image)
-                else:
-                    img.save(output_file,
-                             pnginfo=exif_data, optimize=optimize_image)
+                file = self.next_filename(output_path, filename_prefix, delimiter, number_padding, filename_number_start == 'true', file_extension)
 
-                cstr(f"Image file saved to: {output_file}").msg.print()
-                output_files.append(output_file)
-
-                if show_history != 'true' and show_previews == 'true':
-                    subfolder = self.get_subfolder_path(output_file, original_output)
-                    results.append({
-                        "filename": file,
-                        "subfolder": subfolder,
-                        "type": self.type
-                    })
+            output_file = os.path.abspath(os.path.join(output_path, file))
+            if overwrite_mode == 'prefix_as_filename':
+                # Every image targets the same file: save in order so the last one wins
+                try:
+                    self.save_image(img, output_file, save_options)
+                    cstr(f"Image file saved to: {output_file}").msg.print()
+                except OSError as e:
+                    cstr(f'Unable to save file to: {output_file}').error.print()
+                    print(e)
+                    continue
+                except Exception as e:
+                    cstr('Unable to save file due to the to the following error:').error.print()
+                    print(e)
+                    continue
+            elif async_save == 'true':
+                # Recorded in the history from the save callback once the file exists
+                self.submit_save(img, output_file, save_options, record_history=True)
+                continue
+            else:
+                futures.append((output_file, self.submit_save(img, output_file, save_options)))
+            output_files.append(output_file)
 
-                # Update the output image history
-                update_history_output_images(output_file)
+            if show_history != 'true' and show_previews == 'true':
+                subfolder = self.get_subfolder_path(output_file, original_output)
+                results.append({
+                    "filename": file,
+                    "subfolder": subfolder,
+                    "type": self.type
+                })
 
-            except OSError as e:
-                cstr(f'Unable to save file to: {output_file}').error.print()
-                print(e)
-            except Exception as e:
-                cstr('Unable to save file due to the to the following error:').error.print()
-                print(e)
+        for output_file, future in futures:
+            try:
+                future.result()
+            except Exception:
+                # Already reported by the save callback
+                output_files.remove(output_file)
+                results = [r for r in results if r["filename"] != os.path.basename(output_file)]
 
-            if overwrite_mode == 'false':
-                counter += 1
+        # Update the output image history
+        if output_files:
+            update_history_output_images(output_files)
 
         filtered_paths = []
         if show_history == 'true' and show_previews == 'true':
-            HDB = WASDatabase(WAS_HISTORY_DATABASE)
-            conf = getSuiteConfig()
-            if HDB.catExists("History") and HDB.keyExists("History", "Output_Images"):
-                history_paths = HDB.get("History", "Output_Images")
-            else:
-                history_paths = None
-
-            if history_paths:
-
-                for image_path in history_paths:
-                    image_subdir = self.get_subfolder_path(image_path, self.output_dir)
-                    current_subdir = self.get_subfolder_path(output_file, self.output_dir)
-                    if not os.path.exists(image_path):
-                        continue
-                    if show_history_by_prefix == 'true' and image_subdir != current_subdir:
-                        continue
-                    if show_history_by_prefix == 'true' and not os.path.basename(image_path).startswith(filename_prefix):
-                        continue
-                    filtered_paths.append(image_path)
-
-                if conf.__contains__('history_display_limit'):
-                    filtered_paths = filtered_paths[-conf['history_display_limit']:]
-
-                filtered_paths.reverse()
+            # Newest first, limited to this save's folder and prefix when filtering by prefix
+            by_prefix = (show_history_by_prefix == 'true')
+            filtered_paths = WAS_HISTORY.paths(
+                "Output_Images",
+                limit=was_config.get('history_display_limit', None),
+                folder=output_path if by_prefix else None,
+                prefix=filename_prefix if by_prefix else None,
+            )
 
         if filtered_paths:
             for image_path in filtered_paths:
@@ -7507,6 +8695,103 @@ class WAS_Image_Save:
         else:
             return {"ui": {"images": []}, "result": (images, output_files,)}
 
+    # Next free counter per (path, prefix, delimiter, number position), read from disk once
+    counters = {}
+    counter_lock = threading.Lock()
+
+    # Bounded pool encoding and writing images in the background
+    save_executor = None
+    save_slots = threading.BoundedSemaphore(32)
+
+    def next_filename(self, output_path, filename_prefix, delimiter, number_padding, number_start, file_extension):
+        key = (os.path.abspath(output_path), filename_prefix, delimiter, number_start)
+        with self.counter_lock:
+            counter = self.counters.get(key)
+            if counter is None:
+                if number_start:
+                    pattern = f"(\\d+){re.escape(delimiter)}{re.escape(filename_prefix)}"
+                else:
+                    pattern = f"{re.escape(filename_prefix)}{re.escape(delimiter)}(\\d+)"
+                existing_counters = [
+                    int(re.search(pattern, filename).group(1))
+                    for filename in os.listdir(output_path)
+                    if re.match(pattern, os.path.basename(filename))
+                ]
+                counter = max(existing_counters) + 1 if existing_counters else 1
+
+            while True:
+                if number_start:
+                    file = f"{counter:0{number_padding}}{delimiter}{filename_prefix}{file_extension}"
+                else:
+                    file = f"{filename_prefix}{delimiter}{counter:0{number_padding}}{file_extension}"
+                counter += 1
+                if not os.path.exists(os.path.join(output_path, file)):
+                    break
+
+            self.counters[key] = counter
+        return file
+
+    def submit_save(self, img, output_file, options, record_history=False):
+        from concurrent.futures import ThreadPoolExecutor
+
+        cls = WAS_Image_Save
+        if cls.save_executor is None:
+            cls.save_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="was_image_save")
+
+        # Back-pressure: blocks while the queue of pending saves is full
+        cls.save_slots.acquire()
+        future = cls.save_executor.submit(cls.save_image, img, output_file, options)
+        future.add_done_callback(lambda f: cls.save_done(f, output_file, record_history))
+        return future
+
+    @staticmethod
+    def save_done(future, output_file, record_history=False):
+        WAS_Image_Save.save_slots.release()
+        error = future.exception()
+        if error is None:
+            cstr(f"Image file saved to: {output_file}").msg.print()
+            if record_history:
+                update_history_output_images([output_file])
+        elif isinstance(error, OSError):
+            cstr(f'Unable to save file to: {output_file}').error.print()
+            print(error)
+        else:
+            cstr('Unable to save file due to the to the following error:').error.print()
+            print(error)
+
+    @staticmethod
+    def save_image(img, output_file, options):
+        extension = options["extension"]
+        quality = options["quality"]
+        optimize_image = options["optimize"]
+        dpi = options["dpi"]
+        exif_data = options["exif_data"]
+        # Write beside the target and swap it in, so readers never see a partial file
+        root, ext = os.path.splitext(output_file)
+        temp_file = f"{root}.{os.getpid()}.{threading.get_ident()}.part{ext}"
+        try:
+            if extension in ["jpg", "jpeg"]:
+                img.save(temp_file,
+                         quality=quality, optimize=optimize_image, dpi=(dpi, dpi))
+            elif extension == 'webp':
+                img.save(temp_file,
+                         quality=quality, lossless=options["lossless"], exif=exif_data)
+            elif extension == 'png':
+                img.save(temp_file,
+                         pnginfo=exif_data, optimize=optimize_image)
+            elif extension == 'bmp':
+                img.save(temp_file)
+            elif extension == 'tiff':
+                img.save(temp_file,
+                         quality=quality, optimize=optimize_image)
+            else:
+                img.save(temp_file,
+                         pnginfo=exif_data, optimize=optimize_image)
+            os.replace(temp_file, output_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
     def get_subfolder_path(self, image_path, output_path):
         output_parts = output_path.strip(os.sep).split(os.sep)
         image_parts = image_path.strip(os.sep).split(os.sep)
@@ -7572,7 +8857,7 @@ class WAS_Load_Image:
 
     def __init__(self):
         self.input_dir = comfy_paths.input_directory
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
+        self.HDB = WASDatabase.shared(WAS_HISTORY_DATABASE)
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -8706,6 +9991,127 @@ class WAS_Latent_Noise:
 
 # MIDAS DEPTH APPROXIMATION NODE
 
+# MiDaS Model Cache
+
+MIDAS_CHECKPOINTS = {
+    "DPT_Large": ("dpt_large_384.pt", "https://github.com/isl-org/MiDaS/releases/download/v3/dpt_large_384.pt"),
+    "DPT_Hybrid": ("dpt_hybrid_384.pt", "https://github.com/isl-org/MiDaS/releases/download/v3/dpt_hybrid_384.pt"),
+}
+
+def load_midas(midas_type, device, keep_warm=False, resident=False):
+    def loader(device):
+        midas_dir = os.path.join(MODELS_DIR, 'midas')
+        model_name, model_url = MIDAS_CHECKPOINTS.get(midas_type, MIDAS_CHECKPOINTS["DPT_Large"])
+        model_path = os.path.join(midas_dir, 'checkpoints'+os.sep+model_name)
+
+        torch.hub.set_dir(midas_dir)
+        if os.path.exists(model_path):
+            cstr(f"Loading MiDaS Model from `{model_path}`").msg.print()
+        else:
+            cstr("Downloading and loading MiDaS Model...").msg.print()
+            # Fetch the checkpoint where torch.hub looks for it; hub downloads it itself if this fails
+            if midas_type in MIDAS_CHECKPOINTS:
+                download_file(model_url, model_name, os.path.dirname(model_path))
+        midas = torch.hub.load("intel-isl/MiDaS", midas_type, trust_repo=True)
+        midas.to(device).eval()
+        midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
+        if midas_type in ("DPT_Large", "DPT_Hybrid"):
+            transform = midas_transforms.dpt_transform
+        else:
+            transform = midas_transforms.small_transform
+        return (midas, transform)
+    return WAS_MODEL_CACHE.load(("midas", midas_type), loader, device, keep_warm=keep_warm, resident=resident)
+
+# MiDaS Batched Depth
+#
+# Frames are grouped by resolution and run through the model in micro-batches with the
+# transform reproduced on tensors: the keep-aspect resize to a multiple of 32 with the
+# transform's own method ("minimal" for DPT, "upper_bound" for MiDaS_small), then its
+# normalization. Predictions are upsampled back to each frame's size on the device.
+# `normalization` is "per_frame", "global" (one min/max across the batch) or "none" for raw
+# predictions.
+
+def midas_transform_params(transform):
+    resize, normalize = None, None
+    for step in getattr(transform, "transforms", []):
+        if hasattr(step, "_Resize__height"):
+            resize = step
+        elif hasattr(step, "_NormalizeImage__mean"):
+            normalize = step
+    target = (resize._Resize__height, resize._Resize__width) if resize is not None else (384, 384)
+    method = resize._Resize__resize_method if resize is not None else "minimal"
+    multiple = resize._Resize__multiple_of if resize is not None else 32
+    mean = normalize._NormalizeImage__mean if normalize is not None else [0.5, 0.5, 0.5]
+    std = normalize._NormalizeImage__std if normalize is not None else [0.5, 0.5, 0.5]
+    return target, method, multiple, mean, std
+
+# Same size as `Resize.get_size` from the MiDaS transforms with keep_aspect_ratio enabled
+def midas_input_size(height, width, target, method="minimal", multiple=32):
+    def constrain(x, min_val=0, max_val=None):
+        y = int(np.round(x / multiple) * multiple)
+        if max_val is not None and y > max_val:
+            y = int(np.floor(x / multiple) * multiple)
+        if y < min_val:
+            y = int(np.ceil(x / multiple) * multiple)
+        return y
+    scale_height = target[0] / height
+    scale_width = target[1] / width
+    if method == "lower_bound":
+        scale = max(scale_height, scale_width)
+    elif method == "upper_bound":
+        scale = min(scale_height, scale_width)
+    else:
+        scale = scale_width if abs(1 - scale_width) < abs(1 - scale_height) else scale_height
+    if method == "lower_bound":
+        return constrain(scale * height, min_val=target[0]), constrain(scale * width, min_val=target[1])
+    if method == "upper_bound":
+        return constrain(scale * height, max_val=target[0]), constrain(scale * width, max_val=target[1])
+    return constrain(scale * height), constrain(scale * width)
+
+def midas_depth_batch(midas, transform, images, batch_size=4, precision="fp32", normalization="per_frame"):
+    import torch.nn.functional as F
+
+    device = next(midas.parameters()).device
+    target, method, multiple, mean, std = midas_transform_params(transform)
+    mean = torch.tensor(mean, device=device, dtype=torch.float32).view(1, -1, 1, 1)
+    std = torch.tensor(std, device=device, dtype=torch.float32).view(1, -1, 1, 1)
+    half = precision == "fp16" and device.type == "cuda"
+
+    buckets = {}
+    for index, frame in enumerate(images):
+        buckets.setdefault(tuple(frame.shape[:2]), []).append(index)
+
+    depths = [None] * len(images)
+    done = 0
+    for (height, width), indices in buckets.items():
+        input_size = midas_input_size(height, width, target, method, multiple)
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            pixels = images[chunk][..., :3].permute(0, 3, 1, 2).to(device, torch.float32)
+            pixels = F.interpolate(pixels, size=input_size, mode="bicubic", align_corners=False).clamp(0, 1)
+            pixels = (pixels - mean) / std
+
+            with torch.no_grad(), torch.autocast(device_type=device.type, dtype=torch.float16, enabled=half):
+                prediction = midas(pixels)
+            prediction = F.interpolate(prediction.unsqueeze(1).float(), size=(height, width), mode="bicubic", align_corners=False).squeeze(1)
+
+            if normalization == "per_frame":
+                minimum = prediction.flatten(1).min(dim=1).values.view(-1, 1, 1)
+                maximum = prediction.flatten(1).max(dim=1).values.view(-1, 1, 1)
+                prediction = (prediction - minimum) / (maximum - minimum).clamp(min=1e-8)
+
+            for index, depth in zip(chunk, prediction.cpu()):
+                depths[index] = depth
+            done += len(chunk)
+            cstr(f"Approximated depth for {done}/{len(images)} images").msg.print()
+
+    if normalization == "global":
+        minimum = min(depth.min() for depth in depths)
+        maximum = max(depth.max() for depth in depths)
+        depths = [(depth - minimum) / max(float(maximum - minimum), 1e-8) for depth in depths]
+
+    return depths
+
 class MiDaS_Model_Loader:
     def __init__(self):
         self.midas_dir = os.path.join(MODELS_DIR, 'midas')
@@ -8716,6 +10122,9 @@ class MiDaS_Model_Loader:
             "required": {
                 "midas_model": (["DPT_Large", "DPT_Hybrid"],),
             },
+            "optional": {
+                "keep_warm": ("BOOLEAN", {"default": False}),
+            }
         }
 
     RETURN_TYPES = ("MIDAS_MODEL",)
@@ -8724,38 +10133,18 @@ class MiDaS_Model_Loader:
 
     CATEGORY = "WAS Suite/Loaders"
 
-    def load_midas_model(self, midas_model):
+    def load_midas_model(self, midas_model, keep_warm=False):
 
         global MIDAS_INSTALLED
 
         if not MIDAS_INSTALLED:
             self.install_midas()
 
-        if midas_model == 'DPT_Large':
-            model_name = 'dpt_large_384.pt'
-        elif midas_model == 'DPT_Hybrid':
-            model_name = 'dpt_hybrid_384.pt'
-        else:
-            model_name = 'dpt_large_384.pt'
-
-        model_path = os.path.join(self.midas_dir, 'checkpoints'+os.sep+model_name)
-
-        torch.hub.set_dir(self.midas_dir)
-        if os.path.exists(model_path):
-            cstr(f"Loading MiDaS Model from `{model_path}`").msg.print()
-            midas_type = model_path
-        else:
-            cstr("Downloading and loading MiDaS Model...").msg.print()
-        midas = torch.hub.load("intel-isl/MiDaS", midas_model, trust_repo=True)
         device = torch.device("cpu")
 
         cstr(f"MiDaS is using passive device `{device}` until in use.").msg.print()
 
-        midas.to(device)
-        midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-        transform = midas_transforms.dpt_transform
-
-        return ( (midas, transform), )
+        return ( load_midas(midas_model, device, keep_warm=keep_warm, resident=True), )
 
     def install_midas(self):
         global MIDAS_INSTALLED
@@ -8781,6 +10170,9 @@ class MiDaS_Depth_Approx:
             },
             "optional": {
                 "midas_model": ("MIDAS_MODEL",),
+                "batch_size": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1}),
+                "precision": (["fp32", "fp16"],),
+                "normalization": (["per_frame", "global"],),
             }
         }
 
@@ -8790,89 +10182,35 @@ class MiDaS_Depth_Approx:
 
     CATEGORY = "WAS Suite/Image/AI"
 
-    def midas_approx(self, image, use_cpu, midas_type, invert_depth, midas_model=None):
+    def midas_approx(self, image, use_cpu, midas_type, invert_depth, midas_model=None, batch_size=4, precision="fp32", normalization="per_frame"):
 
         global MIDAS_INSTALLED
 
         if not MIDAS_INSTALLED:
             self.install_midas()
 
-        import cv2 as cv
+        device = torch.device("cuda") if torch.cuda.is_available() and use_cpu == 'false' else torch.device("cpu")
+        cstr(f"MiDaS is using device: {device}").msg.print()
 
         if midas_model:
 
-            midas = midas_model[0]
+            midas = WAS_MODEL_CACHE.place(midas_model[0], device).eval()
             transform = midas_model[1]
-            device = torch.device("cuda") if torch.cuda.is_available() and use_cpu == 'false' else torch.device("cpu")
-            cstr(f"MiDaS is using device: {device}").msg.print()
-            midas.to(device).eval()
 
         else:
 
-            if midas_model == 'DPT_Large':
-                model_name = 'dpt_large_384.pt'
-            elif midas_model == 'DPT_Hybrid':
-                model_name = 'dpt_hybrid_384.pt'
-            else:
-                model_name = 'dpt_large_384.pt'
-
-            model_path = os.path.join(self.midas_dir, 'checkpoints'+os.sep+model_name)
-
-            torch.hub.set_dir(self.midas_dir)
-            if os.path.exists(model_path):
-                cstr(f"Loading MiDaS Model from `{model_path}`").msg.print()
-                midas_type = model_path
-            else:
-                cstr("Downloading and loading MiDaS Model...").msg.print()
-            midas = torch.hub.load("intel-isl/MiDaS", midas_type, trust_repo=True)
-
-            cstr(f"MiDaS is using device: {device}").msg.print()
+            midas, transform = load_midas(midas_type, device)
 
-            midas.to(device).eval()
-            midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-
-            transform = midas_transforms.dpt_transform
+        depths = midas_depth_batch(midas, transform, image, batch_size=batch_size, precision=precision, normalization=normalization)
 
         tensor_images = []
-        for i, img in enumerate(image):
-
-            img = np.array(tensor2pil(img))
-
-            img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
-            input_batch = transform(img).to(device)
-
-            cstr(f"Approximating depth for image {i+1}/{len(image)}").msg.print()
-
-            with torch.no_grad():
-                prediction = midas(input_batch)
-                prediction = torch.nn.functional.interpolate(
-                    prediction.unsqueeze(1),
-                    size=img.shape[:2],
-                    mode="bicubic",
-                    align_corners=False,
-                ).squeeze()
-
-
-            # Normalize and convert to uint8
-            min_val = torch.min(prediction)
-            max_val = torch.max(prediction)
-            prediction = (prediction - min_val) / (max_val - min_val)
-            prediction = (prediction * 255).clamp(0, 255).round().cpu().numpy().astype(np.uint8)
-
-            depth = Image.fromarray(prediction)
-
+        for depth in depths:
             # Invert depth map
             if invert_depth == 'true':
-                depth = ImageOps.invert(depth)
-
-            tensor_images.append(pil2tensor(depth.convert("RGB")))
-
-        tensor_images = torch.cat(tensor_images, dim=0)
-        if not midas_model:
-            del midas, device, midas_transforms
-        del midas, transform, img, input_batch, prediction
+                depth = 1.0 - depth
+            tensor_images.append(depth.clamp(0, 1).unsqueeze(-1).repeat(1, 1, 3))
 
-        return (tensor_images, )
+        return (torch.stack(tensor_images, dim=0), )
 
     def install_midas(self):
         global MIDAS_INSTALLED
@@ -8930,43 +10268,30 @@ class MiDaS_Background_Foreground_Removal:
         if not MIDAS_INSTALLED:
             self.install_midas()
 
-        import cv2 as cv
-
-        # Convert the input image tensor to a numpy and PIL Image
-        i = 255. * image.cpu().numpy().squeeze()
-        img = i
-        # Original image
-        img_original = tensor2pil(image).convert('RGB')
-
-        cstr("Downloading and loading MiDaS Model...").msg.print()
-        torch.hub.set_dir(self.midas_dir)
-        midas = torch.hub.load("intel-isl/MiDaS", midas_model, trust_repo=True)
         device = torch.device("cuda") if torch.cuda.is_available(
         ) and use_cpu == 'false' else torch.device("cpu")
 
         cstr(f"MiDaS is using device: {device}").msg.print()
 
-        midas.to(device).eval()
-        midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
+        midas, transform = load_midas(midas_model, device)
 
-        if midas_model == "DPT_Large" or midas_model == "DPT_Hybrid":
-            transform = midas_transforms.dpt_transform
-        else:
-            transform = midas_transforms.small_transform
+        predictions = midas_depth_batch(midas, transform, image, normalization="none")
 
-        img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
-        input_batch = transform(img).to(device)
+        results = []
+        depths = []
+        for frame, prediction in zip(image, predictions):
+            result_img, depth = self.remove_frame(frame, prediction, remove, threshold, threshold_low, threshold_mid, threshold_high,
+                                                  smoothing, background_red, background_green, background_blue)
+            results.append(pil2tensor(result_img))
+            depths.append(pil2tensor(depth.convert('RGB')))
 
-        cstr("Approximating depth from image.").msg.print()
+        return (torch.cat(results, dim=0), torch.cat(depths, dim=0))
 
-        with torch.no_grad():
-            prediction = midas(input_batch)
-            prediction = torch.nn.functional.interpolate(
-                prediction.unsqueeze(1),
-                size=img.shape[:2],
-                mode="bicubic",
-                align_corners=False,
-            ).squeeze()
+    def remove_frame(self, image, prediction, remove, threshold, threshold_low, threshold_mid, threshold_high,
+                     smoothing, background_red, background_green, background_blue):
+
+        # Original image
+        img_original = tensor2pil(image).convert('RGB')
 
         # Invert depth map
         if remove == 'foreground':
@@ -9004,10 +10329,7 @@ class MiDaS_Background_Foreground_Removal:
         # Composite final image
         result_img = Image.composite(img_original, background, depth)
 
-        del midas, device, midas_transforms
-        del transform, img, img_original, input_batch, prediction
-
-        return (pil2tensor(result_img), pil2tensor(depth.convert('RGB')))
+        return result_img, depth
 
     class AdjustLevels:
         def __init__(self, min_level, mid_level, max_level):
@@ -9191,6 +10513,7 @@ class WAS_KSampler_Cycle:
         steps_scaling = (steps_scaling == "enable")
         run_model = model
         secondary_switched = False
+        cycle_timings = []
 
         for i in range(division_factor):
 
@@ -9305,107 +10628,58 @@ class WAS_KSampler_Cycle:
             if i != 0:
                 latent_image = latent_image_result
 
-            samples = nodes.common_ksampler(
-                run_model,
-                seed,
-                steps,
-                cfg,
-                sampler_name,
-                scheduler,
-                positive,
-                negative,
-                latent_image,
-                denoise=denoise,
-            )
+            timings = {}
+            cycle_timings.append(timings)
+
+            with self.timed_stage(timings, "sample"):
+                samples = nodes.common_ksampler(
+                    run_model,
+                    seed,
+                    steps,
+                    cfg,
+                    sampler_name,
+                    scheduler,
+                    positive,
+                    negative,
+                    latent_image,
+                    denoise=denoise,
+                )
 
             # Upscale
             if i < division_factor - 1:
 
-                tensors = None
-                upscaler = None
-
-                resample_filters = {
-                    'nearest': 0,
-                    'bilinear': 2,
-                    'bicubic': 3,
-                    'lanczos': 1
-                }
-
                 if latent_upscale == 'disable':
 
-                    if tiled_vae:
-                        tensors = vae.decode_tiled(samples[0]['samples'])
-                    else:
-                        tensors = vae.decode(samples[0]['samples'])
-
-                    if processor_model or upscale_model:
-
-                        from comfy_extras import nodes_upscale_model
-                        upscaler = nodes_upscale_model.ImageUpscaleWithModel()
-
-                    if processor_model:
-
-                        original_size = tensor2pil(tensors[0]).size
-                        upscaled_tensors = upscaler.upscale(processor_model, tensors)
-                        tensor_images = []
-                        for tensor in upscaled_tensors[0]:
-                            pil = tensor2pil(tensor)
-                            if pil.size[0] != original_size[0] or pil.size[1] != original_size[1]:
-                                pil = pil.resize((original_size[0], original_size[1]), Image.Resampling(resample_filters[scale_sampling]))
-                            if sharpen_strength != 0.0:
-                                pil = self.unsharp_filter(pil, sharpen_radius, sharpen_strength)
-                            tensor_images.append(pil2tensor(pil))
-
-                        tensor_images = torch.cat(tensor_images, dim=0)
-
-                    if upscale_model:
-
-                        if processor_model:
-                            tensors = tensor_images
-                            del tensor_images
-
-                        original_size = tensor2pil(tensors[0]).size
-                        new_width = round(original_size[0] * current_upscale_factor)
-                        new_height = round(original_size[1] * current_upscale_factor)
-                        new_width = int(round(new_width / 32) * 32)
-                        new_height = int(round(new_height / 32) * 32)
-                        upscaled_tensors = upscaler.upscale(upscale_model, tensors)
-                        tensor_images = []
-                        for tensor in upscaled_tensors[0]:
-                            tensor = pil2tensor(tensor2pil(tensor).resize((new_width, new_height), Image.Resampling(resample_filters[scale_sampling])))
-                            size = max(tensor2pil(tensor).size)
-                            if sharpen_strength != 0.0:
-                                tensor = pil2tensor(self.unsharp_filter(tensor2pil(tensor), sharpen_radius, sharpen_strength))
-                            tensor_images.append(tensor)
-
-                        tensor_images = torch.cat(tensor_images, dim=0)
+                    with self.timed_stage(timings, "decode"):
+                        if tiled_vae:
+                            tensors = vae.decode_tiled(samples[0]['samples'])
+                        else:
+                            tensors = vae.decode(samples[0]['samples'])
 
-                    else:
+                    with self.timed_stage(timings, "upscale"):
+                        tensors = self.upscale_images(tensors, current_upscale_factor, scale_sampling, upscale_model,
+                                                      processor_model, sharpen_strength, sharpen_radius)
 
-                        tensor_images = []
-                        scale = WAS_Image_Rescale()
-                        for tensor in tensors:
-                            tensor = scale.image_rescale(tensor.unsqueeze(0), "rescale", "true", scale_sampling, current_upscale_factor, 0, 0)[0]
-                            size = max(tensor2pil(tensor).size)
-                            if sharpen_strength > 0.0:
-                                tensor = pil2tensor(self.unsharp_filter(tensor2pil(tensor), sharpen_radius, sharpen_strength))
-                            tensor_images.append(tensor)
-                        tensor_images = torch.cat(tensor_images, dim=0)
-
-                    if tiled_vae:
-                        latent_image_result = {"samples": vae.encode_tiled(self.vae_encode_crop_pixels(tensor_images)[:,:,:,:3])}
-                    else:
-                        latent_image_result = {"samples": vae.encode(self.vae_encode_crop_pixels(tensor_images)[:,:,:,:3])}
+                    with self.timed_stage(timings, "encode"):
+                        if tiled_vae:
+                            latent_image_result = {"samples": vae.encode_tiled(self.vae_encode_crop_pixels(tensors)[:,:,:,:3])}
+                        else:
+                            latent_image_result = {"samples": vae.encode(self.vae_encode_crop_pixels(tensors)[:,:,:,:3])}
+
+                    del tensors
 
                 else:
 
-                    upscaler = nodes.LatentUpscaleBy()
-                    latent_image_result = upscaler.upscale(samples[0], latent_upscale, current_upscale_factor)[0]
+                    with self.timed_stage(timings, "upscale"):
+                        upscaler = nodes.LatentUpscaleBy()
+                        latent_image_result = upscaler.upscale(samples[0], latent_upscale, current_upscale_factor)[0]
 
             else:
 
                 latent_image_result = samples[0]
 
+        self.report_timings(cycle_timings)
+
         return (latent_image_result, )
 
     @staticmethod
@@ -9418,16 +10692,102 @@ class WAS_KSampler_Cycle:
             pixels = pixels[:, x_offset:x + x_offset, y_offset:y + y_offset, :]
         return pixels
 
+    def upscale_images(self, tensors, upscale_factor, scale_sampling, upscale_model=None, processor_model=None, sharpen_strength=0.0, sharpen_radius=2):
+
+        # Everything between decode and encode stays a batched tensor on the torch device
+        device = comfy.model_management.get_torch_device()
+        tensors = tensors.to(device)
+        height, width = tensors.shape[1:3]
+
+        if processor_model or upscale_model:
+            from comfy_extras import nodes_upscale_model
+            upscaler = nodes_upscale_model.ImageUpscaleWithModel()
+
+        if processor_model:
+            tensors = upscaler.upscale(processor_model, tensors)[0].to(device)
+            tensors = self.resize_images(tensors, width, height, scale_sampling)
+            if sharpen_strength != 0.0:
+                tensors = self.unsharp_images(tensors, sharpen_radius, sharpen_strength)
+
+        if upscale_model:
+            new_width = int(round(round(width * upscale_factor) / 32) * 32)
+            new_height = int(round(round(height * upscale_factor) / 32) * 32)
+            tensors = upscaler.upscale(upscale_model, tensors)[0].to(device)
+            tensors = self.resize_images(tensors, new_width, new_height, scale_sampling)
+            if sharpen_strength != 0.0:
+                tensors = self.unsharp_images(tensors, sharpen_radius, sharpen_strength)
+        else:
+            tensors = self.resize_images(tensors, int(width * upscale_factor), int(height * upscale_factor), scale_sampling)
+            # The plain rescale path only ever sharpened, it ignores negative strengths
+            if sharpen_strength > 0.0:
+                tensors = self.unsharp_images(tensors, sharpen_radius, sharpen_strength)
+
+        return tensors
+
     @staticmethod
-    def unsharp_filter(image, radius=2, amount=1.0):
-        from skimage.filters import unsharp_mask
-        img_array = np.array(image)
-        img_array = img_array / 255.0
-        sharpened = unsharp_mask(img_array, radius=radius, amount=amount, channel_axis=2)
-        sharpened = (sharpened * 255.0).astype(np.uint8)
-        sharpened_pil = Image.fromarray(sharpened)
+    def resize_images(images, width, height, sampling='bicubic'):
+
+        import torch.nn.functional as F
+
+        if images.shape[1] == height and images.shape[2] == width:
+            return images
+
+        pixels = images.permute(0, 3, 1, 2)
+        if sampling == 'nearest':
+            pixels = F.interpolate(pixels, size=(height, width), mode='nearest')
+        else:
+            # Antialiased bicubic stands in for lanczos, torch has no lanczos kernel
+            mode = 'bilinear' if sampling == 'bilinear' else 'bicubic'
+            pixels = F.interpolate(pixels, size=(height, width), mode=mode, align_corners=False, antialias=True)
+
+        return torch.clamp(pixels.permute(0, 2, 3, 1), 0, 1)
+
+    @staticmethod
+    def unsharp_images(images, radius=2, amount=1.0):
+
+        import torch.nn.functional as F
+
+        # Same filter as skimage's unsharp_mask: gaussian truncated at 4 sigma with edge replication
+        sigma = float(radius)
+        size = int(4.0 * sigma + 0.5)
+        x = torch.arange(-size, size + 1, device=images.device, dtype=images.dtype)
+        kernel = torch.exp(-(x ** 2) / (2 * sigma ** 2))
+        kernel = kernel / kernel.sum()
+
+        pixels = images.permute(0, 3, 1, 2)
+        channels = pixels.shape[1]
+        blurred = F.pad(pixels, (size, size, 0, 0), mode='replicate')
+        blurred = F.conv2d(blurred, kernel.view(1, 1, 1, -1).repeat(channels, 1, 1, 1), groups=channels)
+        blurred = F.pad(blurred, (0, 0, size, size), mode='replicate')
+        blurred = F.conv2d(blurred, kernel.view(1, 1, -1, 1).repeat(channels, 1, 1, 1), groups=channels)
+        sharpened = pixels + amount * (pixels - blurred)
+
+        return torch.clamp(sharpened.permute(0, 2, 3, 1), 0, 1)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timed_stage(timings, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Kernels run asynchronously, wait for them so the time lands on the stage that queued them
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start)
 
-        return sharpened_pil
+    @staticmethod
+    def report_timings(cycle_timings):
+        stages = ("sample", "decode", "upscale", "encode")
+        totals = {stage: 0.0 for stage in stages}
+        cstr("KSampler Cycle timings:").msg.print()
+        for i, timings in enumerate(cycle_timings):
+            for stage in stages:
+                totals[stage] += timings.get(stage, 0.0)
+            breakdown = ", ".join(f"{stage} {timings[stage]:.2f}s" for stage in stages if stage in timings)
+            print(f"    Cycle {i+1}: {breakdown} (total {sum(timings.values()):.2f}s)")
+        breakdown = ", ".join(f"{stage} {totals[stage]:.2f}s" for stage in stages)
+        print(f"    All cycles: {breakdown} (total {sum(totals.values()):.2f}s)")
 
 
 # Latent Blend
@@ -10696,25 +12056,13 @@ class WAS_Text_Save:
 
 class WAS_Text_File_History:
     def __init__(self):
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
-        self.conf = getSuiteConfig()
+        pass
 
     @classmethod
     def INPUT_TYPES(cls):
-        HDB = WASDatabase(WAS_HISTORY_DATABASE)
-        conf = getSuiteConfig()
-        paths = ['No History',]
-        if HDB.catExists("History") and HDB.keyExists("History", "TextFiles"):
-            history_paths = HDB.get("History", "TextFiles")
-            if conf.__contains__('history_display_limit'):
-                history_paths = history_paths[-conf['history_display_limit']:]
-                paths = []
-            for path_ in history_paths:
-                paths.append(os.path.join('...'+os.sep+os.path.basename(os.path.dirname(path_)), os.path.basename(path_)))
-
         return {
             "required": {
-                "file": (paths,),
+                "file": (history_choices("TextFiles"),),
                 "dictionary_name": ("STRING", {"default": '[filename]', "multiline": True}),
             },
         }
@@ -10725,7 +12073,7 @@ class WAS_Text_File_History:
     CATEGORY = "WAS Suite/History"
 
     def text_file_history(self, file=None, dictionary_name='[filename]]'):
-        file_path = file.strip()
+        file_path = WAS_HISTORY.resolve("TextFiles", file) or file.strip()
         filename = ( os.path.basename(file_path).split('.', 1)[0]
             if '.' in os.path.basename(file_path) else os.path.basename(file_path) )
         if dictionary_name != '[filename]' or dictionary_name not in [' ', '']:
@@ -11007,11 +12355,134 @@ class WAS_Text_Load_From_File:
 
         return ("\n".join(lines), dictionary)
 
+# Text Line Index
+#
+# Line start offsets for a text file, built in one streaming pass and saved as a
+# `<file>.lineidx` sidecar (or under the suite cache when the file's folder is read only).
+# The sidecar is keyed by the file's size and mtime and reused until the file changes, so
+# fetching a line is a seek into a memory map instead of reading the whole file.
+
+class TextLineIndex:
+    MAGIC = b"WASLIDX1"
+    HEADER = struct.Struct("<8sqqq")
+    CHUNK_SIZE = 64 * 1024 * 1024
+
+    indexes = {}
+    lock = threading.Lock()
+
+    def __init__(self, path, key, offsets):
+        self.path = path
+        self.key = key
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def open(cls, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with cls.lock:
+            index = cls.indexes.get(path)
+            if index is None or index.key != key:
+                index = cls.load_sidecar(path, key)
+                if index is None:
+                    index = cls.build(path, key)
+                cls.indexes[path] = index
+            return index
+
+    @staticmethod
+    def sidecar_paths(path):
+        return [
+            f"{path}.lineidx",
+            os.path.join(WAS_SUITE_ROOT, 'cache', 'line_index', f"{hashlib.sha1(path.encode('utf-8')).hexdigest()}.lineidx"),
+        ]
+
+    @classmethod
+    def load_sidecar(cls, path, key):
+        for sidecar in cls.sidecar_paths(path):
+            try:
+                with open(sidecar, 'rb') as f:
+                    magic, size, mtime_ns, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            except (OSError, struct.error):
+                continue
+            if magic == cls.MAGIC and (size, mtime_ns) == key:
+                offsets = np.memmap(sidecar, dtype='<i8', mode='r', offset=cls.HEADER.size, shape=(count + 1,))
+                return cls(path, key, offsets)
+        return None
+
+    @classmethod
+    def build(cls, path, key):
+        size = key[0]
+        starts = [np.zeros(1, dtype=np.int64)]
+        with open(path, 'rb') as f:
+            position = 0
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    break
+                starts.append(np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10).astype(np.int64) + position + 1)
+                position += len(chunk)
+        offsets = np.concatenate(starts)
+        # A trailing newline ends the last line rather than starting an empty one
+        if offsets[-1] >= size:
+            offsets = offsets[:-1]
+        offsets = np.append(offsets, np.int64(size)).astype('<i8')
+
+        for sidecar in cls.sidecar_paths(path):
+            try:
+                os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+                with open(f"{sidecar}.tmp", 'wb') as f:
+                    f.write(cls.HEADER.pack(cls.MAGIC, key[0], key[1], len(offsets) - 1))
+                    f.write(offsets.tobytes())
+                os.replace(f"{sidecar}.tmp", sidecar)
+                break
+            except OSError:
+                continue
+        return cls(path, key, offsets)
+
+    def line(self, index):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data[int(self.offsets[index]):int(self.offsets[index + 1])].decode('utf-8', errors='replace').strip()
+
+    def lines(self):
+        return TextLines(self)
+
+# Read-only list of a file's lines that only reads the lines asked for, so the
+# `dictionary` output does not hold a whole corpus in memory
+class TextLines(collections.abc.Sequence):
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("line index out of range")
+        return self.index.line(item)
+
+    def __iter__(self):
+        if not len(self):
+            return
+        offsets = self.index.offsets
+        with open(self.index.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for i in range(len(self)):
+                yield data[int(offsets[i]):int(offsets[i + 1])].decode('utf-8', errors='replace').strip()
+
+    def __repr__(self):
+        return repr(list(self))
+
 # TEXT LOAD FROM FILE
 
 class WAS_Text_Load_Line_From_File:
     def __init__(self):
-        self.HDB = WASDatabase(WAS_HISTORY_DATABASE)
+        self.HDB = WASDatabase.shared(WAS_HISTORY_DATABASE)
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -11033,11 +12504,10 @@ class WAS_Text_Load_Line_From_File:
         if kwargs['mode'] != 'index':
             return float("NaN")
         else:
-            m = hashlib.sha256()
             if os.path.exists(kwargs['file_path']):
-                with open(kwargs['file_path'], 'rb') as f:
-                    m.update(f.read())
-                return m.digest().hex()
+                # Stat metadata instead of hashing the whole file on every queue
+                stat = os.stat(kwargs['file_path'])
+                return f"{kwargs['file_path']}:{stat.st_size}:{stat.st_mtime_ns}"
             else:
                 return False
 
@@ -11074,7 +12544,9 @@ class WAS_Text_Load_Line_From_File:
 
         file_list = self.TextFileLoader(file_path, label)
         line, lines = None, []
-        if mode == 'automatic':
+        if not len(file_list.lines):
+            pass
+        elif mode == 'automatic':
             line, lines = file_list.get_next_line()
         elif mode == 'index':
             if index >= len(file_list.lines):
@@ -11106,8 +12578,7 @@ class WAS_Text_Load_Line_From_File:
                 self.WDB.insert('TextBatch Paths', self.label, file_path)
             else:
                 self.index = stored_index
-            with open(file_path, 'r', encoding="utf-8", newline='\n') as file:
-                self.lines = [line.strip() for line in file]
+            self.lines = TextLineIndex.open(file_path).lines()
 
         def get_line_index(self):
             return self.index
@@ -11263,6 +12734,10 @@ class WAS_BLIP_Model_Loader:
                 "blip_model": ("STRING", {"default": "Salesforce/blip-image-captioning-base"}),
                 "vqa_model_id": ("STRING", {"default": "Salesforce/blip-vqa-base"}),
                 "device": (["cuda", "cpu"],),
+            },
+            "optional": {
+                "precision": (["fp32", "fp16"],),
+                "keep_warm": ("BOOLEAN", {"default": False}),
             }
         }
 
@@ -11271,7 +12746,7 @@ class WAS_BLIP_Model_Loader:
 
     CATEGORY = "WAS Suite/Loaders"
 
-    def blip_model(self, blip_model, vqa_model_id, device):
+    def blip_model(self, blip_model, vqa_model_id, device, precision="fp32", keep_warm=False):
 
         blip_dir = os.path.join(comfy_paths.models_dir, "blip")
 
@@ -11279,7 +12754,17 @@ class WAS_BLIP_Model_Loader:
         if blip_model in ("caption", "interrogate"):
             blip_model = "Salesforce/blip-image-captioning-base"
 
-        blip_model = BlipWrapper(caption_model_id=blip_model, vqa_model_id=vqa_model_id, device=device, cache_dir=blip_dir)
+        device = torch.device('cuda' if device == "cuda" and torch.cuda.is_available() else 'cpu')
+
+        dtype = torch.float32
+        if precision == "fp16":
+            if device.type == "cuda":
+                dtype = torch.float16
+            else:
+                cstr("BLIP half precision requires a CUDA device, using fp32.").warning.print()
+
+        loader = lambda device: BlipWrapper(caption_model_id=blip_model, vqa_model_id=vqa_model_id, device=device.type, cache_dir=blip_dir, dtype=dtype)
+        blip_model = WAS_MODEL_CACHE.load(("blip", blip_model, vqa_model_id), loader, device, dtype=dtype, keep_warm=keep_warm)
 
         return ( blip_model, )
 
@@ -11304,7 +12789,9 @@ class WAS_BLIP_Analyze_Image:
                 "max_length": ("INT", {"min": 2, "max": 1024, "default": 64}),
                 "num_beams": ("INT", {"min": 1, "max": 12, "default": 5}),
                 "no_repeat_ngram_size": ("INT", {"min": 1, "max": 12, "default": 3}),
-                "early_stopping": ("BOOLEAN", {"default": False})
+                "early_stopping": ("BOOLEAN", {"default": False}),
+                "batch_size": ("INT", {"min": 1, "max": 256, "default": 8}),
+                "use_cache": ("BOOLEAN", {"default": False}),
             }
         }
 
@@ -11314,27 +12801,137 @@ class WAS_BLIP_Analyze_Image:
     FUNCTION = "blip_caption_image"
     CATEGORY = "WAS Suite/Text/AI"
 
-    def blip_caption_image(self, images, mode, question, blip_model, min_length=24, max_length=64, num_beams=5, no_repeat_ngram_size=3, early_stopping=False):
+    def blip_caption_image(self, images, mode, question, blip_model, min_length=24, max_length=64, num_beams=5, no_repeat_ngram_size=3, early_stopping=False, batch_size=8, use_cache=False):
+
+        generate_kwargs = {
+            "min_length": min_length,
+            "max_length": max_length,
+            "num_beams": num_beams,
+            "no_repeat_ngram_size": no_repeat_ngram_size,
+            "early_stopping": early_stopping,
+        }
 
-        captions = []
+        # Cached results are keyed by image content plus everything that changes the generated text
+        params = json.dumps({
+            **generate_kwargs,
+            "mode": mode,
+            "question": question if mode != "caption" else None,
+            "models": list(getattr(blip_model, "model_ids", ())),
+            "dtype": str(getattr(blip_model, "dtype", torch.float32)),
+        }, sort_keys=True)
+        keys = []
         for image in images:
-            pil_image = tensor2pil(image).convert("RGB")
+            pixels = (image * 255).round().clamp(0, 255).to(torch.uint8).cpu().numpy()
+            keys.append(hashlib.sha256(pixels.tobytes() + str(pixels.shape).encode() + params.encode()).hexdigest())
+
+        caption_db = WASDatabase.shared(WAS_BLIP_CAPTION_DATABASE) if use_cache else None
+        results = {}
+        if caption_db:
+            for key in set(keys):
+                cached = caption_db.get("Captions", key)
+                if cached is not None:
+                    results[key] = cached
+
+        # Identical frames are only run once
+        pending = {}
+        for i, key in enumerate(keys):
+            if key not in results and key not in pending:
+                pending[key] = i
+        pending_keys = list(pending.keys())
+
+        for start in range(0, len(pending_keys), batch_size):
+            chunk = pending_keys[start:start + batch_size]
+            batch = images[[pending[key] for key in chunk]]
+            if mode == "caption":
+                outputs = blip_model.generate_captions(batch, **generate_kwargs)
+            else:
+                outputs = blip_model.answer_questions(batch, question, **generate_kwargs)
+            results.update(zip(chunk, outputs))
+
+        if caption_db and pending_keys:
+            if not caption_db.catExists("Captions"):
+                caption_db.insertCat("Captions")
+            caption_db.updateCat("Captions", {key: results[key] for key in pending_keys})
+
+        captions = [results[key] for key in keys]
+        for cap in captions:
             if mode == "caption":
-                cap = blip_model.generate_caption(image=pil_image, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
-                captions.append(cap)
                 cstr(f"\033[33mBLIP Caption:\033[0m {cap}").msg.print()
             else:
-                cap = blip_model.answer_question(image=pil_image, question=question, min_length=min_length, max_length=max_length, num_beams=num_beams, no_repeat_ngram_size=no_repeat_ngram_size, early_stopping=early_stopping)
-                captions.append(cap)
                 cstr(f"\033[33m BLIP Answer:\033[0m {cap}").msg.print()
 
-            full_captions = ""
-            for i, caption in enumerate(captions):
-                full_captions += caption + ("\n\n" if i < len(captions) else "")
+        full_captions = "".join(caption + "\n\n" for caption in captions)
 
         return (full_captions, captions)
 
 
+# CLIPSeg Model Cache
+
+def load_clipseg(model_id, device, keep_warm=False, resident=False):
+    def loader(device):
+        from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
+        cache = os.path.join(MODELS_DIR, 'clipseg')
+        processor = CLIPSegProcessor.from_pretrained(model_id, cache_dir=cache)
+        model = CLIPSegForImageSegmentation.from_pretrained(model_id, cache_dir=cache).to(device).eval()
+        return (processor, model)
+    return WAS_MODEL_CACHE.load(("clipseg", model_id), loader, device, keep_warm=keep_warm, resident=resident)
+
+# CLIPSeg Segmentation Engine
+#
+# The vision tower runs once per image and the text tower once per prompt. Only the light
+# decoder runs per image/prompt pair, in micro-batches. `pairs` lists (image index, prompt
+# index) tuples and defaults to every image with every prompt. Returns (N, H, W) masks at
+# the input resolution, normalized per mask the same way the PIL path did.
+
+def clipseg_segment(clipseg_model, images, prompts, pairs=None, batch_size=16):
+    import torch.nn.functional as F
+
+    processor, model = clipseg_model
+    parameter = next(model.parameters())
+    device, dtype = parameter.device, parameter.dtype
+
+    image_processor = processor.image_processor
+    size = image_processor.size
+    size = (size["height"], size["width"]) if isinstance(size, dict) else (size, size)
+    height, width = images.shape[1:3]
+
+    if pairs is None:
+        pairs = [(i, p) for i in range(images.shape[0]) for p in range(len(prompts))]
+
+    with torch.no_grad():
+        pixels = images[..., :3].permute(0, 3, 1, 2).to(device, torch.float32)
+        if pixels.shape[1] == 1:
+            pixels = pixels.repeat(1, 3, 1, 1)
+        pixels = F.interpolate(pixels, size=size, mode="bilinear", align_corners=False, antialias=True)
+        mean = torch.tensor(image_processor.image_mean, device=device).view(1, -1, 1, 1)
+        std = torch.tensor(image_processor.image_std, device=device).view(1, -1, 1, 1)
+        pixel_values = ((pixels - mean) / std).to(dtype)
+
+        vision_outputs = model.clip.vision_model(pixel_values=pixel_values, output_hidden_states=True)
+        activations = [vision_outputs.hidden_states[i + 1] for i in model.extract_layers]
+
+        text = processor.tokenizer(prompts, padding=True, return_tensors="pt").to(device)
+        conditionals = model.get_conditional_embeddings(batch_size=len(prompts), input_ids=text.input_ids, attention_mask=text.attention_mask)
+
+        masks = []
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            image_index = torch.tensor([pair[0] for pair in chunk], device=device)
+            prompt_index = torch.tensor([pair[1] for pair in chunk], device=device)
+
+            logits = model.decoder(tuple(activation[image_index] for activation in activations), conditionals[prompt_index])[0]
+            if logits.dim() == 2:
+                logits = logits.unsqueeze(0)
+
+            tensor = torch.sigmoid(logits.float())
+            minimum = tensor.flatten(1).min(dim=1).values.view(-1, 1, 1)
+            maximum = tensor.flatten(1).max(dim=1).values.view(-1, 1, 1)
+            mask = ((tensor - minimum) / maximum).clamp(0, 1)
+            mask = F.interpolate(mask.unsqueeze(1), size=(height, width), mode="bicubic", align_corners=False).squeeze(1).clamp(0, 1)
+            masks.append(mask.cpu())
+
+    return torch.cat(masks, dim=0)
+
 # CLIPSeg Model Loader
 
 class WAS_CLIPSeg_Model_Loader:
@@ -11347,6 +12944,9 @@ class WAS_CLIPSeg_Model_Loader:
             "required": {
                 "model": ("STRING", {"default": "CIDAS/clipseg-rd64-refined", "multiline": False}),
             },
+            "optional": {
+                "keep_warm": ("BOOLEAN", {"default": False}),
+            }
         }
 
     RETURN_TYPES = ("CLIPSEG_MODEL",)
@@ -11355,15 +12955,8 @@ class WAS_CLIPSeg_Model_Loader:
 
     CATEGORY = "WAS Suite/Loaders"
 
-    def clipseg_model(self, model):
-        from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
-
-        cache = os.path.join(MODELS_DIR, 'clipseg')
-
-        inputs = CLIPSegProcessor.from_pretrained(model, cache_dir=cache)
-        model = CLIPSegForImageSegmentation.from_pretrained(model, cache_dir=cache)
-
-        return ( (inputs, model), )
+    def clipseg_model(self, model, keep_warm=False):
+        return ( load_clipseg(model, torch.device("cpu"), keep_warm=keep_warm, resident=True), )
 
 # CLIPSeg Node
 
@@ -11390,28 +12983,17 @@ class WAS_CLIPSeg:
     CATEGORY = "WAS Suite/Image/Masking"
 
     def CLIPSeg_image(self, image, text=None, clipseg_model=None):
-        from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
 
-        image = tensor2pil(image)
-        cache = os.path.join(MODELS_DIR, 'clipseg')
+        device = WAS_MODEL_CACHE.default_device()
 
         if clipseg_model:
-            inputs = clipseg_model[0]
-            model = clipseg_model[1]
+            clipseg_model = (clipseg_model[0], WAS_MODEL_CACHE.place(clipseg_model[1], device))
         else:
-            inputs = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined", cache_dir=cache)
-            model = CLIPSegForImageSegmentation.from_pretrained("CIDAS/clipseg-rd64-refined", cache_dir=cache)
-
-        with torch.no_grad():
-            result = model(**inputs(text=text, images=image, padding=True, return_tensors="pt"))
+            clipseg_model = load_clipseg("CIDAS/clipseg-rd64-refined", device)
 
-        tensor = torch.sigmoid(result[0])
-        mask = 1. - (tensor - tensor.min()) / tensor.max()
-        mask = mask.unsqueeze(0)
-        mask = tensor2pil(mask).convert("L")
-        mask = mask.resize(image.size)
+        masks = clipseg_segment(clipseg_model, image, [text or ""])
 
-        return (pil2mask(mask), pil2tensor(ImageOps.invert(mask.convert("RGB"))))
+        return (masks, masks.unsqueeze(-1).repeat(1, 1, 1, 3))
 
 # CLIPSeg Node
 
@@ -11448,34 +13030,15 @@ class WAS_CLIPSeg_Batch:
 
     def CLIPSeg_images(self, image_a, image_b, text_a, text_b, image_c=None, image_d=None,
                        image_e=None, image_f=None, text_c=None, text_d=None, text_e=None, text_f=None):
-        from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
-        import torch.nn.functional as F
-
-        images_pil = [tensor2pil(image_a), tensor2pil(image_b)]
-
-        if image_c is not None:
-            if image_c.shape[-2:] != image_a.shape[-2:]:
-                cstr("Size of image_c is different from image_a.").error.print()
-                return
-            images_pil.append(tensor2pil(image_c))
-        if image_d is not None:
-            if image_d.shape[-2:] != image_a.shape[-2:]:
-                cstr("Size of image_d is different from image_a.").error.print()
-                return
-            images_pil.append(tensor2pil(image_d))
-        if image_e is not None:
-            if image_e.shape[-2:] != image_a.shape[-2:]:
-                cstr("Size of image_e is different from image_a.").error.print()
-                return
-            images_pil.append(tensor2pil(image_e))
-        if image_f is not None:
-            if image_f.shape[-2:] != image_a.shape[-2:]:
-                cstr("Size of image_f is different from image_a.").error.print()
-                return
-            images_pil.append(tensor2pil(image_f))
 
-        images_tensor = [torch.from_numpy(np.array(img.convert("RGB")).astype(np.float32) / 255.0).unsqueeze(0) for img in images_pil]
-        images_tensor = torch.cat(images_tensor, dim=0)
+        images = [image_a[:1], image_b[:1]]
+        for name, image in (("image_c", image_c), ("image_d", image_d), ("image_e", image_e), ("image_f", image_f)):
+            if image is not None:
+                if image.shape[1:3] != image_a.shape[1:3]:
+                    cstr(f"Size of {name} is different from image_a.").error.print()
+                    return
+                images.append(image[:1])
+        images_tensor = torch.cat(images, dim=0)
 
         prompts = [text_a, text_b]
         if text_c:
@@ -11487,33 +13050,62 @@ class WAS_CLIPSeg_Batch:
         if text_f:
             prompts.append(text_f)
 
-        cache = os.path.join(MODELS_DIR, 'clipseg')
+        # Each image is segmented with the prompt in the same position, so the batches line up
+        if len(prompts) != len(images):
+            raise ValueError(f"CLIPSeg Batch Masking got {len(images)} images but {len(prompts)} prompts, every connected image needs a text prompt and vice versa")
 
-        inputs = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined", cache_dir=cache)
-        model = CLIPSegForImageSegmentation.from_pretrained("CIDAS/clipseg-rd64-refined", cache_dir=cache)
+        device = WAS_MODEL_CACHE.default_device()
+        clipseg_model = load_clipseg("CIDAS/clipseg-rd64-refined", device)
+        pairs = [(i, i) for i in range(len(images))]
+        masks = clipseg_segment(clipseg_model, images_tensor, prompts, pairs=pairs)
 
-        with torch.no_grad():
-            result = model(**inputs(text=prompts, images=images_pil, padding=True, return_tensors="pt"))
+        masks_tensor = masks.unsqueeze(1)
+        mask_images_tensor = masks.unsqueeze(-1).repeat(1, 1, 1, 3)
 
-        masks = []
-        mask_images = []
-        for i, res in enumerate(result.logits):
-            tensor = torch.sigmoid(res)
-            mask = 1. - (tensor - tensor.min()) / tensor.max()
-            mask = mask.unsqueeze(0)
-            mask = tensor2pil(mask).convert("L")
-            mask = mask.resize(images_pil[0].size)
-            mask_batch = pil2mask(mask)
+        return (images_tensor, masks_tensor, mask_images_tensor)
+
+# CLIPSeg Prompt Batch Node
+
+class WAS_CLIPSeg_Prompts:
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "prompts": ("STRING", {"default": "", "multiline": True}),
+            },
+            "optional": {
+                "clipseg_model": ("CLIPSEG_MODEL",),
+                "batch_size": ("INT", {"default": 16, "min": 1, "max": 256, "step": 1}),
+            }
+        }
+
+    RETURN_TYPES = ("MASK", "IMAGE", "IMAGE")
+    RETURN_NAMES = ("MASKS", "MASK_IMAGES", "IMAGES")
+    FUNCTION = "CLIPSeg_prompts"
 
-            masks.append(mask_batch.unsqueeze(0).unsqueeze(1))
-            mask_images.append(pil2tensor(ImageOps.invert(mask.convert("RGB"))).squeeze(0))
+    CATEGORY = "WAS Suite/Image/Masking"
 
-        masks_tensor = torch.cat(masks, dim=0)
-        mask_images_tensor = torch.stack(mask_images, dim=0)
+    # One prompt per line. Outputs are ordered by image, then prompt, and IMAGES repeats
+    # each input frame once per prompt so it lines up with the masks.
+    def CLIPSeg_prompts(self, images, prompts, clipseg_model=None, batch_size=16):
 
-        del inputs, model, result, tensor, masks, mask_images, images_pil
+        prompts = [prompt.strip() for prompt in prompts.splitlines() if prompt.strip()]
+        if not prompts:
+            prompts = [""]
 
-        return (images_tensor, masks_tensor, mask_images_tensor)
+        device = WAS_MODEL_CACHE.default_device()
+        if clipseg_model:
+            clipseg_model = (clipseg_model[0], WAS_MODEL_CACHE.place(clipseg_model[1], device))
+        else:
+            clipseg_model = load_clipseg("CIDAS/clipseg-rd64-refined", device)
+
+        masks = clipseg_segment(clipseg_model, images, prompts, batch_size=batch_size)
+
+        return (masks, masks.unsqueeze(-1).repeat(1, 1, 1, 3), images.repeat_interleave(len(prompts), dim=0))
 
 
 # SAM MODEL LOADER
@@ -11527,6 +13119,9 @@ class WAS_SAM_Model_Loader:
         return {
             "required": {
                 "model_size": (["ViT-H", "ViT-L", "ViT-B"], ),
+            },
+            "optional": {
+                "keep_warm": ("BOOLEAN", {"default": False}),
             }
         }
 
@@ -11535,7 +13130,7 @@ class WAS_SAM_Model_Loader:
 
     CATEGORY = "WAS Suite/Image/Masking"
 
-    def sam_load_model(self, model_size):
+    def sam_load_model(self, model_size, keep_warm=False):
         conf = getSuiteConfig()
 
         model_filename_mapping = {
@@ -11570,20 +13165,22 @@ class WAS_SAM_Model_Loader:
         sam_file = os.path.join(sam_dir, model_filename)
         if not os.path.exists(sam_file):
             cstr("Selected SAM model not found. Downloading...").msg.print()
-            r = requests.get(model_url, allow_redirects=True)
-            open(sam_file, 'wb').write(r.content)
+            if not download_file(model_url, model_filename, sam_dir):
+                raise RuntimeError(f"Unable to download SAM model from `{model_url}`.")
 
         from segment_anything import build_sam_vit_h, build_sam_vit_l, build_sam_vit_b
 
         if model_size == 'ViT-H':
-            sam_model = build_sam_vit_h(sam_file)
+            build_sam = build_sam_vit_h
         elif model_size == 'ViT-L':
-            sam_model = build_sam_vit_l(sam_file)
+            build_sam = build_sam_vit_l
         elif model_size == 'ViT-B':
-            sam_model = build_sam_vit_b(sam_file)
+            build_sam = build_sam_vit_b
         else:
             raise ValueError(f"SAM model does not match the model_size: '{model_size}'.")
 
+        sam_model = WAS_MODEL_CACHE.load(("sam", model_size, sam_file), lambda device: build_sam(sam_file), torch.device("cpu"), keep_warm=keep_warm, resident=True)
+
         return (sam_model, )
 
 
@@ -11650,8 +13247,40 @@ class WAS_SAM_Combine_Parameters:
         return (parameters,)
 
 
+# SAM PARAMETERS BATCH
+class WAS_SAM_Parameters_Batch:
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(self):
+        return {
+            "required": {
+                "sam_parameters_a": ("SAM_PARAMETERS",),
+                "sam_parameters_b": ("SAM_PARAMETERS",),
+            }
+        }
+
+    RETURN_TYPES = ("SAM_PARAMETERS",)
+    FUNCTION = "sam_batch_parameters"
+
+    CATEGORY = "WAS Suite/Image/Masking"
+
+    # Unlike Combine, the prompt sets stay separate and each yields its own mask
+    def sam_batch_parameters(self, sam_parameters_a, sam_parameters_b):
+        prompt_sets = []
+        for parameters in (sam_parameters_a, sam_parameters_b):
+            prompt_sets.extend(parameters if isinstance(parameters, (list, tuple)) else [parameters])
+        return (prompt_sets,)
+
+
 # SAM IMAGE MASK
 class WAS_SAM_Image_Mask:
+    # Image encoder outputs keyed by (model token, image content hash), least recently used first.
+    # They are kept on the CPU so they hold no VRAM outside the model cache budget.
+    embedding_cache = {}
+    embedding_cache_size = 32
+
     def __init__(self):
         pass
 
@@ -11670,38 +13299,79 @@ class WAS_SAM_Image_Mask:
 
     CATEGORY = "WAS Suite/Image/Masking"
 
+    # Every frame of the batch is masked with every prompt set; outputs are ordered by frame,
+    # then prompt set. The encoder runs at most once per distinct frame.
     def sam_image_mask(self, sam_model, sam_parameters, image):
-        image = tensor2sam(image)
-        points = sam_parameters["points"]
-        labels = sam_parameters["labels"]
-
         from segment_anything import SamPredictor
 
+        # The model stays resident on the device between prompts; the shared model cache
+        # offloads it when the VRAM budget is needed elsewhere
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        sam_model.to(device=device)
+        WAS_MODEL_CACHE.place(sam_model, device)
 
         predictor = SamPredictor(sam_model)
-        predictor.set_image(image)
-
-        masks, scores, logits = predictor.predict(
-            point_coords=points,
-            point_labels=labels,
-            multimask_output=False
-        )
+        point_coords, point_labels = self.stack_prompts(sam_parameters)
 
-        sam_model.to(device='cpu')
+        masks = []
+        for frame in image:
+            self.set_image(predictor, sam_model, tensor2sam(frame))
 
-        mask = np.expand_dims(masks, axis=-1)
+            coords = predictor.transform.apply_coords(point_coords, predictor.original_size)
+            coords = torch.as_tensor(coords, dtype=torch.float, device=predictor.device)
+            labels = torch.as_tensor(point_labels, dtype=torch.int, device=predictor.device)
 
-        image = np.repeat(mask, 3, axis=-1)
-        image = torch.from_numpy(image)
+            with torch.no_grad():
+                frame_masks, scores, logits = predictor.predict_torch(
+                    point_coords=coords,
+                    point_labels=labels,
+                    multimask_output=False
+                )
+            masks.append(frame_masks[:, 0].to(torch.float32).cpu())
 
-        mask = torch.from_numpy(mask)
-        mask = mask.squeeze(2)
-        mask = mask.squeeze().to(torch.float32)
+        mask = torch.cat(masks, dim=0)
+        image = mask.unsqueeze(-1).repeat(1, 1, 1, 3)
 
         return (image, mask, )
 
+    # Stack prompt sets into (sets, points, 2) coordinates and (sets, points) labels. Shorter
+    # sets are padded with label -1, which SAM treats as "not a point".
+    @staticmethod
+    def stack_prompts(sam_parameters):
+        prompt_sets = sam_parameters if isinstance(sam_parameters, (list, tuple)) else [sam_parameters]
+        count = max(len(parameters["labels"]) for parameters in prompt_sets)
+        point_coords = np.zeros((len(prompt_sets), count, 2), dtype=np.float32)
+        point_labels = np.full((len(prompt_sets), count), -1, dtype=np.int32)
+        for i, parameters in enumerate(prompt_sets):
+            points = np.asarray(parameters["points"], dtype=np.float32).reshape(-1, 2)
+            labels = np.asarray(parameters["labels"]).reshape(-1)
+            point_coords[i, :len(points)] = points
+            point_labels[i, :len(labels)] = labels
+        return point_coords, point_labels
+
+    @classmethod
+    def set_image(cls, predictor, sam_model, image):
+        if "was_embedding_token" not in sam_model.__dict__:
+            sam_model.__dict__["was_embedding_token"] = os.urandom(8).hex()
+        key = (sam_model.__dict__["was_embedding_token"], hashlib.sha256(image.tobytes() + str(image.shape).encode()).hexdigest())
+
+        cached = cls.embedding_cache.pop(key, None)
+        if cached is None:
+            predictor.set_image(image)
+            cached = {
+                "features": predictor.get_image_embedding().detach().cpu(),
+                "original_size": predictor.original_size,
+                "input_size": predictor.input_size,
+            }
+            while len(cls.embedding_cache) >= cls.embedding_cache_size:
+                del cls.embedding_cache[next(iter(cls.embedding_cache))]
+        else:
+            predictor.reset_image()
+            predictor.features = cached["features"].to(predictor.device)
+            predictor.original_size = cached["original_size"]
+            predictor.input_size = cached["input_size"]
+            predictor.is_image_set = True
+        cls.embedding_cache[key] = cached
+
 #! BOUNDED IMAGES
 
 # IMAGE BOUNDS
@@ -13613,6 +15283,9 @@ class WAS_Video_Writer:
                 "output_path": ("STRING", {"default": "./ComfyUI/output", "multiline": False}),
                 "filename": ("STRING", {"default": "comfy_writer", "multiline": False}),
                 "codec": (codecs,),
+            },
+            "optional": {
+                "finalize": (["true", "false"], {"default": "true"}),
             }
         }
 
@@ -13627,7 +15300,7 @@ class WAS_Video_Writer:
     CATEGORY = "WAS Suite/Animation/Writer"
 
     def write_video(self, image, transition_frames=10, image_delay_sec=10, fps=30, max_size=512,
-                            output_path="./ComfyUI/output", filename="morph", codec="H264"):
+                            output_path="./ComfyUI/output", filename="morph", codec="H264", finalize="true"):
 
         conf = getSuiteConfig()
         if not conf.__contains__('ffmpeg_bin_path'):
@@ -13657,10 +15330,8 @@ class WAS_Video_Writer:
             fps = 60
 
         results = []
-        for img in image:
-            print(img.shape)
+        for i, img in enumerate(image):
             new_image = self.rescale_image(tensor2pil(img), max_size)
-            print(new_image.size)
 
             tokens = TextTokens()
             output_path = os.path.abspath(os.path.join(*tokens.parseTokens(output_path).split('/')))
@@ -13671,7 +15342,7 @@ class WAS_Video_Writer:
 
             WTools = WAS_Tools_Class()
             MP4Writer = WTools.VideoWriter(int(transition_frames), int(fps), int(image_delay_sec), max_size=max_size, codec=codec)
-            path = MP4Writer.write(new_image, output_file)
+            path = MP4Writer.write(new_image, output_file, finalize=(finalize == "true" and i == len(image) - 1))
 
             results.append(img)
 
@@ -13686,6 +15357,33 @@ class WAS_Video_Writer:
             image = image.resize((new_width, new_height), Image.Resampling(1))
         return image
 
+# Join any video writer sessions still open when ComfyUI shuts down. `atexit` does not run
+# when the process is ended by a signal, so SIGTERM (containers, systemd) finalizes first and
+# then hands over to the previous handler. After SIGKILL the segments stay on disk and the
+# next write to the same path recovers them.
+
+def finalize_videos_on_sigterm():
+    import signal
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        WAS_Tools_Class.VideoWriter.finalize_all()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    try:
+        signal.signal(signal.SIGTERM, handler)
+    except ValueError:
+        # Signal handlers can only be installed from the main thread
+        cstr("Unable to finalize open videos on SIGTERM, they are finalized at exit only.").warning.print()
+
+atexit.register(WAS_Tools_Class.VideoWriter.finalize_all)
+finalize_videos_on_sigterm()
+
 # VIDEO CREATOR
 
 class WAS_Create_Video_From_Path:
@@ -13823,6 +15521,253 @@ class WAS_Video_Frame_Dump:
 
 # CACHING
 
+# Tensor Cache Store
+#
+# Cached values are flattened into their tensors plus a JSON structure describing how to
+# rebuild them. The tensors go into a safetensors file named by the SHA-256 of the
+# structure and tensor bytes, so caching the same latent or image twice stores it once.
+# The file the cache node hands out is a small JSON manifest pointing at that object.
+# Loads map the object file and wrap each tensor around the mapping without copying. The
+# store's index.json tracks object sizes and access times. When `tensor_cache_budget_mb`
+# is set, least recently used objects are removed once the store grows past it, and the
+# manifests pointing at them are marked as evicted so loading them fails with a clear error.
+
+class WASTensorCache:
+    FORMAT = "was-tensor-cache"
+    VERSION = 1
+    DTYPES = {
+        "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+        "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+        "U8": torch.uint8, "BOOL": torch.bool,
+    }
+
+    stores = {}
+
+    def __init__(self, root, budget=None):
+        self.root = os.path.abspath(root)
+        self.objects_path = os.path.join(self.root, "objects")
+        os.makedirs(self.objects_path, exist_ok=True)
+        self.budget = budget
+        self.lock = threading.RLock()
+        self.index = WASDatabase.shared(os.path.join(self.root, "index.json"))
+        for category in ("Objects", "Entries"):
+            if not self.index.catExists(category):
+                self.index.insertCat(category)
+
+    @classmethod
+    def get_store(cls, root):
+        root = os.path.abspath(root)
+        if root not in cls.stores:
+            budget = megabytes_to_bytes(was_config.get("tensor_cache_budget_mb", None))
+            cls.stores[root] = cls(root, budget)
+        return cls.stores[root]
+
+    # Flatten a value into tensors and a JSON structure referencing them by name
+    def pack(self, value, tensors):
+        if isinstance(value, torch.Tensor):
+            name = str(len(tensors))
+            tensor = value.detach().cpu().contiguous()
+            # safetensors refuses tensors that share storage, so views get their own copy
+            if tensor.untyped_storage().nbytes() != tensor.numel() * tensor.element_size():
+                tensor = tensor.clone()
+            tensors[name] = tensor
+            return {"tensor": name}
+        if isinstance(value, dict):
+            if not all(isinstance(key, str) for key in value.keys()):
+                raise TypeError("Only dictionaries with string keys can be cached")
+            return {"dict": {key: self.pack(item, tensors) for key, item in value.items()}}
+        if isinstance(value, (list, tuple)):
+            return {"tuple" if isinstance(value, tuple) else "list": [self.pack(item, tensors) for item in value]}
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {"value": value}
+        raise TypeError(f"Values of type `{type(value).__name__}` cannot be stored as tensors")
+
+    def unpack(self, structure, tensors):
+        if "tensor" in structure:
+            return tensors[structure["tensor"]]
+        if "dict" in structure:
+            return {key: self.unpack(item, tensors) for key, item in structure["dict"].items()}
+        if "list" in structure:
+            return [self.unpack(item, tensors) for item in structure["list"]]
+        if "tuple" in structure:
+            return tuple(self.unpack(item, tensors) for item in structure["tuple"])
+        return structure["value"]
+
+    @staticmethod
+    def content_hash(structure, tensors):
+        sha256 = hashlib.sha256(json.dumps(structure, sort_keys=True).encode("utf-8"))
+        for name, tensor in tensors.items():
+            sha256.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode("utf-8"))
+            if tensor.numel():
+                sha256.update(memoryview(tensor.reshape(-1).view(torch.uint8).numpy()))
+        return sha256.hexdigest()
+
+    def object_path(self, object_hash):
+        return os.path.join(self.objects_path, object_hash[:2], f"{object_hash}.safetensors")
+
+    def store(self, value, manifest_path, value_type):
+        from safetensors.torch import save_file
+
+        tensors = {}
+        structure = self.pack(value, tensors)
+        object_hash = self.content_hash(structure, tensors)
+        path = self.object_path(object_hash)
+
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                save_file(tensors, f"{path}.part", metadata={"format": self.FORMAT, "type": value_type})
+                os.replace(f"{path}.part", path)
+            now = time.time()
+            record = self.index.get("Objects", object_hash) or {"created": now, "type": value_type}
+            record.update({"size": os.path.getsize(path), "last_access": now})
+            self.index.insert("Objects", object_hash, record)
+
+            manifest = {
+                "format": self.FORMAT,
+                "version": self.VERSION,
+                "type": value_type,
+                "store": self.root,
+                "object": object_hash,
+                "structure": structure,
+            }
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=4)
+            self.index.insert("Entries", os.path.abspath(manifest_path), {"object": object_hash, "type": value_type, "created": now})
+
+            self.enforce_budget(keep=object_hash)
+
+        return object_hash
+
+    @classmethod
+    def read_manifest(cls, manifest_path):
+        with open(manifest_path, "rb") as f:
+            # Files written before the store are joblib pickles, skip them without reading them in
+            if f.read(1) != b"{":
+                return None
+            f.seek(0)
+            try:
+                manifest = json.load(f)
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                return None
+        return manifest if isinstance(manifest, dict) and manifest.get("format") == cls.FORMAT else None
+
+    @classmethod
+    def load_manifest(cls, manifest, manifest_path):
+        root = manifest.get("store")
+        if not root or not os.path.isdir(root):
+            root = os.path.dirname(os.path.abspath(manifest_path))
+        return cls.get_store(root).load(manifest)
+
+    def load(self, manifest):
+        object_hash = manifest["object"]
+        path = self.object_path(object_hash)
+        if manifest.get("evicted"):
+            evicted = datetime.datetime.fromtimestamp(manifest["evicted"]).strftime("%Y-%m-%d %H:%M:%S")
+            raise FileNotFoundError(f"Cache object `{object_hash}` was evicted on {evicted} to keep `{self.root}` under `tensor_cache_budget_mb`, cache the value again")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cache object `{object_hash}` is missing from `{self.objects_path}`")
+        with self.lock:
+            record = self.index.get("Objects", object_hash)
+            if record is not None:
+                record["last_access"] = time.time()
+                self.index.update("Objects", object_hash, record)
+        return self.unpack(manifest["structure"], self.map_tensors(path))
+
+    @classmethod
+    def map_tensors(cls, path):
+        import mmap
+        import struct
+
+        with open(path, "rb") as f:
+            header_size = struct.unpack("<Q", f.read(8))[0]
+            header = json.loads(f.read(header_size))
+            # A copy-on-write mapping gives torch a writable buffer without touching the file
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if os.path.getsize(path) > 8 + header_size else None
+
+        tensors = {}
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = cls.DTYPES[info["dtype"]]
+            start, end = info["data_offsets"]
+            if end == start:
+                tensors[name] = torch.empty(info["shape"], dtype=dtype)
+                continue
+            count = (end - start) // torch.empty((), dtype=dtype).element_size()
+            tensors[name] = torch.frombuffer(mapping, dtype=dtype, count=count, offset=8 + header_size + start).reshape(info["shape"])
+        return tensors
+
+    def enforce_budget(self, keep=None):
+        if self.budget is None:
+            return
+        with self.lock:
+            objects = self.index.getDict("Objects")
+            used = sum(record["size"] for record in objects.values())
+            for object_hash, record in sorted(objects.items(), key=lambda item: item[1]["last_access"]):
+                if used <= self.budget:
+                    break
+                if object_hash != keep and self.evict(object_hash):
+                    used -= record["size"]
+
+    def evict(self, object_hash):
+        try:
+            os.remove(self.object_path(object_hash))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows refuses to delete files that are still mapped by a loaded tensor
+            cstr(f"Unable to evict cache object `{object_hash}`: {e}").warning.print()
+            return False
+        self.index.delete("Objects", object_hash)
+        for manifest_path, entry in list(self.index.getDict("Entries").items()):
+            if entry["object"] == object_hash:
+                self.index.delete("Entries", manifest_path)
+                self.mark_evicted(manifest_path, object_hash)
+        return True
+
+    def mark_evicted(self, manifest_path, object_hash):
+        try:
+            manifest = self.read_manifest(manifest_path)
+            if manifest is None or manifest.get("object") != object_hash:
+                return
+            manifest["evicted"] = time.time()
+            with open(f"{manifest_path}.tmp", "w") as f:
+                json.dump(manifest, f, indent=4)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+        except OSError as e:
+            cstr(f"Unable to mark cache file `{manifest_path}` as evicted: {e}").warning.print()
+
+    def entries(self):
+        with self.lock:
+            objects = self.index.getDict("Objects")
+            return {manifest_path: dict(entry, **objects.get(entry["object"], {})) for manifest_path, entry in self.index.getDict("Entries").items()}
+
+    def inspect(self, manifest_path):
+        import struct
+
+        manifest = self.read_manifest(manifest_path)
+        if manifest is None:
+            return None
+        with open(self.object_path(manifest["object"]), "rb") as f:
+            header = json.loads(f.read(struct.unpack("<Q", f.read(8))[0]))
+        return dict(
+            self.index.get("Objects", manifest["object"]) or {},
+            type=manifest["type"],
+            object=manifest["object"],
+            tensors={name: {"dtype": info["dtype"], "shape": info["shape"]} for name, info in header.items() if name != "__metadata__"},
+        )
+
+    def stats(self):
+        with self.lock:
+            objects = self.index.getDict("Objects")
+            return {
+                "objects": len(objects),
+                "entries": len(self.index.getDict("Entries")),
+                "bytes": sum(record["size"] for record in objects.values()),
+                "budget": self.budget,
+            }
+
 class WAS_Cache:
     def __init__(self):
         pass
@@ -13852,11 +15797,6 @@ class WAS_Cache:
 
     def cache_input(self, latent_suffix="_cache", image_suffix="_cache", conditioning_suffix="_cache", output_path=None, latent=None, image=None, conditioning=None):
 
-        if 'joblib' not in packages():
-            install_package('joblib')
-
-        import joblib
-
         output = os.path.join(WAS_SUITE_ROOT, 'cache')
         if output_path:
             if output_path.strip() not in ['', 'none', 'None']:
@@ -13872,27 +15812,39 @@ class WAS_Cache:
 
         tokens = TextTokens()
         output = tokens.parseTokens(output)
+        store = WASTensorCache.get_store(output)
 
         if latent != None:
             l_filename = f'{tokens.parseTokens(latent_suffix)}.latent'
             out_file = os.path.join(output, l_filename)
-            joblib.dump(latent, out_file)
+            self.cache_value(store, latent, out_file, "latent")
             cstr(f"Latent saved to: {out_file}").msg.print()
 
         if image != None:
             i_filename = f'{tokens.parseTokens(image_suffix)}.image'
             out_file = os.path.join(output, i_filename)
-            joblib.dump(image, out_file)
+            self.cache_value(store, image, out_file, "image")
             cstr(f"Tensor batch saved to: {out_file}").msg.print()
 
         if conditioning != None:
             c_filename = f'{tokens.parseTokens(conditioning_suffix)}.conditioning'
             out_file = os.path.join(output, c_filename)
-            joblib.dump(conditioning, os.path.join(output, out_file))
+            self.cache_value(store, conditioning, out_file, "conditioning")
             cstr(f"Conditioning saved to: {out_file}").msg.print()
 
         return (l_filename, i_filename, c_filename)
 
+    def cache_value(self, store, value, out_file, value_type):
+        try:
+            store.store(value, out_file, value_type)
+        except TypeError as e:
+            # Conditioning can carry objects such as control nets that only pickle
+            cstr(f"{e}, falling back to joblib for `{out_file}`").warning.print()
+            if 'joblib' not in packages():
+                install_package('joblib')
+            import joblib
+            joblib.dump(value, out_file)
+
 
 class WAS_Load_Cache:
     def __init__(self):
@@ -13916,37 +15868,43 @@ class WAS_Load_Cache:
 
     def load_cache(self, latent_path=None, image_path=None, conditioning_path=None):
 
-        if 'joblib' not in packages():
-            install_package('joblib')
-
-        import joblib
-
-        input_path = os.path.join(WAS_SUITE_ROOT, 'cache')
-
         latent = None
         image = None
         conditioning = None
 
         if latent_path not in ["",None]:
             if os.path.exists(latent_path):
-                latent = joblib.load(latent_path)
+                latent = self.load_value(latent_path)
             else:
                 cstr(f"Unable to locate cache file {latent_path}").error.print()
 
         if image_path not in ["",None]:
             if os.path.exists(image_path):
-                image = joblib.load(image_path)
+                image = self.load_value(image_path)
             else:
                 cstr(f"Unable to locate cache file {image_path}").msg.print()
 
         if conditioning_path not in ["",None]:
             if os.path.exists(conditioning_path):
-                conditioning = joblib.load(conditioning_path)
+                conditioning = self.load_value(conditioning_path)
             else:
                 cstr(f"Unable to locate cache file {conditioning_path}").error.print()
 
         return (latent, image, conditioning)
 
+    def load_value(self, path):
+        manifest = WASTensorCache.read_manifest(path)
+        if manifest is not None:
+            try:
+                return WASTensorCache.load_manifest(manifest, path)
+            except FileNotFoundError as e:
+                raise FileNotFoundError(f"Unable to load cache file `{path}`: {e}") from e
+
+        if 'joblib' not in packages():
+            install_package('joblib')
+        import joblib
+        return joblib.load(path)
+
 
 # SAMPLES PASS STAT SYSTEM
 
@@ -14024,6 +15982,172 @@ class WAS_Integer_Place_Counter:
         return (output,)
 
 
+# NODE MEMOIZATION
+#
+# Deterministic nodes are re-run whenever anything upstream re-executes, even when the
+# upstream output is identical. With `memoize_nodes` enabled their FUNCTION is wrapped to
+# return the previous result when the inputs fingerprint the same. Tensors are fingerprinted
+# by shape, dtype, a float64 sum and a strided sample of their values; `memoize_full_hash`
+# hashes every byte instead for workflows where a sampled collision would matter. Calls
+# with opaque inputs such as models cannot be fingerprinted by value and are not memoized.
+
+MEMO_FINGERPRINT_SAMPLES = 4096
+
+class WASNodeMemo:
+    def __init__(self, budget=None, full_hash=False):
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.budget = budget
+        self.full_hash = full_hash
+        self.used = 0
+        self.node_stats = {}
+
+    # Returns False when the value holds an opaque object that cannot be fingerprinted
+    def fingerprint(self, value, sha256):
+        if isinstance(value, torch.Tensor):
+            value = value.detach()
+            sha256.update(f"tensor:{value.dtype}:{tuple(value.shape)}".encode("utf-8"))
+            flat = value.reshape(-1)
+            if not self.full_hash and flat.numel() > MEMO_FINGERPRINT_SAMPLES:
+                if flat.is_floating_point() or flat.is_complex():
+                    sha256.update(repr(flat.sum(dtype=torch.float64).item()).encode("utf-8"))
+                flat = flat[::flat.numel() // MEMO_FINGERPRINT_SAMPLES]
+            if flat.numel():
+                sha256.update(memoryview(flat.cpu().contiguous().view(torch.uint8).numpy()))
+        elif isinstance(value, np.ndarray):
+            return self.fingerprint(torch.from_numpy(np.ascontiguousarray(value)), sha256)
+        elif isinstance(value, dict):
+            sha256.update(b"dict")
+            for key, item in value.items():
+                sha256.update(repr(key).encode("utf-8"))
+                if not self.fingerprint(item, sha256):
+                    return False
+        elif isinstance(value, (list, tuple)):
+            sha256.update(f"{type(value).__name__}:{len(value)}".encode("utf-8"))
+            for item in value:
+                if not self.fingerprint(item, sha256):
+                    return False
+        elif value is None or isinstance(value, (bool, int, float, str, bytes)):
+            sha256.update(f"{type(value).__name__}:{value!r}".encode("utf-8"))
+        else:
+            # Keying models by id() would give a stale hit to a new object at a reused address
+            return False
+        return True
+
+    def key(self, node_class, args, kwargs):
+        sha256 = hashlib.sha256(node_class.encode("utf-8"))
+        if not self.fingerprint(list(args), sha256) or not self.fingerprint(dict(sorted(kwargs.items())), sha256):
+            return None
+        return sha256.hexdigest()
+
+    @classmethod
+    def result_size(cls, value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, dict):
+            return sum(cls.result_size(item) for item in value.values())
+        if isinstance(value, (list, tuple)):
+            return sum(cls.result_size(item) for item in value)
+        return 0
+
+    def call(self, node_class, function, args, kwargs):
+        key = self.key(node_class, args, kwargs)
+        if key is None:
+            with self.lock:
+                stats = self.node_stats.setdefault(node_class, {"hits": 0, "misses": 0, "skipped": 0})
+                stats["skipped"] += 1
+            return function(*args, **kwargs)
+        with self.lock:
+            stats = self.node_stats.setdefault(node_class, {"hits": 0, "misses": 0, "skipped": 0})
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                # Reinserting keeps the dict in least to most recently used order
+                self.entries[key] = entry
+                stats["hits"] += 1
+                return entry["result"]
+            stats["misses"] += 1
+
+        result = function(*args, **kwargs)
+        size = self.result_size(result)
+
+        with self.lock:
+            if self.budget is None or size <= self.budget:
+                for old_key in list(self.entries.keys()):
+                    if self.budget is None or self.used + size <= self.budget:
+                        break
+                    self.used -= self.entries.pop(old_key)["size"]
+                if key not in self.entries:
+                    self.entries[key] = {"result": result, "size": size}
+                    self.used += size
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.used,
+                "budget": self.budget,
+                "nodes": {node_class: dict(stats) for node_class, stats in self.node_stats.items()},
+            }
+
+WAS_NODE_MEMO = WASNodeMemo(
+    budget=megabytes_to_bytes(was_config.get('memoize_cache_mb', 2048)),
+    full_hash=was_config.get('memoize_full_hash', False),
+)
+
+def memoize_node(node_class):
+    function = getattr(node_class, node_class.FUNCTION)
+    if getattr(function, "was_memoized", False):
+        return node_class
+
+    @functools.wraps(function)
+    def memoized(self, *args, **kwargs):
+        return WAS_NODE_MEMO.call(node_class.__name__, lambda *a, **k: function(self, *a, **k), args, kwargs)
+
+    memoized.was_memoized = True
+    setattr(node_class, node_class.FUNCTION, memoized)
+    return node_class
+
+# Nodes whose output depends only on their inputs (noise generators take an explicit seed)
+MEMOIZABLE_NODES = (
+    WAS_Image_Style_Filter,
+    WAS_Image_Filters,
+    WAS_Canny_Filter,
+    WAS_Image_Gradient_Map,
+    WAS_Image_Perlin_Noise,
+    WAS_Image_Perlin_Power_Fractal,
+    WAS_Image_Voronoi_Noise_Filter,
+    WAS_Image_Power_Noise,
+    WAS_Image_To_Noise,
+    WAS_Mask_Crop_Dominant_Region,
+    WAS_Mask_Crop_Minority_Region,
+    WAS_Mask_Crop_Region,
+    WAS_Mask_Paste_Region,
+    WAS_Mask_Dominant_Region,
+    WAS_Mask_Minority_Region,
+    WAS_Mask_Arbitrary_Region,
+    WAS_Mask_Smooth_Region,
+    WAS_Mask_Erode_Region,
+    WAS_Mask_Dilate_Region,
+    WAS_Mask_Fill_Region,
+    WAS_Mask_Threshold_Region,
+    WAS_Mask_Floor_Region,
+    WAS_Mask_Ceiling_Region,
+    WAS_Mask_Gaussian_Region,
+)
+
+if was_config.get('memoize_nodes', False):
+    for node_class in MEMOIZABLE_NODES:
+        memoize_node(node_class)
+
+
 # NODE MAPPING
 NODE_CLASS_MAPPINGS = {
     "BLIP Model Loader": WAS_BLIP_Model_Loader,
@@ -14045,6 +16169,7 @@ NODE_CLASS_MAPPINGS = {
     "CLIPSeg Masking": WAS_CLIPSeg,
     "CLIPSeg Model Loader": WAS_CLIPSeg_Model_Loader,
     "CLIPSeg Batch Masking": WAS_CLIPSeg_Batch,
+    "CLIPSeg Prompt Masking": WAS_CLIPSeg_Prompts,
     "Convert Masks to Images": WAS_Mask_To_Image,
     "Control Net Model Input Switch": WAS_Control_Net_Input_Switch,
     "Debug Number to Console": WAS_Debug_Number_to_Console,
@@ -14189,6 +16314,7 @@ NODE_CLASS_MAPPINGS = {
     "SAM Model Loader": WAS_SAM_Model_Loader,
     "SAM Parameters": WAS_SAM_Parameters,
     "SAM Parameters Combine": WAS_SAM_Combine_Parameters,
+    "SAM Parameters Batch": WAS_SAM_Parameters_Batch,
     "SAM Image Mask": WAS_SAM_Image_Mask,
     "Samples Passthrough (Stat System)": WAS_Samples_Passthrough_Stat_System,
     "String to Text": WAS_String_To_Text,
@@ -14310,63 +16436,38 @@ if os.path.exists(BKAdvCLIP_dir):
     if NODE_CLASS_MAPPINGS.__contains__("CLIPTextEncode (BlenderNeko Advanced + NSP)"):
         cstr('`CLIPTextEncode (BlenderNeko Advanced + NSP)` node enabled under `WAS Suite/Conditioning` menu.').msg.print()
 
-# opencv-python-headless handling
-if 'opencv-python' in packages() or 'opencv-python-headless' in packages():
-    try:
-        import cv2
-        build_info = ' '.join(cv2.getBuildInformation().split())
-        if "FFMPEG: YES" in build_info:
-            if was_config.__contains__('show_startup_junk'):
-                if was_config['show_startup_junk']:
-                    cstr("OpenCV Python FFMPEG support is enabled").msg.print()
-            if was_config.__contains__('ffmpeg_bin_path'):
-                if was_config['ffmpeg_bin_path'] == "/path/to/ffmpeg":
-                    cstr(f"`ffmpeg_bin_path` is not set in `{WAS_CONFIG_FILE}` config file. Will attempt to use system ffmpeg binaries if available.").warning.print()
-                else:
-                    if was_config.__contains__('show_startup_junk'):
-                        if was_config['show_startup_junk']:
-                            cstr(f"`ffmpeg_bin_path` is set to: {was_config['ffmpeg_bin_path']}").msg.print()
-        else:
-            cstr(f"OpenCV Python FFMPEG support is not enabled\033[0m. OpenCV Python FFMPEG support, and FFMPEG binaries is required for video writing.").warning.print()
-    except ImportError:
-        cstr("OpenCV Python module cannot be found. Attempting install...").warning.print()
-        install_package(
-            package='opencv-python-headless[ffmpeg]',
-            uninstall_first=['opencv-python', 'opencv-python-headless[ffmpeg]']
-        )
+# Dependency checks use the package registry; OpenCV itself is imported on first use
+with startup_step("dependency checks"):
+
+    # opencv-python-headless handling
+    if 'opencv-python' not in packages() and 'opencv-python-headless' not in packages():
+        install_package('opencv-python-headless[ffmpeg]')
+
+    # scipy handling
+    if 'scipy' not in packages():
+        install_package('scipy')
         try:
-            import cv2
-            cstr("OpenCV Python installed.").msg.print()
-        except ImportError:
-            cstr("OpenCV Python module still cannot be imported. There is a system conflict.").error.print()
-else:
-    install_package('opencv-python-headless[ffmpeg]')
-    try:
-        import cv2
-        cstr("OpenCV Python installed.").msg.print()
-    except ImportError:
-        cstr("OpenCV Python module still cannot be imported. There is a system conflict.").error.print()
+            import scipy
+        except ImportError as e:
+            cstr("Unable to import tools for certain masking procedures.").msg.print()
+            print(e)
 
-# scipy handling
-if 'scipy' not in packages():
-    install_package('scipy')
-    try:
-        import scipy
-    except ImportError as e:
-        cstr("Unable to import tools for certain masking procedures.").msg.print()
-        print(e)
+    # scikit-image handling
+    if 'scikit-image' not in packages():
+        install_package(
+            package='scikit-image',
+            uninstall_first=['scikit-image']
+        )
 
-# scikit-image handling
-try:
-    import skimage
-except ImportError as e:
-    install_package(
-        package='scikit-image',
-        uninstall_first=['scikit-image']
-    )
-    import skimage
+# Eager mode loads the deferred modules and kernels now instead of on first use
+if not was_config.get('lazy_imports', True):
+    with startup_step("eager imports"):
+        try:
+            warm_lazy_imports()
+        except ImportError as e:
+            cstr(f"Unable to preload deferred modules: {e}").error.print()
 
-was_conf = getSuiteConfig()
+was_conf = was_config
 
 # Suppress warnings
 if was_conf.__contains__('suppress_uncomfy_warnings'):
@@ -14377,8 +16478,12 @@ if was_conf.__contains__('suppress_uncomfy_warnings'):
         warnings.filterwarnings("ignore", category=UserWarning, module="transformers")
 
 # Well we got here, we're as loaded as we're gonna get.
+STARTUP_COMPLETE = True
 print(" ".join([cstr("Finished.").msg, cstr("Loaded").green, cstr(len(NODE_CLASS_MAPPINGS.keys())).end, cstr("nodes successfully.").green]))
 
+if was_conf.get('show_startup_report', False) or os.getenv("WAS_STARTUP_REPORT", 'False').lower() in ('true', '1', 't'):
+    startup_report()
+
 show_quotes = True
 if was_conf.__contains__('show_inspiration_quote'):
     if was_conf['show_inspiration_quote'] == False:
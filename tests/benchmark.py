@@ -0,0 +1,260 @@
+# WAS Node Suite benchmarks
+#
+# Compares the legacy implementations of hot WAS Node Suite routines against the current ones.
+# Needs a working ComfyUI environment, run from this folder or point COMFYUI_PATH at the ComfyUI root:
+#
+#   python benchmark.py perlin --sizes 512 1024 2048
+#   python benchmark.py voronoi --sizes 1024
+#   python benchmark.py dither --sizes 256 512 1024
+#   python benchmark.py occlusion --sizes 256 512
+#
+import argparse
+import os
+import sys
+import time
+
+SUITE_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+COMFYUI_PATH = os.environ.get("COMFYUI_PATH", os.path.abspath(os.path.join(SUITE_ROOT, "..", "..")))
+sys.path.insert(0, COMFYUI_PATH)
+sys.path.insert(0, SUITE_ROOT)
+
+import numpy as np
+import random
+from numba import jit
+
+import WAS_Node_Suite as was
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(name, size, old_time, new_time, match=None):
+    speedup = old_time / new_time if new_time else float('inf')
+    line = f"{name:<24} {size:>6}  legacy {old_time:>9.3f}s  new {new_time:>9.3f}s  x{speedup:>8.1f}"
+    if match is not None:
+        line += f"  identical: {match}"
+    print(line)
+
+
+# Legacy Perlin (per-call JIT, per-pixel Python loop)
+
+def legacy_perlin_noise(width, height, octaves, persistence, scale, seed=None):
+
+    @jit(nopython=True)
+    def fade(t):
+        return 6 * t**5 - 15 * t**4 + 10 * t**3
+
+    @jit(nopython=True)
+    def lerp(t, a, b):
+        return a + t * (b - a)
+
+    @jit(nopython=True)
+    def grad(hash, x, y, z):
+        h = hash & 15
+        u = x if h < 8 else y
+        v = y if h < 4 else (x if h == 12 or h == 14 else z)
+        return (u if (h & 1) == 0 else -u) + (v if (h & 2) == 0 else -v)
+
+    @jit(nopython=True)
+    def noise(x, y, z, p):
+        X = np.int32(np.floor(x)) & 255
+        Y = np.int32(np.floor(y)) & 255
+        Z = np.int32(np.floor(z)) & 255
+        x -= np.floor(x)
+        y -= np.floor(y)
+        z -= np.floor(z)
+        u = fade(x)
+        v = fade(y)
+        w = fade(z)
+        A = p[X] + Y
+        AA = p[A] + Z
+        AB = p[A + 1] + Z
+        B = p[X + 1] + Y
+        BA = p[B] + Z
+        BB = p[B + 1] + Z
+        return lerp(w, lerp(v, lerp(u, grad(p[AA], x, y, z), grad(p[BA], x - 1, y, z)),
+                                lerp(u, grad(p[AB], x, y - 1, z), grad(p[BB], x - 1, y - 1, z))),
+                    lerp(v, lerp(u, grad(p[AA + 1], x, y, z - 1), grad(p[BA + 1], x - 1, y, z - 1)),
+                                lerp(u, grad(p[AB + 1], x, y - 1, z - 1), grad(p[BB + 1], x - 1, y - 1, z - 1))))
+
+    if seed:
+        random.seed(seed)
+
+    p = np.arange(256, dtype=np.int32)
+    random.shuffle(p)
+    p = np.concatenate((p, p))
+
+    noise_map = np.zeros((height, width))
+    amplitude = 1.0
+    for octave in range(octaves):
+        frequency = 2 ** octave
+        for y in range(height):
+            for x in range(width):
+                nx = x / scale * frequency
+                ny = y / scale * frequency
+                noise_map[y, x] = noise_map[y, x] + noise(nx, ny, 0, p) * amplitude
+        amplitude *= persistence
+
+    min_value = np.min(noise_map)
+    max_value = np.max(noise_map)
+    return np.interp(noise_map, (min_value, max_value), (0, 255)).astype(np.uint8)
+
+
+def bench_perlin(sizes, octaves=8):
+    WTools = was.WAS_Tools_Class()
+    # Warm the cached kernels so compile time is not counted
+    WTools.perlin_noise(64, 64, 1, 0.5, 100, 1)
+    for size in sizes:
+        old_time, old_map = timed(legacy_perlin_noise, size, size, octaves, 0.5, 100, 1)
+        new_time, new_image = timed(WTools.perlin_noise, size, size, octaves, 0.5, 100, 1)
+        new_map = np.array(new_image.convert('L'))
+        report(f"perlin ({octaves} octaves)", size, old_time, new_time, np.array_equal(old_map, new_map))
+
+
+# Legacy Worley (per-pixel full distance sort)
+
+def legacy_worley_noise(width, height, density, option=0, seed=None):
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, width, (density, 2))
+    data = np.zeros((height, width))
+    for h in range(height):
+        for w in range(width):
+            distances = np.sqrt(np.sum((points - np.array([w, h])) ** 2, axis=1))
+            data[h, w] = np.sort(distances)[option]
+    return data
+
+
+def bench_voronoi(sizes, density=500, option=0):
+    WTools = was.WAS_Tools_Class()
+    # Import scipy up front so its import time is not counted
+    WTools.worley_noise(height=16, width=16, density=8, option=option, seed=1)
+    for size in sizes:
+        old_time, old_data = timed(legacy_worley_noise, size, size, density, option, 1)
+        new_time, worley = timed(WTools.worley_noise, height=size, width=size, density=density, option=option, seed=1)
+        report(f"voronoi (density {density})", size, old_time, new_time, bool(np.allclose(old_data, worley.data)))
+
+
+# Legacy Floyd-Steinberg (pure Python error diffusion)
+
+def legacy_fs_dither(arr, nc):
+    arr = arr.astype(float) / 255
+    new_height, new_width = arr.shape[:2]
+    for ir in range(new_height):
+        for ic in range(new_width):
+            old_val = arr[ir, ic].copy()
+            new_val = np.round(old_val * (nc - 1)) / (nc - 1)
+            arr[ir, ic] = new_val
+            err = old_val - new_val
+            if ic < new_width - 1:
+                arr[ir, ic + 1] += err * 7/16
+            if ir < new_height - 1:
+                if ic > 0:
+                    arr[ir + 1, ic - 1] += err * 3/16
+                arr[ir + 1, ic] += err * 5/16
+                if ic < new_width - 1:
+                    arr[ir + 1, ic + 1] += err / 16
+    return np.clip(arr * 255, 0, 255).astype(np.uint8)
+
+
+def bench_dither(sizes, levels=16, batch=4):
+    rng = np.random.default_rng(0)
+    # Warm the cached kernels so compile time is not counted
+    was.dither_batch(rng.integers(0, 256, (1, 8, 8, 3), dtype=np.uint8), 'FloydSteinberg', levels)
+    for size in sizes:
+        images = rng.integers(0, 256, (batch, size, size, 3), dtype=np.uint8)
+        old_time, old = timed(lambda: np.stack([legacy_fs_dither(image, levels) for image in images]))
+        new_time, new = timed(was.dither_batch, images, 'FloydSteinberg', levels)
+        report(f"dither fs (batch {batch})", size, old_time, new_time, np.array_equal(old, new))
+        for mode in ('Atkinson', 'JarvisJudiceNinke', 'Ordered'):
+            mode_time, _ = timed(was.dither_batch, images, mode, levels)
+            print(f"{'dither ' + mode:<24} {size:>6}  new {mode_time:>9.3f}s")
+
+
+# Legacy occlusion (per-pixel neighbourhood slices, O(r^2) per pixel)
+
+@jit(nopython=True)
+def legacy_ambient_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
+    occlusion_array = np.zeros((height, width), dtype=np.uint8)
+    for y in range(height):
+        for x in range(width):
+            y_min = max(y - radius, 0)
+            y_max = min(y + radius + 1, height)
+            x_min = max(x - radius, 0)
+            x_max = min(x + radius + 1, width)
+            depth_diff = depth_normalized[y, x] - depth_normalized[y_min:y_max, x_min:x_max]
+            rgb_diff = np.abs(rgb_normalized[y, x] - rgb_normalized[y_min:y_max, x_min:x_max, :])
+            occlusion_factor = np.maximum(0, depth_diff).mean() + np.maximum(0, np.sum(rgb_diff, axis=2)).mean()
+            occlusion_array[y, x] = int(255 - occlusion_factor * 255)
+    return occlusion_array
+
+
+@jit(nopython=True)
+def legacy_direct_occlusion_factor(rgb_normalized, depth_normalized, height, width, radius):
+    occlusion_array = np.empty((height, width), dtype=np.uint8)
+    depth_normalized = depth_normalized[:, :, 0]
+    for y in range(height):
+        for x in range(width):
+            y_min = max(y - radius, 0)
+            y_max = min(y + radius + 1, height)
+            x_min = max(x - radius, 0)
+            x_max = min(x + radius + 1, width)
+            depth_diff = depth_normalized[y_min:y_max, x_min:x_max] - depth_normalized[y, x]
+            rgb_diff = np.abs(rgb_normalized[y_min:y_max, x_min:x_max, :] - rgb_normalized[y, x])
+            occlusion_factor = np.maximum(0, depth_diff).mean() + np.maximum(0, np.sum(rgb_diff, axis=2)).mean()
+            occlusion_array[y, x] = int(occlusion_factor * 255)
+    occlusion_min = np.min(occlusion_array)
+    occlusion_max = np.max(occlusion_array)
+    return ((occlusion_array - occlusion_min) / (occlusion_max - occlusion_min) * 255).astype(np.uint8)
+
+
+def occlusion_quality(old, new):
+    diff = np.abs(old.astype(np.float64) - new.astype(np.float64))
+    mse = np.mean(diff ** 2)
+    psnr = float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+    return f"max diff {int(diff.max())}, identical {np.mean(diff == 0):.2%}, psnr {psnr:.1f}dB"
+
+
+def bench_occlusion(sizes, radius=30, batch=2):
+    rng = np.random.default_rng(0)
+    # Warm the kernels so compile time is not counted
+    small = rng.integers(0, 256, (1, 16, 16, 3), dtype=np.uint8)
+    legacy_ambient_occlusion_factor(small[0] / 255.0, small[0] / 255.0, 16, 16, 2)
+    legacy_direct_occlusion_factor(small[0] / 255.0, small[0] / 255.0, 16, 16, 2)
+    was.ambient_occlusion_batch(small, small, 2)
+    was.direct_occlusion_batch(small, small, 2)
+    for size in sizes:
+        # Smooth gradients plus grain, closer to real depth/colour pairs than pure noise
+        ramp = np.linspace(0, 200, size)
+        rgb = (ramp[None, :, None] + rng.integers(0, 40, (batch, size, size, 3))).astype(np.uint8)
+        depth = np.repeat(np.broadcast_to(ramp[:, None], (batch, size, size))[..., None], 3, axis=3).astype(np.uint8)
+        for name, legacy, new in (("ambient", legacy_ambient_occlusion_factor, was.ambient_occlusion_batch),
+                                  ("direct", legacy_direct_occlusion_factor, was.direct_occlusion_batch)):
+            old_time, old = timed(lambda: np.stack([legacy(rgb[i] / 255.0, depth[i] / 255.0, size, size, radius) for i in range(batch)]))
+            new_time, result = timed(new, rgb, depth, radius)
+            report(f"{name} occlusion (r {radius})", size, old_time, new_time)
+            print(f"{'':<24} {size:>6}  {occlusion_quality(old, result)}")
+
+
+BENCHMARKS = {
+    "perlin": bench_perlin,
+    "voronoi": bench_voronoi,
+    "dither": bench_dither,
+    "occlusion": bench_occlusion,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WAS Node Suite benchmarks")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS.keys()), choices=list(BENCHMARKS.keys()))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[512, 1024, 2048])
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        BENCHMARKS[name](args.sizes)
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+tqdm = pytest.importorskip("tqdm")
+
+from was_mock import cstr, load_section
+
+was = {"os": os, "re": re, "time": time, "threading": threading, "hashlib": hashlib, "requests": requests, "tqdm": tqdm.tqdm, "cstr": cstr}
+load_section("# SHA-256 Hash", "# Batch Seed Generator", was)
+load_section("# Download File", "# NSP Function", was)
+download_file = was["download_file"]
+FileLock = was["FileLock"]
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 17)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/model.bin":
+            self.send_response(404)
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range")
+        StandIn.ranges.append(range_header)
+        start = int(range_header.split("=")[1].split("-")[0]) if range_header else 0
+        if start >= len(PAYLOAD):
+            self.send_response(416)
+            self.end_headers()
+            return
+        self.send_response(206 if range_header else 200)
+        self.send_header("Content-Length", str(len(PAYLOAD) - start))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:])
+
+
+@pytest.fixture
+def server():
+    StandIn.ranges = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_verifies_and_renames(server, tmp_path):
+    assert download_file(f"{server}/model.bin", path=str(tmp_path), sha256=PAYLOAD_SHA256, chunk_size=65536)
+    assert (tmp_path / "model.bin").read_bytes() == PAYLOAD
+    assert sorted(os.listdir(tmp_path)) == ["model.bin"]
+
+def test_download_resumes_partial_file(server, tmp_path):
+    (tmp_path / "model.bin.part").write_bytes(PAYLOAD[:1024 * 1024])
+    assert download_file(f"{server}/model.bin", path=str(tmp_path), sha256=PAYLOAD_SHA256)
+    assert StandIn.ranges == [f"bytes={1024 * 1024}-"]
+    assert (tmp_path / "model.bin").read_bytes() == PAYLOAD
+
+def test_download_discards_checksum_mismatch(server, tmp_path):
+    assert not download_file(f"{server}/model.bin", path=str(tmp_path), sha256="0" * 64)
+    assert os.listdir(tmp_path) == []
+
+def test_download_rejects_digest_prefix(server, tmp_path):
+    with pytest.raises(ValueError):
+        download_file(f"{server}/model.bin", path=str(tmp_path), sha256=PAYLOAD_SHA256[:6])
+
+def test_download_missing_file(server, tmp_path):
+    assert not download_file(f"{server}/missing.bin", path=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def test_lock_breaks_stale_lock_only(tmp_path):
+    path = str(tmp_path / "model.bin.lock")
+    with open(path, "w") as f:
+        f.write("1:dead")
+    os.utime(path, (time.time() - 60, time.time() - 60))
+    lock = FileLock(path, stale_after=30, poll_interval=0.01)
+    assert lock.acquire(timeout=1)
+    assert not FileLock(path, stale_after=30, poll_interval=0.01).acquire(timeout=0.05)
+    lock.release()
+    assert os.listdir(tmp_path) == []
+
+def test_lock_release_keeps_a_lock_it_lost(tmp_path):
+    path = str(tmp_path / "model.bin.lock")
+    lock = FileLock(path)
+    assert lock.acquire(timeout=1)
+    with open(path, "w") as f:
+        f.write("1:other")
+    lock.release()
+    assert os.listdir(tmp_path) == ["model.bin.lock"]
@@ -0,0 +1,55 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from was_mock import cstr, load_section
+
+was = {"os": os, "json": json, "time": time, "atexit": atexit, "threading": threading, "cstr": cstr}
+load_section("# Download File", "# NSP Function", was)
+load_section("# WAS SETTINGS MANAGER", "# Initialize the settings database", was)
+WASDatabase = was["WASDatabase"]
+
+
+def test_reads_existing_json(tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"History": {"Images": ["a.png"]}}))
+    assert WASDatabase(str(path)).get("History", "Images") == ["a.png"]
+
+
+def test_writes_are_coalesced_into_the_journal(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WASDatabase(path, flush_delay=60)
+    for i in range(10):
+        db.insert("Counters", "label", i)
+    db.flush()
+    with open(f"{path}.log") as f:
+        assert len(f.readlines()) == 2
+    assert not os.path.exists(path)
+
+
+def test_instances_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "db.json")
+    a = WASDatabase(path, flush_delay=0)
+    b = WASDatabase(path, flush_delay=0)
+    a.insert("Tokens", "[name]", "value")
+    assert b.get("Tokens", "[name]") == "value"
+    a.compact()
+    a.insert("Tokens", "[other]", "x")
+    assert b.get("Tokens", "[other]") == "x"
+    b.delete("Tokens", "[name]")
+    assert not a.keyExists("Tokens", "[name]")
+    with open(path) as f:
+        assert json.load(f)["Tokens"] == {"[name]": "value"}
+
+
+def test_local_changes_win_over_older_journal_lines(tmp_path):
+    path = str(tmp_path / "db.json")
+    a = WASDatabase(path, flush_delay=60)
+    b = WASDatabase(path, flush_delay=0)
+    a.insert("Counters", "label", 2)
+    b.insert("Counters", "label", 1)
+    assert a.get("Counters", "label") == 2
+    a.flush()
+    assert b.get("Counters", "label") == 2
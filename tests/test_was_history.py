@@ -0,0 +1,59 @@
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+
+from was_mock import cstr, load_section
+
+was = {"os": os, "json": json, "time": time, "atexit": atexit, "threading": threading, "collections": collections, "cstr": cstr}
+load_section("# Download File", "# NSP Function", was)
+load_section("# WAS SETTINGS MANAGER", "# Initialize the settings database", was)
+load_section("# History", "WAS_HISTORY = WASHistory", was)
+WASHistory = was["WASHistory"]
+
+
+def touch(path):
+    with open(path, "w"):
+        pass
+    return str(path)
+
+
+def test_readding_moves_to_newest(tmp_path):
+    history = WASHistory(str(tmp_path / "history.json"))
+    a, b, c = (touch(tmp_path / name) for name in ("a.png", "b.png", "c.png"))
+    history.add("Images", [a, b, c])
+    history.add("Images", a)
+    assert history.paths("Images") == [a, c, b]
+
+
+def test_history_is_capped(tmp_path):
+    history = WASHistory(str(tmp_path / "history.json"), limit=3)
+    paths = [touch(tmp_path / f"{i}.png") for i in range(5)]
+    history.add("Images", paths[:2])
+    history.add("Images", paths[2:])
+    assert history.paths("Images") == paths[:1:-1]
+    reopened = WASHistory(str(tmp_path / "history.json"), limit=3)
+    assert reopened.paths("Images") == paths[:1:-1]
+
+
+def test_folder_and_prefix_lookup(tmp_path):
+    history = WASHistory(str(tmp_path / "history.json"))
+    (tmp_path / "sub").mkdir()
+    keep = touch(tmp_path / "sub" / "ComfyUI_0001.png")
+    other = touch(tmp_path / "sub" / "Other_0001.png")
+    outside = touch(tmp_path / "ComfyUI_0002.png")
+    history.add("Output_Images", [keep, other, outside])
+    assert history.paths("Output_Images", folder=str(tmp_path / "sub"), prefix="ComfyUI") == [keep]
+    assert history.paths("Output_Images", limit=2) == [outside, other]
+
+
+def test_large_adds_stay_linear(tmp_path):
+    history = WASHistory(str(tmp_path / "history.json"), limit=1000)
+    paths = [os.path.join(str(tmp_path), f"{i}.png") for i in range(100000)]
+    start = time.perf_counter()
+    history.add("Images", paths)
+    history.add("Images", paths)
+    assert time.perf_counter() - start < 1.0
+    assert list(history.category("Images")) == paths[-1000:]
@@ -9,3 +9,15 @@ exec(class_string + Path("../WAS_Node_Suite.py").read_text().split(class_string)
 
 def was_text_sort(text = "", separator = WAS_Text_Sort.INPUT_TYPES()["required"]["separator"][1]["default"]):
     return WAS_Text_Sort().sort(text, separator)[0]
+
+class cstr(str):
+    def __getattr__(self, attr):
+        return self
+
+    def print(self, **kwargs):
+        print(self, **kwargs)
+
+def load_section(start, end, namespace):
+    source = Path("../WAS_Node_Suite.py").read_text()
+    exec(start + source.split(start)[1].split(end)[0], namespace)
+    return namespace